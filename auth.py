@@ -1,14 +1,21 @@
 import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
 import httpx
 from fastapi import Depends, HTTPException, status, Request, APIRouter
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import jwt, jwk, JWTError
 from dotenv import load_dotenv
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+logger = logging.getLogger("konty")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
@@ -16,14 +23,85 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     raise ValueError("Variáveis de ambiente SUPABASE_URL e SUPABASE_ANON_KEY devem ser definidas.")
 
+JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+# TTL usado quando o Supabase não informa Cache-Control: max-age
+JWKS_TTL_SECONDS = int(os.getenv("JWKS_TTL_SECONDS", "600"))
+# Intervalo mínimo entre buscas disparadas por KID desconhecido (protege contra KIDs forjados)
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+
 # Cache simples do JWKS por KID
 _jwks_cache = {"keys": []}
+_jwks_state = {"expires_at": 0.0, "fetched_at": 0.0}
+
+# Cliente HTTP compartilhado e busca em andamento (single-flight)
+_http_client = None
+_refresh_future = None
+
+# Chaves públicas já convertidas do JWK (evita reconstruir a chave RSA a cada requisição)
+_parsed_keys = {}
+
+# Cache de tokens já validados: sha256(token) -> (usuário, expira_em, kid). Limitado (LRU) e com TTL.
+# Entradas cujo kid sai do JWKS (rotação/revogação) são descartadas na atualização do JWKS.
+TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "1024"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+_token_cache = OrderedDict()
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=10.0)
+    return _http_client
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def _ttl_from_headers(headers) -> float:
+    """TTL do JWKS a partir do Cache-Control (max-age / no-store); senão JWKS_TTL_SECONDS."""
+    cache_control = (headers.get("cache-control") or "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0.0
+    m = re.search(r"max-age=(\d+)", cache_control)
+    if m:
+        return float(m.group(1))
+    return float(JWKS_TTL_SECONDS)
 
 async def _fetch_jwks():
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json", timeout=10.0)
-        resp.raise_for_status()
-        return resp.json()
+    resp = await _get_http_client().get(JWKS_URL)
+    resp.raise_for_status()
+    return resp.json(), _ttl_from_headers(resp.headers)
+
+async def _do_refresh_jwks():
+    global _refresh_future
+    try:
+        jwks, ttl = await _fetch_jwks()
+        now = time.time()
+        _jwks_cache.clear()
+        _jwks_cache.update(jwks)
+        _parsed_keys.clear()
+        _drop_tokens_without_kid({k.get("kid") for k in jwks.get("keys", [])})
+        _jwks_state["fetched_at"] = now
+        _jwks_state["expires_at"] = now + ttl
+        return jwks
+    finally:
+        _refresh_future = None
+
+async def refresh_jwks():
+    """Atualiza o JWKS. Chamadas concorrentes aguardam a mesma busca em andamento."""
+    global _refresh_future
+    if _refresh_future is None:
+        _refresh_future = asyncio.ensure_future(_do_refresh_jwks())
+    return await asyncio.shield(_refresh_future)
+
+async def prefetch_jwks() -> None:
+    """Carrega o JWKS na subida da aplicação; falhas são apenas logadas."""
+    try:
+        jwks = await refresh_jwks()
+        logger.info("jwks carregado: %s chave(s)", len(jwks.get("keys", [])))
+    except Exception as exc:
+        logger.warning("falha ao pré-carregar JWKS: %r", exc)
 
 def _find_key_by_kid(jwks, kid: str):
     for k in jwks.get("keys", []):
@@ -31,6 +109,48 @@ def _find_key_by_kid(jwks, kid: str):
             return k
     return None
 
+def _parsed_key(kid: str, key_data: dict):
+    """Converte o JWK em chave pública uma única vez por KID."""
+    key = _parsed_keys.get(kid)
+    if key is None:
+        key = jwk.construct(key_data, key_data.get("alg") or "RS256")
+        _parsed_keys[kid] = key
+    return key
+
+def _token_cache_get(token_hash: str):
+    entry = _token_cache.get(token_hash)
+    if entry is None:
+        return None
+    user, expires_at, _kid = entry
+    if expires_at <= time.time():
+        _token_cache.pop(token_hash, None)
+        return None
+    _token_cache.move_to_end(token_hash)
+    return dict(user)
+
+def _token_cache_put(token_hash: str, user: dict, exp, kid) -> None:
+    if TOKEN_CACHE_MAX <= 0:
+        return
+    expires_at = time.time() + TOKEN_CACHE_TTL_SECONDS
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, exp)
+    _token_cache[token_hash] = (dict(user), expires_at, kid)
+    _token_cache.move_to_end(token_hash)
+    while len(_token_cache) > TOKEN_CACHE_MAX:
+        _token_cache.popitem(last=False)
+
+def cached_user(token: str):
+    """Usuário de um token já validado e ainda no cache (sem verificar assinatura); senão None."""
+    return _token_cache_get(hashlib.sha256(token.encode("utf-8")).hexdigest())
+
+def clear_token_cache() -> None:
+    _token_cache.clear()
+
+def _drop_tokens_without_kid(kids) -> None:
+    """Remove do cache os tokens assinados por chaves que não estão mais no JWKS."""
+    for token_hash in [h for h, entry in _token_cache.items() if entry[2] not in kids]:
+        del _token_cache[token_hash]
+
 async def get_supabase_key_for_token(token: str):
     """Seleciona a chave pública correta do JWKS com base no 'kid' do token."""
     try:
@@ -43,24 +163,33 @@ async def get_supabase_key_for_token(token: str):
                 detail="Token sem KID. Faça login novamente."
             )
 
+        # JWKS expirado (TTL): atualiza; se a busca falhar, segue com as chaves em cache
+        now = time.time()
+        if now >= _jwks_state["expires_at"]:
+            try:
+                await refresh_jwks()
+            except (httpx.RequestError, httpx.HTTPStatusError):
+                if not _jwks_cache.get("keys"):
+                    raise
+                _jwks_state["expires_at"] = now + JWKS_MIN_REFRESH_INTERVAL_SECONDS
+
         # Procura no cache primeiro
         key = _find_key_by_kid(_jwks_cache, kid)
         if key:
-            return key
+            return _parsed_key(kid, key)
 
-        # Atualiza JWKS e tenta novamente
-        jwks = await _fetch_jwks()
-        _jwks_cache.clear()
-        _jwks_cache.update(jwks)
+        # KID desconhecido: atualiza o JWKS no máximo uma vez por intervalo
+        if time.time() - _jwks_state["fetched_at"] >= JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+            await refresh_jwks()
+            key = _find_key_by_kid(_jwks_cache, kid)
 
-        key = _find_key_by_kid(jwks, kid)
         if not key:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Chave pública não encontrada para o token. Faça login novamente."
             )
-        return key
-    except httpx.RequestError as exc:
+        return _parsed_key(kid, key)
+    except (httpx.RequestError, httpx.HTTPStatusError) as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Falha ao buscar JWKS no Supabase: {exc}",
@@ -73,6 +202,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Credenciais inválidas. Por favor, faça login novamente.",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Token idêntico já validado e ainda dentro do 'exp': dispensa a verificação de assinatura
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = _token_cache_get(token_hash)
+    if cached is not None:
+        return cached
+
     try:
         key = await get_supabase_key_for_token(token)
 
@@ -90,7 +225,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         if not user_id:
             raise credentials_exception
 
-        return {"id": user_id, "email": payload.get("email")}
+        # org_id (app_metadata do Supabase, se definido) identifica o escritório: partição da cobrança
+        app_metadata = payload.get("app_metadata") or {}
+        user = {"id": user_id, "email": payload.get("email"), "org_id": app_metadata.get("org_id")}
+        _token_cache_put(token_hash, user, payload.get("exp"), jwt.get_unverified_header(token).get("kid"))
+        return user
     except JWTError:
         raise credentials_exception
     except HTTPException:
@@ -0,0 +1,19 @@
+# benchmarks/_bootstrap.py
+# Caminhos do app para os benchmarks. O engine de cobrança e os módulos de routes/ são importados
+# como módulos de topo, como no uvicorn subindo a partir da raiz com esses diretórios no PYTHONPATH.
+# Os scripts rodam como `python benchmarks/<script>.py` (benchmarks/ já está no sys.path).
+
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP_PYTHONPATH = [ROOT, os.path.join(ROOT, "modules", "cobranca", "core"), os.path.join(ROOT, "routes")]
+
+def add_app_paths() -> None:
+    """Coloca os caminhos do app no início do sys.path (para importar o app neste processo)."""
+    sys.path[:0] = [path for path in APP_PYTHONPATH if path not in sys.path]
+
+def app_pythonpath(*extra: str) -> str:
+    """PYTHONPATH de um processo filho que importa o app (uvicorn, --child)."""
+    return os.pathsep.join([*APP_PYTHONPATH, *extra])
@@ -0,0 +1,98 @@
+# benchmarks/bench_auth.py
+# Overhead de autenticação por requisição (get_current_user) antes e depois dos caches.
+# "antes": jwt.decode com o JWK cru (chave RSA reconstruída a cada chamada).
+# "depois": chave pré-convertida por KID + cache de tokens já validados.
+#
+# Uso: python benchmarks/bench_auth.py [--n 2000]
+
+import os
+import json
+import time
+import asyncio
+import argparse
+
+from _bootstrap import add_app_paths
+
+add_app_paths()
+os.environ.setdefault("SUPABASE_URL", "http://supabase.local")
+os.environ.setdefault("SUPABASE_ANON_KEY", "bench")
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt, jwk
+
+import auth
+
+KID = "bench-kid"
+
+def make_keypair():
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": KID, "alg": "RS256", "use": "sig"})
+    return private_pem, public_jwk
+
+def make_token(private_pem, sub="user-1"):
+    now = int(time.time())
+    claims = {
+        "sub": sub, "email": f"{sub}@example.com", "aud": "authenticated",
+        "iss": f"{auth.SUPABASE_URL}/auth/v1", "iat": now, "exp": now + 3600,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": KID})
+
+def baseline_decode(token, key_dict):
+    jwt.get_unverified_header(token)
+    return jwt.decode(
+        token, key_dict, algorithms=["RS256"], audience="authenticated",
+        issuer=f"{auth.SUPABASE_URL}/auth/v1", options={"verify_aud": True, "verify_iss": True},
+    )
+
+async def run(n: int, n_users: int):
+    private_pem, public_jwk = make_keypair()
+    auth._jwks_cache.clear()
+    auth._jwks_cache.update({"keys": [public_jwk]})
+    auth._jwks_state.update({"fetched_at": time.time(), "expires_at": float("inf")})
+    tokens = [make_token(private_pem, f"user-{i}") for i in range(n_users)]
+
+    start = time.perf_counter()
+    for i in range(n):
+        baseline_decode(tokens[i % n_users], public_jwk)
+    before = time.perf_counter() - start
+
+    # Só chave pré-convertida (primeira requisição de cada token)
+    auth._parsed_keys.clear()
+    start = time.perf_counter()
+    for i in range(n):
+        auth.clear_token_cache()
+        await auth.get_current_user(tokens[i % n_users])
+    parsed_only = time.perf_counter() - start
+
+    auth.clear_token_cache()
+    start = time.perf_counter()
+    for i in range(n):
+        await auth.get_current_user(tokens[i % n_users])
+    cached = time.perf_counter() - start
+
+    return {
+        "requests": n,
+        "distinct_tokens": n_users,
+        "before_us_per_req": round(before / n * 1e6, 1),
+        "parsed_key_us_per_req": round(parsed_only / n * 1e6, 1),
+        "token_cache_us_per_req": round(cached / n * 1e6, 1),
+        "speedup_cached": round(before / cached, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.n, args.users)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_contacts.py
+# Laços quentes que usam os contatos dos clientes:
+#   - sync_charges_with_clients com todas as cobranças desatualizadas (os telefones dos clientes
+#     mudam antes de cada passada, então cada cobrança é revalidada);
+#   - envio para --messages clientes via send_whatsapp_message (telefone do cadastro: phoneE164
+#     quando existe) contra o stub local da Z-API;
+#   - renormalize_clients (job em lote sobre a base já existente), quando disponível.
+#
+# Uso: python benchmarks/bench_contacts.py [--clients 20000] [--charges 100000] [--messages 2000]
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from _bootstrap import add_app_paths
+
+add_app_paths()
+
+import stubs
+import synthetic
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=20000)
+    parser.add_argument("--charges", type=int, default=100000)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="konty-contacts-")
+    zapi = stubs.zapi_stub()
+    dataset = synthetic.cobranca_dataset(args.clients, args.charges, 0, 0)
+    synthetic.write_cobranca_dataset(data_dir, dataset, {"zapiInstanceId": "bench", "zapiToken": "bench", "zapiSecurityToken": "bench"})
+    os.environ.update(COBRANCA_DATA_DIR=data_dir, COBRANCA_DURABILITY="deferred", ZAPI_BASE_URL=zapi.url)
+
+    import engine
+    engine.load()
+    report = {"clients": args.clients, "charges": args.charges, "messages": args.messages}
+    try:
+        if hasattr(engine, "renormalize_clients"):
+            t0 = time.perf_counter()
+            report["renormalize_updated"] = engine.renormalize_clients()
+            report["renormalize_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        ids = [c["id"] for c in dataset["clients"]]
+        best = float("inf")
+        for r in range(args.repeat):
+            with engine.transaction():
+                for i, cid in enumerate(ids):
+                    engine.update_client(cid, {"phone": f"119{(i * 7919 + r) % 10**8:08d}"})
+            t0 = time.perf_counter()
+            updated = engine.sync_charges_with_clients()
+            best = min(best, time.perf_counter() - t0)
+        report["sync_ms"] = round(best * 1000, 1)
+        report["sync_updated"] = updated
+
+        rows = engine.list_clients()[:args.messages]
+        hits = zapi.hits
+        t0 = time.perf_counter()
+        for c in rows:
+            engine.send_whatsapp_message(c.get("phoneE164") or c.get("phone"), "Mensagem de teste")
+        wall = time.perf_counter() - t0
+        report["dispatch_ms"] = round(wall * 1000, 1)
+        report["dispatch_ms_per_message"] = round(wall * 1000 / max(len(rows), 1), 3)
+        report["zapi_hits"] = zapi.hits - hits
+    finally:
+        engine.shutdown()
+        zapi.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
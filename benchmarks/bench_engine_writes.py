@@ -0,0 +1,73 @@
+# benchmarks/bench_engine_writes.py
+# Escritas concorrentes no engine de cobrança (como no threadpool das rotas sync).
+# N threads fazem add/update de cobranças sobre uma base de --records registros e medimos
+# operações/s, latência e quantas gravações de charges.json foram feitas (group commit:
+# escritas simultâneas viram uma gravação só). O tempo total inclui o flush final, então
+# os modos de COBRANCA_DURABILITY (deferred, sync, fsync) são comparáveis.
+#
+# Uso: COBRANCA_DURABILITY=sync python benchmarks/bench_engine_writes.py [--records 20000] [--ops 400] [--threads 1,4,16]
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from _bootstrap import add_app_paths
+
+add_app_paths()
+
+import synthetic
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--ops", type=int, default=400)
+    parser.add_argument("--threads", default="1,4,16")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="konty-engine-")
+    dataset = synthetic.cobranca_dataset(n_clients=100, n_charges=args.records, n_logs=0, n_recurrents=0)
+    synthetic.write_cobranca_dataset(data_dir, dataset, {})
+    os.environ["COBRANCA_DATA_DIR"] = data_dir
+    import engine
+    engine.load()
+
+    saves = {"n": 0}
+    engine.register_hook("save_data", lambda filepath, duration: saves.__setitem__("n", saves["n"] + 1))
+    ids = [ch["id"] for ch in dataset["charges"][:1000]]
+
+    def op(i):
+        t0 = time.perf_counter()
+        if i % 2:
+            engine.add_charge({"clientName": f"Bench {i}", "value": 1.0, "competence": "03/2024"})
+        else:
+            engine.update_charge(ids[i % len(ids)], {"value": float(i)})
+        return time.perf_counter() - t0
+
+    results = {}
+    try:
+        for threads in [int(t) for t in args.threads.split(",")]:
+            saves["n"] = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as ex:
+                lat = sorted(ex.map(op, range(args.ops)))
+            engine.flush()
+            wall = time.perf_counter() - start
+            results[f"threads_{threads}"] = {
+                "ops": args.ops,
+                "ops_per_s": round(args.ops / wall, 1),
+                "p50_ms": round(lat[len(lat) // 2] * 1000, 2),
+                "p95_ms": round(lat[int(len(lat) * 0.95)] * 1000, 2),
+                "disk_writes": saves["n"],
+            }
+    finally:
+        engine.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(json.dumps({"records": args.records, "durability": engine.DURABILITY, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
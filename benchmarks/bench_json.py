@@ -0,0 +1,94 @@
+# benchmarks/bench_json.py
+# Serialização de listas grandes: caminho padrão (response_model + json da stdlib) contra
+# FAST_JSON_RESPONSES (projeção sem validação + orjson), e persistência do engine indentada
+# contra COBRANCA_JSON_COMPACT.
+#
+# Uso: python benchmarks/bench_json.py [--records 100000] [--repeat 3]
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from _bootstrap import add_app_paths
+
+add_app_paths()
+
+import httpx
+
+import synthetic
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+async def measure_http(app, path: str, repeat: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        best, size, body = float("inf"), 0, None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            resp = await client.get(path)
+            best = min(best, time.perf_counter() - t0)
+            size, body = len(resp.content), resp.json()
+    return best, size, body
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="konty-json-")
+    dataset = synthetic.cobranca_dataset(n_clients=1000, n_charges=args.records, n_logs=args.records, n_recurrents=0)
+    synthetic.write_cobranca_dataset(data_dir, dataset, {})
+    os.environ.update({"COBRANCA_DATA_DIR": data_dir, "SUPABASE_URL": "http://bench", "SUPABASE_ANON_KEY": "bench"})
+
+    from fastapi import FastAPI
+    import engine
+    import cobranca
+    from utils import fast_json
+
+    app = FastAPI()
+    app.include_router(cobranca.router)
+    report = {"records": args.records, "orjson": fast_json.orjson is not None, "http": {}, "persistence": {}}
+
+    try:
+        for path in ("/api/logs", "/api/charges"):
+            fast_json.ENABLED = False
+            default_s, default_size, default_body = asyncio.run(measure_http(app, path, args.repeat))
+            fast_json.ENABLED = True
+            fast_s, fast_size, fast_body = asyncio.run(measure_http(app, path, args.repeat))
+            report["http"][path] = {
+                "default_ms": round(default_s * 1000, 1),
+                "fast_ms": round(fast_s * 1000, 1),
+                "speedup": round(default_s / fast_s, 2),
+                "default_bytes": default_size,
+                "fast_bytes": fast_size,
+                "same_body": default_body == fast_body,
+            }
+
+        rows = engine.list_charges()
+        for compact in (False, True):
+            engine.JSON_COMPACT = compact
+            raw = engine._encode(rows)
+            report["persistence"]["compact" if compact else "indent4"] = {
+                "encode_ms": round(best_of(args.repeat, lambda: engine._encode(rows)) * 1000, 1),
+                "decode_ms": round(best_of(args.repeat, lambda: engine._decode(raw)) * 1000, 1),
+                "bytes": len(raw),
+            }
+    finally:
+        engine.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# benchmarks/bench_middleware.py
+# Custo da pilha de middlewares do main.py (logging/métricas/trace id + headers de segurança):
+#   - throughput de GET / chamando o app ASGI direto (sem rede: isola o custo dos middlewares)
+#     e via uvicorn em subprocesso, com conexões concorrentes;
+#   - time-to-first-byte de uma StreamingResponse (rota extra /bench/stream, só neste benchmark),
+#     que emite o primeiro pedaço na hora e os demais com atraso, e o tempo total do stream.
+#
+# Uso: python benchmarks/bench_middleware.py [--requests 5000] [--concurrency 32] [--streams 50]
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+from _bootstrap import BENCH_DIR, ROOT, add_app_paths, app_pythonpath
+
+STREAM_CHUNKS = 10
+STREAM_DELAY_S = 0.02
+
+def _bench_app():
+    """main.app com uma rota de streaming para medir TTFB (importado pelo uvicorn como bench_middleware:app)."""
+    from fastapi.responses import StreamingResponse
+    import main
+
+    async def chunks():
+        for i in range(STREAM_CHUNKS):
+            if i:
+                await asyncio.sleep(STREAM_DELAY_S)
+            yield b"x" * 4096
+
+    @main.app.get("/bench/stream", include_in_schema=False)
+    async def bench_stream():
+        return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+    return main.app
+
+def __getattr__(name):
+    # `uvicorn bench_middleware:app` resolve o atributo só no processo do servidor
+    if name == "app":
+        globals()["app"] = _bench_app()
+        return globals()["app"]
+    raise AttributeError(name)
+
+# ---------- ASGI direto ----------
+
+async def _call(app, path: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+        "client": ("127.0.0.1", 1234), "server": ("bench", 80),
+    }
+    status = 0
+    sent_request = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()  # desconexão só depois da resposta completa
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif not message.get("more_body", False):
+            done.set()
+
+    await app(scope, receive, send)
+    return status
+
+async def _inprocess(n: int) -> dict:
+    import main
+    app = main.app
+    async with app.router.lifespan_context(app):
+        for _ in range(200):
+            await _call(app, "/")
+        t0 = time.perf_counter()
+        for _ in range(n):
+            assert await _call(app, "/") == 200
+        wall = time.perf_counter() - t0
+    return {"asgi_root_rps": round(n / wall, 1), "asgi_root_us_per_req": round(wall / n * 1e6, 1)}
+
+# ---------- uvicorn ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _http(base: str, n: int, concurrency: int, streams: int) -> dict:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        for _ in range(100):
+            await client.get("/")
+
+        remaining = n
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                assert (await client.get("/")).status_code == 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+        ttfb, total = [], []
+        for _ in range(streams):
+            t1 = time.perf_counter()
+            async with client.stream("GET", "/bench/stream") as resp:
+                first = None
+                async for _chunk in resp.aiter_raw():
+                    if first is None:
+                        first = time.perf_counter() - t1
+            ttfb.append(first)
+            total.append(time.perf_counter() - t1)
+
+    ttfb.sort()
+    total.sort()
+    return {
+        "http_root_rps": round(n / wall, 1),
+        "stream_ttfb_p50_ms": round(ttfb[len(ttfb) // 2] * 1000, 2),
+        "stream_ttfb_max_ms": round(ttfb[-1] * 1000, 2),
+        "stream_total_p50_ms": round(total[len(total) // 2] * 1000, 2),
+    }
+
+async def _uvicorn(env: dict, n: int, concurrency: int, streams: int) -> dict:
+    import httpx
+
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "bench_middleware:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn encerrou durante a subida")
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.05)
+        return await _http(base, n, concurrency, streams)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        add_app_paths()
+        print(json.dumps(asyncio.run(_inprocess(args.requests))))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="konty-mw-")
+    env = dict(
+        os.environ,
+        PYTHONPATH=app_pythonpath(BENCH_DIR),
+        SUPABASE_URL="http://127.0.0.1:9", SUPABASE_ANON_KEY="bench",
+        COBRANCA_DATA_DIR=os.path.join(workdir, "cobranca"),
+        PDF_JOBS_DIR=os.path.join(workdir, "pdf_jobs"),
+        ENGINE_WARMUP="",
+    )
+    try:
+        # Logs por requisição vão para stderr: descartados nos dois modos
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--requests", str(args.requests)],
+                              env=env, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True)
+        report = {"requests": args.requests, "concurrency": args.concurrency, "streams": args.streams,
+                  "stream": {"chunks": STREAM_CHUNKS, "delay_ms": STREAM_DELAY_S * 1000}}
+        report.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+        report.update(asyncio.run(_uvicorn(env, args.requests, args.concurrency, args.streams)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
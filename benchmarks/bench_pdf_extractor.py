@@ -0,0 +1,144 @@
+# benchmarks/bench_pdf_extractor.py
+# Micro-benchmark dos extratores do engine extrair-pdf sobre páginas sintéticas.
+# Compara a implementação anterior (re.search/re.sub por chamada, texto completo)
+# com o ExtratorCampos (padrões pré-compilados, cabeçalho, nome memoizado).
+#
+# Uso: python benchmarks/bench_pdf_extractor.py [--pages 10000]
+
+import re
+import json
+import time
+import random
+import argparse
+
+from _bootstrap import add_app_paths
+
+add_app_paths()
+
+from unidecode import unidecode
+from utils.module_registry import get_engine
+
+# ---------- Implementação anterior (baseline) ----------
+
+def legacy_competencia(text):
+    match = re.search(r'(0[1-9]|1[0-2])\.(20\d{2})', text)
+    if match:
+        return match.group(0)
+    match2 = re.search(
+        r'((?:Jan|Fev|Mar|Abr|Mai|Jun|Jul|Ago|Set|Out|Nov|Dez)[a-z]*|'
+        r'janeiro|fevereiro|março|marco|abril|maio|junho|julho|agosto|'
+        r'setembro|outubro|novembro|dezembro)\s+de\s+(\d{4})',
+        text, flags=re.IGNORECASE
+    )
+    if match2:
+        meses_map = {
+            'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04',
+            'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09',
+            'outubro': '10', 'novembro': '11', 'dezembro': '12',
+            'jan': '01', 'fev': '02', 'mar': '03', 'abr': '04', 'mai': '05', 'jun': '06',
+            'jul': '07', 'ago': '08', 'set': '09', 'out': '10', 'nov': '11', 'dez': '12'
+        }
+        return f"{meses_map.get(match2.group(1).lower()[:3], 'XX')}.{match2.group(2)}"
+    return "DataDesconhecida"
+
+def legacy_codigo_nome(text):
+    codigo, nome = "CodigoDesconhecido", "NomeDesconhecido"
+    m_cod = re.search(r'Código\s*\n?\s*(\d+)', text, re.IGNORECASE)
+    if m_cod:
+        codigo = m_cod.group(1).strip()
+    m_nome = re.search(r'Nome\s+do\s+Funcionário\s*\n?\s*([A-Z\s\.-]+)', text, re.IGNORECASE)
+    if m_nome:
+        nome = re.sub(r'\s*(\(CBO:|\(A\)|[A-Z\s]*\d{4})\s*$', '', m_nome.group(1).strip()).strip()
+        nome = re.sub(r'\s*\n\s*', ' ', nome).strip()
+    return codigo, nome
+
+def legacy_condominio_cnpj(text):
+    condominio, cnpj = "CondominioDesconhecido", "CNPJDesconhecido"
+    m_cnpj = re.search(r'CNPJ:\s*(\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2})', text)
+    if m_cnpj:
+        cnpj = m_cnpj.group(1).strip()
+    m_cond = re.search(r'^(.*?)\s*(?:CNPJ:|CC:)', text, re.MULTILINE | re.IGNORECASE)
+    if m_cond:
+        bruto = re.sub(r'^Folha Mensal\s*', '', m_cond.group(1).strip(), flags=re.IGNORECASE).strip()
+        condominio = bruto if bruto else "CondominioDesconhecido"
+    else:
+        first = re.match(r'^\s*([^\n\r]+)', text)
+        if first:
+            bruto = re.sub(r'\s*Folha Mensal$', '', first.group(1).strip(), flags=re.IGNORECASE).strip()
+            condominio = bruto if bruto else "CondominioDesconhecido"
+    return condominio, cnpj
+
+def legacy_clean(name):
+    if not name:
+        return "CONDOMINIO DESCONHECIDO"
+    name = re.sub(r'\s*(?:CNPJ:|CC:)\s*.*?(?:Folha Mensal|$)', '', name, flags=re.IGNORECASE).strip()
+    name = re.sub(r'Folha Mensal$', '', name, flags=re.IGNORECASE).strip()
+    name = re.sub(r'CONDOMINIO\s+EDIFICIO\s+', 'CONDOMINIO ', name, flags=re.IGNORECASE).strip()
+    name = re.sub(r'\s+', ' ', name).strip()
+    return unidecode(name).upper()
+
+def legacy_extrair(text):
+    bruto, cnpj = legacy_condominio_cnpj(text)
+    codigo, nome = legacy_codigo_nome(text)
+    return {"competencia": legacy_competencia(text), "condominio": legacy_clean(bruto),
+            "cnpj": cnpj, "codigo": codigo, "nome": nome}
+
+# ---------- Dados sintéticos ----------
+
+def synthetic_pages(n: int, n_condominios: int = 40, body_lines: int = 60, seed: int = 42):
+    rnd = random.Random(seed)
+    condos = [f"CONDOMÍNIO EDIFÍCIO RESIDENCIAL Nº {i} JARDIM SÃO JOSÉ" for i in range(n_condominios)]
+    pages = []
+    for i in range(n):
+        k = rnd.randrange(n_condominios)
+        header = [
+            f"{condos[k]} CNPJ: {10 + k:02d}.345.678/0001-{k % 100:02d} Folha Mensal",
+            "Recibo de Pagamento de Salário",
+            f"Referente a Março de 2024    Competência 03.2024",
+            "Código", str(1000 + rnd.randrange(500)),
+            "Nome do Funcionário", f"MARIA DAS DORES {chr(65 + rnd.randrange(26))} (CBO: 5143)",
+        ]
+        body = [f"{rnd.randrange(100, 999)} Provento {j} {rnd.randrange(1, 9999)},{rnd.randrange(10, 99)}" for j in range(body_lines)]
+        pages.append("\n".join(header + body))
+    return pages
+
+def _bench(fn, pages, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for p in pages:
+            fn(p)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = get_engine("extrair-pdf")
+    pages = synthetic_pages(args.pages)
+
+    # Paridade: os dois caminhos devem produzir os mesmos campos
+    extrator = engine.ExtratorCampos()
+    for p in pages[:500]:
+        novo = extrator.extrair(p)
+        antigo = legacy_extrair(p)
+        assert {k: novo[k] for k in antigo} == antigo, (novo, antigo)
+
+    legacy_s = _bench(legacy_extrair, pages, args.repeat)
+    engine.clean_condominio_name.cache_clear()
+    new_s = _bench(extrator.extrair, pages, args.repeat)
+
+    print(json.dumps({
+        "pages": args.pages,
+        "legacy_s": round(legacy_s, 4),
+        "extrator_s": round(new_s, 4),
+        "legacy_us_per_page": round(legacy_s / args.pages * 1e6, 2),
+        "extrator_us_per_page": round(new_s / args.pages * 1e6, 2),
+        "speedup": round(legacy_s / new_s, 2),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
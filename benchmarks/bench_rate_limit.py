@@ -0,0 +1,135 @@
+# benchmarks/bench_rate_limit.py
+# Controle de admissão (utils/rate_limit.py) com `uvicorn main:app` em subprocesso, com e sem
+# RATE_LIMIT_ENABLED:
+#   - um cliente "clicando várias vezes": --spam POSTs simultâneos em /api/sync_charges_with_clients
+#     (--records registros sintéticos em cada coleção), repetidos a cada --interval segundos;
+#   - ao mesmo tempo, requisições leves (GET /) em sequência; mede a latência delas (p50/p95),
+#     o tempo de resposta dos 429 e quantas sincronizações rodaram de fato.
+#
+# Uso: python benchmarks/bench_rate_limit.py [--records 50000] [--spam 8] [--rounds 5]
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+
+import httpx
+
+import synthetic
+from _bootstrap import ROOT, app_pythonpath
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def pct(values, p: float) -> float:
+    values = sorted(values)
+    return round(values[min(int(len(values) * p / 100), len(values) - 1)] * 1000, 2)
+
+async def _scenario(base: str, spam: int, rounds: int, interval: float) -> dict:
+    async with httpx.AsyncClient(base_url=base, timeout=600, limits=httpx.Limits(max_connections=spam + 4)) as client:
+        stop = asyncio.Event()
+        light = []
+
+        async def light_loop():
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                (await client.get("/")).raise_for_status()
+                light.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.01)
+
+        codes = {}
+        rejected, admitted = [], []
+
+        async def one_sync():
+            t0 = time.perf_counter()
+            resp = await client.post("/api/sync_charges_with_clients")
+            elapsed = time.perf_counter() - t0
+            codes[resp.status_code] = codes.get(resp.status_code, 0) + 1
+            (rejected if resp.status_code == 429 else admitted).append(elapsed)
+
+        task = asyncio.create_task(light_loop())
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*(one_sync() for _ in range(spam)))
+            await asyncio.sleep(interval)
+        wall = time.perf_counter() - t0
+        stop.set()
+        await task
+
+    out = {
+        "status_codes": {str(k): v for k, v in sorted(codes.items())},
+        "light_p50_ms": pct(light, 50), "light_p95_ms": pct(light, 95), "light_max_ms": pct(light, 100),
+        "wall_s": round(wall, 2),
+    }
+    if admitted:
+        out["sync_p50_ms"] = pct(admitted, 50)
+    if rejected:
+        out["rejected_p50_ms"] = pct(rejected, 50)
+        out["rejected_max_ms"] = pct(rejected, 100)
+    return out
+
+async def _run(env: dict, args) -> dict:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--no-access-log"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn encerrou durante a subida")
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.05)
+        return await _scenario(base, args.spam, args.rounds, args.interval)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--spam", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="konty-ratelimit-")
+    data_dir = os.path.join(workdir, "cobranca")
+    dataset = synthetic.cobranca_dataset(n_clients=args.records, n_charges=args.records, n_logs=0, n_recurrents=0)
+    synthetic.write_cobranca_dataset(data_dir, dataset, {})
+    del dataset
+    base_env = dict(
+        os.environ,
+        PYTHONPATH=app_pythonpath(),
+        SUPABASE_URL="http://127.0.0.1:9", SUPABASE_ANON_KEY="bench",
+        COBRANCA_DATA_DIR=data_dir, COBRANCA_DURABILITY="deferred",
+        PDF_JOBS_DIR=os.path.join(workdir, "pdf_jobs"),
+        ENGINE_WARMUP="", LOG_FORMAT="json",
+    )
+    report = {"records": args.records, "spam": args.spam, "rounds": args.rounds, "interval_s": args.interval}
+    try:
+        for label, enabled in (("off", "0"), ("on", "1")):
+            report[label] = asyncio.run(_run(dict(base_env, RATE_LIMIT_ENABLED=enabled), args))
+            print(f"{label}: {report[label]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
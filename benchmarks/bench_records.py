@@ -0,0 +1,108 @@
+# benchmarks/bench_records.py
+# Memória e CPU do engine com registros em dict (padrão) contra COBRANCA_COMPACT_RECORDS=1
+# (registros com __slots__ e strings repetidas internadas), sobre uma base grande de logs.
+# Cada modo roda em um subprocesso novo (a flag é lida na importação do engine) e mede:
+# carga inicial, RSS após carregar, heap vivo (tracemalloc, em uma carga separada), listagem (projeção como no FAST_JSON_RESPONSES),
+# agregados, sync de cobranças, processamento de recorrentes e add_log (em memória, com
+# write-behind) e a serialização de logs.json.
+#
+# Uso: python benchmarks/bench_records.py [--logs 500000] [--charges 50000] [--repeat 3]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from _bootstrap import add_app_paths
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 1)
+
+def child(data_dir: str, repeat: int, heap: bool) -> dict:
+    add_app_paths()
+    import gc
+    if heap:
+        import tracemalloc
+        tracemalloc.start()
+        import engine
+        engine.load()
+        gc.collect()
+        live, peak = tracemalloc.get_traced_memory()
+        return {"heap_live_mb": round(live / 2**20, 1), "heap_peak_mb": round(peak / 2**20, 1)}
+    from utils import fast_json
+    from schemas import Charge, Log
+
+    base_rss = rss_mb()
+    t0 = time.perf_counter()
+    import engine
+    engine.load()
+    load_ms = round((time.perf_counter() - t0) * 1000, 1)
+    gc.collect()
+    out = {"load_ms": load_ms, "rss_after_load_mb": rss_mb(), "rss_data_mb": round(rss_mb() - base_rss, 1)}
+    out["list_logs_ms"] = best_of(repeat, lambda: fast_json.project(engine.list_logs(), Log))
+    out["list_charges_ms"] = best_of(repeat, lambda: fast_json.project(engine.list_charges(), Charge))
+    out["aggregates_ms"] = best_of(repeat, engine.aggregates)
+    out["sync_ms"] = best_of(repeat, engine.sync_charges_with_clients)
+    out["process_recurrents_ms"] = best_of(repeat, engine.process_recurrents)
+    out["save_logs_ms"] = best_of(repeat, lambda: engine._write_atomic(engine.LOGS_FILE + ".bench", engine.logs))
+    out["add_log_ms"] = best_of(repeat, lambda: [engine.add_log({"status": "Enviado", "origin": "Manual"}) for _ in range(100)])
+    engine.shutdown()
+    out["rss_peak_mb"] = round(__import__("resource").getrusage(__import__("resource").RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", type=int, default=500000)
+    parser.add_argument("--charges", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--heap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.repeat, args.heap)))
+        return
+
+    import synthetic
+
+    report = {"logs": args.logs, "charges": args.charges, "modes": {}}
+    for mode, compact in (("dict", "0"), ("compact", "1")):
+        # Base nova por modo: as operações medidas alteram os arquivos
+        data_dir = tempfile.mkdtemp(prefix="konty-records-")
+        try:
+            dataset = synthetic.cobranca_dataset(
+                n_clients=max(args.charges // 10, 10), n_charges=args.charges, n_logs=args.logs, n_recurrents=200
+            )
+            synthetic.write_cobranca_dataset(data_dir, dataset, {"zapiInstanceId": "", "zapiToken": "", "zapiSecurityToken": ""})
+            del dataset
+            env = dict(os.environ, COBRANCA_DATA_DIR=data_dir, COBRANCA_COMPACT_RECORDS=compact, COBRANCA_DURABILITY="deferred")
+            result = {}
+            for extra in (["--heap"], []):  # heap primeiro: a segunda execução altera os dados
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", data_dir, "--repeat", str(args.repeat), *extra],
+                    env=env, capture_output=True, text=True, check=True,
+                )
+                result.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+            report["modes"][mode] = result
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    d, c = report["modes"]["dict"], report["modes"]["compact"]
+    report["ratio_compact_vs_dict"] = {k: round(c[k] / d[k], 2) for k in d if d[k]}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_startup.py
+# Custo de subida do app (main.py) por STARTUP_MODE (eager | background | lazy):
+#   - `python -X importtime -c "import main"`: tempo total de importação e os imports diretos
+#     mais caros do main (o engine de cobrança não lê dados na importação);
+#   - time-to-first-200 com `uvicorn main:app` em subprocesso: até o primeiro GET / e até o
+#     primeiro GET /api/clients (rota que depende das coleções carregadas), com --records
+#     registros sintéticos em cada coleção de cobrança.
+#
+# Uso: python benchmarks/bench_startup.py [--records 50000] [--repeat 3] [--modes eager,background,lazy]
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+
+import httpx
+
+import synthetic
+from _bootstrap import ROOT, app_pythonpath
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def import_times(env: dict, top: int) -> dict:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    total_us, direct = 0, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # cabeçalho
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        if name.strip() == "main":
+            total_us = int(cumulative)
+        elif depth == 1:
+            direct.append((int(cumulative), name.strip()))
+    direct.sort(reverse=True)
+    return {"import_main_ms": round(total_us / 1000, 1),
+            "slowest_imports_ms": {name: round(us / 1000, 1) for us, name in direct[:top]}}
+
+def first_200(env: dict) -> dict:
+    port = _free_port()
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--log-level", "warning", "--no-access-log"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    out = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+            for key, path in (("root_s", "/"), ("clients_s", "/api/clients")):
+                while True:
+                    if proc.poll() is not None:
+                        raise RuntimeError("uvicorn encerrou durante a subida")
+                    try:
+                        if client.get(path).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        time.sleep(0.01)
+                out[key] = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", default="eager,background,lazy")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="konty-startup-")
+    data_dir = os.path.join(workdir, "cobranca")
+    os.makedirs(data_dir)
+    dataset = synthetic.cobranca_dataset(
+        n_clients=args.records, n_charges=args.records, n_logs=args.records, n_recurrents=min(args.records, 1000)
+    )
+    synthetic.write_cobranca_dataset(data_dir, dataset, {})
+    del dataset
+    base_env = dict(
+        os.environ,
+        PYTHONPATH=app_pythonpath(),
+        SUPABASE_URL="http://127.0.0.1:9", SUPABASE_ANON_KEY="bench",
+        COBRANCA_DATA_DIR=data_dir,
+        PDF_JOBS_DIR=os.path.join(workdir, "pdf_jobs"),
+        LOG_FORMAT=os.environ.get("LOG_FORMAT", "json"),
+    )
+
+    report = {"records": args.records, "repeat": args.repeat}
+    try:
+        report.update(import_times(base_env, args.top))
+        report["time_to_first_200"] = {}
+        for mode in args.modes.split(","):
+            env = dict(base_env, STARTUP_MODE=mode)
+            runs = [first_200(env) for _ in range(args.repeat)]
+            report["time_to_first_200"][mode] = {
+                key: round(statistics.median(r[key] for r in runs), 3) for key in runs[0]
+            }
+            print(f"{mode}: {report['time_to_first_200'][mode]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
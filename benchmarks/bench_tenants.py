@@ -0,0 +1,139 @@
+# benchmarks/bench_tenants.py
+# Partições por tenant (COBRANCA_MULTI_TENANT) contra a base global única, no nível do engine:
+#   - isolamento: um tenant "ocupado" (--busy-logs logs, --busy-threads threads gravando logs sem
+#     parar) e um tenant pequeno gravando logs ao mesmo tempo; mede a latência do pequeno com
+#     todos na mesma base (global) e com cada um na sua partição (tenants);
+#   - memória: --tenants tenants com --tenant-logs logs cada, acessados em sequência com
+#     COBRANCA_TENANTS_MAX=--max-active; RSS ao final contra todos residentes (sem limite).
+# Durabilidade "sync": cada escrita grava o arquivo da coleção antes de retornar.
+#
+# Uso: python benchmarks/bench_tenants.py [--busy-logs 200000] [--tenants 200] [--max-active 20]
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from _bootstrap import add_app_paths
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+def pct(values, p: float) -> float:
+    values = sorted(values)
+    return round(values[min(int(len(values) * p / 100), len(values) - 1)] * 1000, 2)
+
+def child_isolation(mode: str, ops: int, busy_threads: int) -> dict:
+    import engine
+    import tenants
+
+    def busy_engine():
+        if mode == "global":
+            return engine
+        return tenants._create("busy")  # instância própria, como a de tenants.use()
+
+    busy = busy_engine()
+    small = engine if mode == "global" else tenants._create("small")
+    busy.list_logs()
+    small.list_logs()
+
+    stop = threading.Event()
+    busy_ops = [0]
+
+    def busy_loop():
+        while not stop.is_set():
+            busy.add_log({"status": "Enviado", "origin": "Recorrente"})
+            busy_ops[0] += 1
+
+    threads = [threading.Thread(target=busy_loop) for _ in range(busy_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    lat = []
+    t0 = time.perf_counter()
+    for _ in range(ops):
+        s = time.perf_counter()
+        small.add_log({"status": "Enviado", "origin": "Manual"})
+        lat.append(time.perf_counter() - s)
+    wall = time.perf_counter() - t0
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"small_p50_ms": pct(lat, 50), "small_p95_ms": pct(lat, 95), "small_ops_s": round(ops / wall, 1),
+            "busy_ops": busy_ops[0]}
+
+def child_memory(n_tenants: int) -> dict:
+    import tenants
+
+    base = rss_mb()
+    t0 = time.perf_counter()
+    for i in range(n_tenants):
+        with tenants.use(f"t{i:04d}") as eng:
+            eng.list_logs()
+    wall = time.perf_counter() - t0
+    out = {"rss_growth_mb": round(rss_mb() - base, 1), "first_access_ms_avg": round(wall / n_tenants * 1000, 2)}
+    out.update(tenants.stats())
+    return out
+
+def run_child(env: dict, *argv) -> dict:
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), *argv], env=env,
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--busy-logs", type=int, default=200000)
+    parser.add_argument("--busy-threads", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--tenant-logs", type=int, default=5000)
+    parser.add_argument("--max-active", type=int, default=20)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        add_app_paths()
+        if args.child in ("global", "tenants"):
+            print(json.dumps(child_isolation(args.child, args.ops, args.busy_threads)))
+        else:
+            print(json.dumps(child_memory(args.tenants)))
+        return
+
+    import synthetic
+
+    workdir = tempfile.mkdtemp(prefix="konty-tenants-")
+    env = dict(os.environ, COBRANCA_DATA_DIR=workdir, COBRANCA_DURABILITY="sync", COBRANCA_MULTI_TENANT="1")
+    report = {"busy_logs": args.busy_logs, "busy_threads": args.busy_threads, "tenants": args.tenants,
+              "tenant_logs": args.tenant_logs, "isolation": {}, "memory": {}}
+    try:
+        big = synthetic.cobranca_dataset(n_clients=100, n_charges=0, n_logs=args.busy_logs, n_recurrents=0)
+        small = synthetic.cobranca_dataset(n_clients=10, n_charges=0, n_logs=100, n_recurrents=0)
+        # global: todos os logs na mesma base; tenants: cada um no seu diretório
+        synthetic.write_cobranca_dataset(workdir, big, {})
+        synthetic.write_cobranca_dataset(os.path.join(workdir, "tenants", "busy"), big, {})
+        synthetic.write_cobranca_dataset(os.path.join(workdir, "tenants", "small"), small, {})
+        del big
+        for mode in ("global", "tenants"):
+            report["isolation"][mode] = run_child(env, "--child", mode, "--ops", str(args.ops),
+                                                  "--busy-threads", str(args.busy_threads))
+            print(f"{mode}: {report['isolation'][mode]}", file=sys.stderr)
+
+        data = synthetic.cobranca_dataset(n_clients=50, n_charges=0, n_logs=args.tenant_logs, n_recurrents=0)
+        for i in range(args.tenants):
+            synthetic.write_cobranca_dataset(os.path.join(workdir, "tenants", f"t{i:04d}"), data, {})
+        for label, limit in (("lru", args.max_active), ("unbounded", args.tenants)):
+            menv = dict(env, COBRANCA_TENANTS_MAX=str(limit))
+            report["memory"][label] = run_child(menv, "--child", "memory", "--tenants", str(args.tenants))
+            print(f"{label}: {report['memory'][label]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# benchmarks/run_benchmarks.py
+# Harness de carga reprodutível para todos os roteadores do app (main.py).
+#
+# Modos:
+#   --mode inprocess  app via httpx.ASGITransport no mesmo processo (default)
+#   --mode uvicorn    sobe `uvicorn main:app` em subprocesso e dispara HTTP real (--workers N)
+#
+# Cargas: listagem/CRUD de cobrança com --records registros sintéticos, polling ocioso
+# (GET condicional com ETag/304 e /api/changes), agregados do painel, processamento de
+# recorrentes e envio WhatsApp contra um stub local da Z-API, separação de PDFs de folha
+# gerados, painel autenticado com JWT assinado localmente (JWKS em stub), entre outras.
+# Saída: JSON com throughput, p50/p95/p99 e pico de RSS por cenário (--out para gravar).
+#
+# Uso: python benchmarks/run_benchmarks.py --records 10000 --out bench.json
+#      python benchmarks/run_benchmarks.py --mode uvicorn --workers 2 --scenarios painel,cobranca_list
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+
+import httpx
+
+import stubs
+import synthetic
+from _bootstrap import ROOT, add_app_paths, app_pythonpath
+
+# ---------- Estatística ----------
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(latencies, errors: int, wall_s: float) -> dict:
+    lat = sorted(latencies)
+    n = len(lat)
+    return {
+        "requests": n,
+        "errors": errors,
+        "wall_s": round(wall_s, 4),
+        "throughput_rps": round(n / wall_s, 2) if wall_s else None,
+        "mean_ms": round(sum(lat) / n * 1000, 3) if n else None,
+        "p50_ms": round(percentile(lat, 50) * 1000, 3),
+        "p95_ms": round(percentile(lat, 95) * 1000, 3),
+        "p99_ms": round(percentile(lat, 99) * 1000, 3),
+        "max_ms": round(lat[-1] * 1000, 3) if n else None,
+    }
+
+def self_peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def proc_peak_rss_mb(pid: int):
+    """VmHWM (pico de RSS) de um processo e de seus filhos diretos (workers do uvicorn)."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return round(total / 1024, 1) if total else None
+
+# ---------- Execução ----------
+
+async def drive(client: httpx.AsyncClient, make_request, n: int, concurrency: int, ok_status=(200, 201, 202, 304)):
+    """Dispara `n` requisições com `concurrency` tarefas; make_request(i) -> (method, url, kwargs)."""
+    latencies = []
+    errors = 0
+    counter = iter(range(n))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, kwargs = make_request(i)
+            t0 = time.perf_counter()
+            try:
+                resp = await client.request(method, url, **kwargs)
+                await resp.aread()
+                if resp.status_code not in ok_status:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+LIST_PATHS = ("/api/clients", "/api/charges", "/api/logs", "/api/recurring_charges")
+
+async def prime(client: httpx.AsyncClient, ctx: dict, name: str) -> None:
+    """Guarda ETags/versão atuais antes dos cenários de polling (cenários anteriores alteram os dados)."""
+    if name == "cobranca_poll":
+        ctx["etags"] = {path: (await client.get(path)).headers.get("etag", "") for path in LIST_PATHS}
+    elif name == "cobranca_changes":
+        ctx["since"] = (await client.get("/api/changes")).json()["version"]
+
+def build_scenarios(args, ctx: dict) -> dict:
+    """Cenários: nome -> (requisições, concorrência, make_request)."""
+    n = args.requests
+    c = args.concurrency
+    auth = {"Authorization": f"Bearer {ctx['token']}"}
+    charge_body = {"clientName": "Cliente 000001", "clientPhone": "11999999999", "value": 10.5, "competence": "03/2024"}
+    pdf = ctx["pdf"]
+
+    def crud(i):
+        # Alterna criação e atualização; cada escrita regrava o arquivo inteiro no engine atual
+        if i % 2 == 0:
+            return "POST", "/api/charges", {"json": charge_body}
+        return "PUT", f"/api/charges/{ctx['charge_ids'][i % len(ctx['charge_ids'])]}", {"json": {"clientName": "Atualizado", "value": 1.0}}
+
+    return {
+        "root": (n, c, lambda i: ("GET", "/", {})),
+        "cobranca_list": (max(n // 10, 5), c, lambda i: ("GET", LIST_PATHS[i % 4], {})),
+        # Polling ocioso do frontend: GET condicional (304) e feed de alterações sem novidades
+        "cobranca_poll": (n, c, lambda i: ("GET", LIST_PATHS[i % 4], {"headers": {"If-None-Match": ctx["etags"].get(LIST_PATHS[i % 4], "")}})),
+        "cobranca_changes": (n, c, lambda i: ("GET", "/api/changes", {"params": {"since": ctx.get("since", "")}})),
+        "cobranca_aggregates": (n, c, lambda i: ("GET", "/api/aggregates", {})),
+        "cobranca_crud": (max(n // 20, 4), min(c, 4), crud),
+        "cobranca_sync": (max(n // 50, 3), 1, lambda i: ("POST", "/api/sync_charges_with_clients", {})),
+        "cobranca_process_recurring": (max(n // 50, 3), 1, lambda i: ("POST", "/api/process_recurring_charges", {})),
+        "send_whatsapp": (max(n // 5, 10), c, lambda i: ("POST", "/api/send_whatsapp", {"json": {"phoneNumber": "11999999999", "messageContent": f"oi {i}"}})),
+        "pdf_split": (args.pdf_requests, min(c, 2), lambda i: ("POST", "/modulos/processar-pdf", {"files": {"pdf_file": ("folha.pdf", pdf, "application/pdf")}})),
+        "painel": (n, c, lambda i: ("GET", "/painel/", {"headers": auth})),
+        "sistemas_cobranca": (args.sistemas_requests, c, lambda i: ("POST", "/sistemas/cobranca", {"headers": auth})),
+        "metrics": (max(n // 10, 5), 1, lambda i: ("GET", "/metrics", {})),
+    }
+
+def prepare(args) -> dict:
+    """Gera dados, sobe os stubs e monta o ambiente do app (antes de importar main)."""
+    workdir = tempfile.mkdtemp(prefix="konty-bench-")
+    data_dir = os.path.join(workdir, "data")
+
+    zapi = stubs.zapi_stub(latency_s=args.zapi_latency_ms / 1000.0)
+    private_pem, public_jwk = stubs.make_keypair()
+    jwks = stubs.jwks_stub(public_jwk)
+    supabase_url = jwks.url
+
+    records = args.records
+    dataset = synthetic.cobranca_dataset(
+        n_clients=max(records // 10, 10), n_charges=records, n_logs=records, n_recurrents=max(records // 100, 10)
+    )
+    synthetic.write_cobranca_dataset(
+        data_dir, dataset, {"zapiInstanceId": "bench", "zapiToken": "bench", "zapiSecurityToken": "bench"}
+    )
+    # Script fictício para /sistemas/cobranca (executado de verdade pelo utils.run_script)
+    scripts_dir = os.path.join(workdir, "scripts")
+    os.makedirs(scripts_dir)
+    with open(os.path.join(scripts_dir, "cobranca.py"), "w", encoding="utf-8") as f:
+        f.write(f"import time\nprint('cobranca ok')\ntime.sleep({args.script_sleep_s})\n")
+
+    env = {
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_ANON_KEY": "bench",
+        "COBRANCA_DATA_DIR": data_dir,
+        "ZAPI_BASE_URL": zapi.url,
+        "PDF_CACHE_ENABLED": "0",
+        "PDF_JOBS_DIR": os.path.join(workdir, "pdf_jobs"),
+        "PERMISSIONS_FILE": os.path.join(workdir, "permissions.json"),
+        "SCRIPTS_DIR": scripts_dir,
+        "SCRIPTS_MOCK": "0",
+        "METRICS_PUBLIC": "1",
+        "LOG_FORMAT": os.environ.get("LOG_FORMAT", "json"),
+    }
+    return {
+        "workdir": workdir,
+        "env": env,
+        "zapi": zapi,
+        "jwks": jwks,
+        "token": stubs.sign_token(private_pem, supabase_url),
+        "charge_ids": [ch["id"] for ch in dataset["charges"][:1000]] or ["none"],
+        "pdf": synthetic.payroll_pdf(n_pages=args.pdf_pages, n_condominios=max(args.pdf_pages // 10, 1)),
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def run_inprocess(args, ctx, selected):
+    os.environ.update(ctx["env"])
+    add_app_paths()
+    t0 = time.perf_counter()
+    import main  # noqa: E402  (importado após configurar o ambiente)
+    import_s = time.perf_counter() - t0
+
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            scenarios = build_scenarios(args, ctx)
+            for name in selected:
+                n, conc, make = scenarios[name]
+                await prime(client, ctx, name)
+                await drive(client, make, min(n, args.warmup), 1)
+                res = await drive(client, make, n, conc)
+                res["peak_rss_mb"] = self_peak_rss_mb()
+                results[name] = res
+                print(f"{name}: {res['throughput_rps']} rps p95={res['p95_ms']}ms errors={res['errors']}", file=sys.stderr)
+    return {"import_s": round(import_s, 3)}, results
+
+async def run_uvicorn(args, ctx, selected):
+    port = _free_port()
+    env = dict(os.environ, **ctx["env"], PYTHONPATH=app_pythonpath())
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=600,
+                                     limits=httpx.Limits(max_connections=args.concurrency * 2)) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn encerrou durante a subida")
+                try:
+                    if (await client.get("/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.05)
+            startup_s = time.perf_counter() - t0
+
+            scenarios = build_scenarios(args, ctx)
+            for name in selected:
+                n, conc, make = scenarios[name]
+                await prime(client, ctx, name)
+                await drive(client, make, min(n, args.warmup), 1)
+                res = await drive(client, make, n, conc)
+                res["peak_rss_mb"] = proc_peak_rss_mb(proc.pid)
+                results[name] = res
+                print(f"{name}: {res['throughput_rps']} rps p95={res['p95_ms']}ms errors={res['errors']}", file=sys.stderr)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {"time_to_first_200_s": round(startup_s, 3), "workers": args.workers}, results
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+ALL_SCENARIOS = (
+    "root", "cobranca_list", "cobranca_poll", "cobranca_changes", "cobranca_aggregates", "cobranca_crud", "cobranca_sync", "cobranca_process_recurring",
+    "send_whatsapp", "pdf_split", "painel", "sistemas_cobranca", "metrics",
+)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--records", type=int, default=10000, help="cobranças e logs sintéticos (10k–100k)")
+    parser.add_argument("--requests", type=int, default=500, help="requisições base por cenário")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--pdf-pages", type=int, default=200)
+    parser.add_argument("--pdf-requests", type=int, default=5)
+    parser.add_argument("--sistemas-requests", type=int, default=4)
+    parser.add_argument("--script-sleep-s", type=float, default=0.5, help="duração do script fictício de /sistemas/cobranca")
+    parser.add_argument("--zapi-latency-ms", type=float, default=0.0)
+    parser.add_argument("--scenarios", default=",".join(ALL_SCENARIOS))
+    parser.add_argument("--out", help="arquivo JSON de saída (além do stdout)")
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(selected) - set(ALL_SCENARIOS)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+
+    ctx = prepare(args)
+    try:
+        runner = run_uvicorn if args.mode == "uvicorn" else run_inprocess
+        startup, results = asyncio.run(runner(args, ctx, selected))
+    finally:
+        ctx["zapi"].stop()
+        ctx["jwks"].stop()
+        shutil.rmtree(ctx["workdir"], ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "records": args.records,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "pdf_pages": args.pdf_pages,
+            **startup,
+        },
+        "scenarios": results,
+        "zapi_stub_hits": ctx["zapi"].hits,
+        "jwks_stub_hits": ctx["jwks"].hits,
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    print(out)
+
+if __name__ == "__main__":
+    main()
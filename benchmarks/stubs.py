@@ -0,0 +1,104 @@
+# benchmarks/stubs.py
+# Servidores HTTP locais usados pelos benchmarks: Z-API (send-text) e JWKS do Supabase,
+# além de chaves RSA e tokens assinados localmente.
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _StubServer:
+    def __init__(self, handler_cls):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.httpd.daemon_threads = True
+        self.hits = 0
+        self.httpd.stub = self
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class _ZapiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_s = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.stub.hits += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        body = json.dumps({"messageId": f"msg-{self.server.stub.hits}", "id": "stub"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def zapi_stub(latency_s: float = 0.0) -> _StubServer:
+    handler = type("ZapiHandler", (_ZapiHandler,), {"latency_s": latency_s})
+    return _StubServer(handler).start()
+
+class _JwksHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    jwks = {"keys": []}
+
+    def do_GET(self):
+        self.server.stub.hits += 1
+        body = json.dumps(self.jwks).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", "public, max-age=600")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def jwks_stub(public_jwk: dict) -> _StubServer:
+    handler = type("JwksHandler", (_JwksHandler,), {"jwks": {"keys": [public_jwk]}})
+    return _StubServer(handler).start()
+
+# ---------- Chaves e tokens ----------
+
+KID = "bench-kid"
+
+def make_keypair(kid: str = KID):
+    """Gera um par RSA e o JWK público correspondente. Retorna (private_pem, public_jwk)."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk
+
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_pem, public_jwk
+
+def sign_token(private_pem, supabase_url: str, sub: str = "bench-user", ttl_s: int = 3600, kid: str = KID) -> str:
+    from jose import jwt
+
+    now = int(time.time())
+    claims = {
+        "sub": sub, "email": f"{sub}@example.com", "aud": "authenticated",
+        "iss": f"{supabase_url}/auth/v1", "iat": now, "exp": now + ttl_s,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": kid})
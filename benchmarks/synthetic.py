@@ -0,0 +1,144 @@
+# benchmarks/synthetic.py
+# Geradores de dados sintéticos: PDFs de folha de pagamento e registros do engine de cobrança.
+
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+# ---------- PDF ----------
+
+def _pdf_escape(text: str) -> bytes:
+    return text.encode("latin-1", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+def make_pdf(pages) -> bytes:
+    """Monta um PDF mínimo (Helvetica/WinAnsi) com uma lista de linhas de texto por página."""
+    objs = []
+
+    def add(body: bytes) -> int:
+        objs.append(body)
+        return len(objs)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    pages_id = add(b"")
+    kids = []
+    for lines in pages:
+        parts = [b"BT /F1 10 Tf 40 800 Td 14 TL"]
+        parts += [b"(" + _pdf_escape(line) + b") Tj T*" for line in lines]
+        parts.append(b"ET")
+        stream = b"\n".join(parts)
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    objs[pages_id - 1] = (
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+    )
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, catalog, xref)
+    return bytes(out)
+
+def payroll_pdf(n_pages: int = 200, n_condominios: int = 20, competencia: str = "03.2024", seed: int = 7) -> bytes:
+    """PDF de folha com várias páginas por condomínio, no layout esperado pelo engine extrair-pdf."""
+    rnd = random.Random(seed)
+    pages = []
+    for i in range(n_pages):
+        k = i * n_condominios // max(n_pages, 1)
+        pages.append([
+            f"CONDOMÍNIO EDIFÍCIO RESIDENCIAL {k:03d} CNPJ: 12.345.{k:03d}/0001-{k % 100:02d} Folha Mensal",
+            f"Recibo de Pagamento de Salário    Competência {competencia}",
+            "Código", str(1000 + i),
+            "Nome do Funcionário", f"FUNCIONARIO {i:05d}",
+            *[f"{rnd.randrange(100, 999)} Provento {j}  {rnd.randrange(1, 9999)},{rnd.randrange(10, 99)}" for j in range(25)],
+        ])
+    return make_pdf(pages)
+
+# ---------- Cobrança ----------
+
+STATUSES = ("Pendente", "Erro", "Enviado")
+
+def cobranca_dataset(n_clients: int, n_charges: int, n_logs: int, n_recurrents: int, seed: int = 11) -> dict:
+    rnd = random.Random(seed)
+    clients = [{
+        "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "name": f"Cliente {i:06d}",
+        "phone": f"119{rnd.randrange(10**7, 10**8)}" if rnd.random() > 0.05 else "123",
+        "email": f"cliente{i}@example.com",
+    } for i in range(n_clients)]
+
+    charges = []
+    for i in range(n_charges):
+        c = clients[rnd.randrange(n_clients)] if n_clients else {"name": f"Sem Cadastro {i}"}
+        charges.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "clientName": c["name"] if rnd.random() > 0.02 else f"Desconhecido {i}",
+            "clientPhone": c.get("phone", ""),
+            "clientEmail": c.get("email", ""),
+            "competence": f"{rnd.randrange(1, 13):02d}/2024",
+            "dueDate": (datetime(2024, 1, 1) + timedelta(days=rnd.randrange(365))).isoformat(),
+            "value": round(rnd.uniform(50, 5000), 2),
+            "sendStatus": rnd.choice(STATUSES),
+            "whatsappStatus": "Aguardando Envio",
+            "importError": "",
+            "clientFound": True,
+        })
+
+    base = datetime(2024, 1, 1)
+    logs = [{
+        "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "timestamp": (base + timedelta(seconds=i * 37)).isoformat(),
+        "clientName": f"Cliente {rnd.randrange(max(n_clients, 1)):06d}",
+        "whatsapp": f"119{rnd.randrange(10**7, 10**8)}",
+        "status": rnd.choice(STATUSES),
+        "message": "Mensagem enviada com sucesso via Z-API.",
+        "origin": rnd.choice(("Manual", "Recorrente")),
+    } for i in range(n_logs)]
+
+    recurrents = [{
+        "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "clientName": clients[rnd.randrange(n_clients)]["name"] if n_clients else "Cliente",
+        "clientPhone": "11999999999",
+        "messageTemplate": "Olá (nome), sua mensalidade de (valor) vence em (vencimento).",
+        "value": round(rnd.uniform(50, 500), 2),
+        "status": "Active",
+        "recurrenceType": rnd.choice(("once", "daily", "weekly", "monthly")),
+        "recurrenceInterval": 1,
+        "recurrenceDaysOfWeek": ["segunda", "quinta"],
+        "recurrenceDayOfMonth": 10,
+        "dueDate": (datetime.now() - timedelta(days=1)).isoformat(),
+        "startDate": (datetime.now() - timedelta(days=30)).isoformat(),
+        "endDate": None,
+        "lastSentDate": None,
+        "nextSendDate": None,
+        "lastAttemptStatus": None,
+        "lastAttemptMessage": None,
+    } for _ in range(n_recurrents)]
+
+    return {"clients": clients, "charges": charges, "logs": logs, "recurring_charges": recurrents}
+
+def write_cobranca_dataset(data_dir: str, dataset: dict, zapi_settings: dict) -> None:
+    """Grava o dataset nos arquivos JSON que o engine carrega."""
+    os.makedirs(data_dir, exist_ok=True)
+    for name, rows in dataset.items():
+        with open(os.path.join(data_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+    settings = {
+        "defaultMessage": "Prezado(a) (nome)...",
+        "dateFormat": "DD/MM/YYYY",
+        "currencyFormat": "BRL",
+        **zapi_settings,
+    }
+    with open(os.path.join(data_dir, "settings.json"), "w", encoding="utf-8") as f:
+        json.dump(settings, f, ensure_ascii=False)
@@ -1,16 +1,21 @@
 import os
+import hmac
 import time
-import uuid
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
 # Importa os roteadores das funcionalidades
 from routes import painel, sistemas
-from auth import router as auth_router
+from auth import router as auth_router, prefetch_jwks, close_http_client
 from routes import pdf_processor
 from routes import cobranca  # <-- 1. ADICIONADO: Importa o novo roteador de cobrança
+from utils.module_registry import warm_engines
+from utils import pdf_jobs, metrics, tracing, profiling, run_script, rate_limit
 
 # Carrega as variáveis de ambiente
 load_dotenv()
@@ -18,19 +23,72 @@ load_dotenv()
 # -------------------------
 # Configuração básica de logs
 # -------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%SZ",
-)
+# JSON estruturado (LOG_FORMAT=text para o formato antigo), gravado fora do caminho da requisição
+tracing.setup_logging(logging.INFO)
 logger = logging.getLogger("konty")
 
+# -------------------------
+# Ciclo de vida (startup/shutdown)
+# -------------------------
+# Modo de subida (STARTUP_MODE):
+#   "eager" (padrão)  aquece os engines (ENGINE_WARMUP) e carrega as coleções de cobrança antes
+#                     de aceitar requisições
+#   "background"      o servidor aceita requisições logo; aquecimento e carga rodam numa thread
+#                     (uma rota de cobrança que chegar antes do fim da carga espera por ela)
+#   "lazy"            nada é pré-carregado: cada engine/coleção é carregado no primeiro uso
+STARTUP_MODE = os.getenv("STARTUP_MODE", "eager")
+
+def _warm_up() -> None:
+    # Aquece os engines dinâmicos (ENGINE_WARMUP="" desativa; "*" carrega todos)
+    timings = warm_engines()
+    if timings:
+        logger.info("engines aquecidos: %s", timings)
+    # Com partições por tenant o engine global não é usado; cada tenant carrega no primeiro acesso
+    loaded = {} if cobranca.tenants.ENABLED else cobranca.core.load()
+    if loaded:
+        logger.info("cobranca carregada: %s", loaded)
+
+def _warm_up_background() -> None:
+    try:
+        _warm_up()
+    except Exception as exc:  # a carga é refeita sob demanda no próximo acesso
+        logger.exception("aquecimento em segundo plano falhou: %r", exc)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if STARTUP_MODE == "eager":
+        _warm_up()
+    elif STARTUP_MODE == "background":
+        asyncio.get_running_loop().run_in_executor(None, _warm_up_background)
+    # JWKS buscado em segundo plano: não atrasa a subida; requisições concorrentes aguardam a mesma busca
+    jwks_task = asyncio.create_task(prefetch_jwks())
+    metrics.start_flusher()
+    yield
+    jwks_task.cancel()
+    metrics.stop_flusher()
+    pdf_jobs.shutdown()
+    cobranca.core.shutdown()  # grava as coleções pendentes do write-behind
+    cobranca.tenants.shutdown()
+    await run_script.shutdown()
+    await close_http_client()
+    tracing.shutdown_logging()
+
 app = FastAPI(
     title="Konty API",
     description="API para centralizar o acesso aos sistemas internos da Kontymax.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# -------------------------
+# Controle de admissão (rate limit por usuário + limite de execuções simultâneas)
+# -------------------------
+# Adicionado antes do CORS: fica por dentro dele, então o 429 também leva os headers de CORS
+# e o frontend consegue ler o Retry-After. Atrás de proxy, suba o uvicorn com --proxy-headers
+# --forwarded-allow-ips=<IP do proxy> para que clientes sem token sejam limitados pelo IP real.
+if rate_limit.ENABLED:
+    app.add_middleware(rate_limit.AdmissionMiddleware)
+
 # -------------------------
 # CORS dinâmico por ambiente
 # -------------------------
@@ -46,54 +104,117 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],  # ETag: o frontend guarda a versão para If-None-Match
 )
 
 # -------------------------
-# Middleware de logging
-# -------------------------
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start = time.perf_counter()
-    rid = str(uuid.uuid4())
-    try:
-        response = await call_next(request)
-        duration_ms = round((time.perf_counter() - start) * 1000, 2)
-        logger.info(
-            "rid=%s method=%s path=%s status=%s duration_ms=%s ua=%s",
-            rid,
-            request.method,
-            request.url.path,
-            getattr(response, "status_code", "unknown"),
-            duration_ms,
-            request.headers.get("user-agent", "-"),
-        )
-        response.headers["X-Request-ID"] = rid
-        response.headers["X-Response-Time"] = f"{duration_ms}ms"
-        return response
-    except Exception as exc:
-        duration_ms = round((time.perf_counter() - start) * 1000, 2)
-        logger.exception(
-            "rid=%s method=%s path=%s status=500 duration_ms=%s error=%s",
-            rid, request.method, request.url.path, duration_ms, repr(exc)
-        )
-        raise
-
-# -------------------------
-# Middleware de segurança (headers)
+# Middleware de requisição (logging, métricas, trace id e headers de segurança)
 # -------------------------
+# ASGI puro: os headers entram na mensagem http.response.start e o corpo passa direto, sem a
+# task e o stream intermediário do BaseHTTPMiddleware (@app.middleware("http")) — respostas em
+# streaming (ZIP do PDF, SSE dos scripts) chegam ao cliente à medida que são geradas.
 ENABLE_HSTS = os.getenv("ENABLE_HSTS", "1") == "1"
 
-@app.middleware("http")
-async def security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Permissions-Policy"] = "camera=(), microphone=(), geolocation=()"
-    response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
-    if ENABLE_HSTS and request.url.scheme == "https":
-        response.headers["Strict-Transport-Security"] = "max-age=63072000; includeSubDomains"
-    return response
+_SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    (b"permissions-policy", b"camera=(), microphone=(), geolocation=()"),
+    (b"cross-origin-opener-policy", b"same-origin"),
+]
+_HSTS_HEADER = (b"strict-transport-security", b"max-age=63072000; includeSubDomains")
+# Headers definidos aqui substituem os que a rota tenha enviado
+_OWN_HEADERS = frozenset(
+    [name for name, _ in _SECURITY_HEADERS]
+    + [_HSTS_HEADER[0], b"x-request-id", b"x-trace-id", b"x-response-time", b"x-profile-file"]
+)
+
+def _route_template(scope) -> str:
+    # Template da rota (ex.: /api/charges/{charge_id}) para não explodir a cardinalidade das métricas
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or "<unmatched>"
+
+class RequestMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        client_id = user_agent = None
+        for name, value in scope["headers"]:
+            if name == b"x-trace-id" or (name == b"x-request-id" and client_id is None):
+                client_id = value.decode("latin-1")
+            elif name == b"user-agent":
+                user_agent = value.decode("latin-1")
+        # Um único trace id por requisição: reaproveita o do cliente (X-Trace-Id / X-Request-ID) ou gera um novo.
+        # Fica num contextvar, visível para dependências, handlers, engine e logs.
+        rid, trace_token = tracing.start_trace(tracing.accept_trace_id(client_id))
+        method, path = scope["method"], scope["path"]
+        status = 500
+        metrics.HTTP_IN_FLIGHT.inc()
+        # Profiling opt-in (PROFILE_SLOW_REQUESTS=1): só grava se a requisição passar do limite.
+        # Recebe o scope: desligado, não custa mais que um if por requisição.
+        profile_session = profiling.start(scope)
+
+        async def send_wrapper(message):
+            nonlocal status, profile_session
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # X-Response-Time é o tempo até o envio dos headers (o corpo pode continuar em
+                # streaming depois); a duração completa fica no log (duration_ms) e nas métricas.
+                header_ms = round((time.perf_counter() - start) * 1000, 2)
+                extra = [(b"x-request-id", rid.encode()), (b"x-trace-id", rid.encode()),
+                         (b"x-response-time", f"{header_ms}ms".encode())]
+                if profile_session is not None:
+                    profile_path = await asyncio.to_thread(profiling.finish, profile_session, rid, header_ms)
+                    profile_session = None
+                    if profile_path:
+                        extra.append((b"x-profile-file", os.path.basename(profile_path).encode()))
+                extra += _SECURITY_HEADERS
+                if ENABLE_HSTS and scope.get("scheme") == "https":
+                    extra.append(_HSTS_HEADER)
+                headers = [h for h in message.get("headers", ()) if h[0].lower() not in _OWN_HEADERS]
+                message = {**message, "headers": headers + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+            elapsed = time.perf_counter() - start
+            duration_ms = round(elapsed * 1000, 2)
+            route = _route_template(scope)
+            metrics.HTTP_REQUESTS.inc(1, method, route, str(status))
+            metrics.HTTP_LATENCY.observe(elapsed, method, route)
+            logger.info(
+                "rid=%s method=%s path=%s status=%s duration_ms=%s ua=%s",
+                rid, method, path, status, duration_ms, user_agent or "-",
+                extra={"http": {
+                    "method": method, "path": path, "route": route,
+                    "status": status, "duration_ms": duration_ms,
+                }},
+            )
+        except Exception as exc:
+            elapsed = time.perf_counter() - start
+            duration_ms = round(elapsed * 1000, 2)
+            route = _route_template(scope)
+            metrics.HTTP_REQUESTS.inc(1, method, route, "500")
+            metrics.HTTP_LATENCY.observe(elapsed, method, route)
+            logger.exception(
+                "rid=%s method=%s path=%s status=500 duration_ms=%s error=%s",
+                rid, method, path, duration_ms, repr(exc)
+            )
+            raise
+        finally:
+            if profile_session is not None:
+                await asyncio.to_thread(profiling.finish, profile_session, rid, round((time.perf_counter() - start) * 1000, 2))
+            metrics.HTTP_IN_FLIGHT.dec()
+            tracing.reset_trace(trace_token)
+
+# Adicionado por último: fica por fora do CORS e mede/identifica também as respostas de preflight
+app.add_middleware(RequestMiddleware)
 
 # Rotas
 app.include_router(auth_router, prefix="/auth", tags=["Autenticação"])
@@ -105,3 +226,20 @@ app.include_router(cobranca.router) # <-- 2. ADICIONADO: Registra as novas rotas
 @app.get("/")
 async def read_root():
     return {"message": "Konty API está online!"}
+
+# /metrics expõe tráfego e latência por rota: exige METRICS_TOKEN (Authorization: Bearer <token>,
+# configurado no scraper). Sem token configurado o endpoint fica desligado (404), a menos que
+# METRICS_PUBLIC=1 (rede interna / desenvolvimento).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "0") == "1"
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics(request: Request):
+    """Métricas no formato de exposição do Prometheus."""
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode()):
+            return PlainTextResponse("unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    elif not METRICS_PUBLIC:
+        return PlainTextResponse("not found", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
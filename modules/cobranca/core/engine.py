@@ -5,22 +5,85 @@
 
 from __future__ import annotations
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from contextlib import ExitStack, contextmanager
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import atexit
+import copy
 import json
 import os
 import re
+import sys
+import threading
+import time
 import uuid
-import requests
+
+try:
+    import orjson
+except ImportError:  # opcional: só usado com COBRANCA_JSON_COMPACT=1
+    orjson = None
+
+# ---------- Ganchos de observabilidade (opcionais) ----------
+# A camada HTTP registra callbacks para medir persistência e chamadas externas
+# sem que o engine dependa de FastAPI ou de bibliotecas de métricas.
+#   "save_data": fn(filepath=..., duration=...)
+#   "zapi_call": fn(status=..., duration=...)
+#   "flush_error": fn(filepath=..., error=...)  (falha do write-behind; nova tentativa no próximo ciclo)
+
+_hooks: Dict[str, List[Callable[..., None]]] = {"save_data": [], "zapi_call": [], "flush_error": []}
+
+def register_hook(event: str, fn: Callable[..., None]) -> None:
+    _hooks[event].append(fn)
+
+def _emit(event: str, **fields) -> None:
+    for fn in _hooks.get(event, ()):
+        try:
+            fn(**fields)
+        except Exception:
+            pass
 
 # ---------- Persistência em JSON (paridade com local) ----------
 
-DATA_DIR = os.environ.get("COBRANCA_DATA_DIR", "data")
+# Partições por tenant (tenants.py) executam este módulo com DATA_DIR já definido
+DATA_DIR = globals().get("DATA_DIR") or os.environ.get("COBRANCA_DATA_DIR", "data")
 CLIENTS_FILE = os.path.join(DATA_DIR, "clients.json")
 CHARGES_FILE = os.path.join(DATA_DIR, "charges.json")
 LOGS_FILE = os.path.join(DATA_DIR, "logs.json")
 SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
 RECURRING_CHARGES_FILE = os.path.join(DATA_DIR, "recurring_charges.json")
 
+# Durabilidade das escritas:
+#   "sync" (padrão) cada escrita (ou lote concorrente) grava o arquivo antes de retornar.
+#   "fsync"    como "sync", com fsync do arquivo e do diretório.
+#   "deferred" write-behind (opt-in): a alteração fica em memória, a coleção é marcada como suja
+#              e gravada pelo timer (COBRANCA_FLUSH_INTERVAL_MS) ou no shutdown. A resposta sai
+#              antes da gravação: uma queda do processo pode perder o último intervalo.
+# Em qualquer modo, as escritas dentro de transaction() são gravadas uma única vez ao fim do bloco.
+DURABILITY = os.environ.get("COBRANCA_DURABILITY", "sync")
+FLUSH_INTERVAL_SECONDS = int(os.environ.get("COBRANCA_FLUSH_INTERVAL_MS", "200")) / 1000.0
+
+# Formato dos arquivos: indentado (padrão, legível) ou compacto (COBRANCA_JSON_COMPACT=1), que
+# usa orjson quando instalado e grava/lê bem mais rápido em coleções grandes.
+JSON_COMPACT = os.environ.get("COBRANCA_JSON_COMPACT", "0") == "1"
+
+# Registros compactos (COBRANCA_COMPACT_RECORDS=1): em memória cada registro vira um objeto com
+# __slots__ em vez de dict (bem menos memória em coleções grandes, ex.: logs), ao custo de
+# leituras campo a campo um pouco mais lentas. Strings repetidas (status, origem, nomes...)
+# são internadas sempre. O formato dos arquivos e das respostas não muda.
+COMPACT_RECORDS = os.environ.get("COBRANCA_COMPACT_RECORDS", "0") == "1"
+
+# Feed de alterações: quantas exclusões cada coleção lembra (em <arquivo>.meta). Um cliente
+# cuja versão é anterior ao histórico retido recebe "reset" e recarrega a lista inteira.
+CHANGES_RETENTION = int(os.environ.get("COBRANCA_CHANGES_RETENTION", "5000"))
+
+# Código do país acrescentado aos telefones em formato nacional (10 ou 11 dígitos: DDD + número)
+# na normalização dos contatos. Padrão "55" (Brasil); sem ele "11999999999" viraria
+# "+11999999999", um número dos EUA. Números que já trazem o código (12 ou 13 dígitos) ficam como estão.
+PHONE_COUNTRY_CODE = re.sub(r"\D+", "", os.environ.get("COBRANCA_PHONE_COUNTRY_CODE", "")) or "55"
+
+# Base da Z-API (sobrescrevível para apontar para um stub local em testes/benchmarks)
+ZAPI_BASE_URL = os.environ.get("ZAPI_BASE_URL", "https://api.z-api.io").rstrip("/")
+
 DEFAULT_SETTINGS = {
     "zapiInstanceId": "",
     "zapiToken": "",
@@ -32,24 +95,795 @@ DEFAULT_SETTINGS = {
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def _load_data(filepath: str, default_value):
+# ---------- Estado compartilhado entre workers e threads ----------
+# Com `uvicorn --workers N` cada processo tem sua cópia em memória das coleções. Para não
+# perder escritas:
+#   - toda mutação roda sob trava exclusiva do arquivo (flock em <arquivo>.lock), recarrega
+#     a coleção se outro worker a alterou e só então aplica a mudança e grava;
+#   - a gravação é atômica (arquivo temporário + os.replace), então leitores nunca veem
+#     um JSON truncado e não precisam de trava;
+#   - a versão de cada coleção é o carimbo (inode, mtime_ns, tamanho) do arquivo: antes de
+#     ler, cada worker compara o carimbo e recarrega apenas as coleções que mudaram.
+# A ordem de registro das coleções define a ordem de aquisição das travas (evita deadlock
+# quando uma operação trava mais de uma coleção, ex.: recorrentes -> logs).
+#
+# Dentro do processo (rotas sync rodam em paralelo no threadpool):
+#   - `mutex` serializa quem altera a coleção; `rw` (leitores/escritor) protege apenas a troca
+#     em memória, então leitores não esperam pelo disco;
+#   - registros são copy-on-write (alterar = substituir o dict na lista) e a leitura devolve
+#     uma cópia rasa da lista, que pode ser serializada sem trava;
+#   - escritas concorrentes da mesma coleção são agrupadas (group commit): quem chega enquanto
+#     outra gravação está em andamento entra no próximo lote, e o lote inteiro vira uma
+#     única gravação no disco.
+#
+# Write-behind (DURABILITY="deferred" ou dentro de transaction()): a coleção suja mantém o
+# flock até ser gravada, então outro worker nunca altera uma versão que ainda não está no disco
+# (ele espera no máximo um intervalo de flush).
+#
+# Versões para ETag e feed de alterações (coleções em lista): cada alteração incrementa a
+# versão da coleção e grava `_version` e `updatedAt` no registro; exclusões viram marcas
+# (id, versão). Versão, marcas e a época (id aleatório, muda se o .meta for recriado) ficam em
+# <arquivo>.meta, gravado logo após os dados e com o carimbo deles: quem recarrega só aceita o
+# par quando o carimbo confere, então todos os workers enxergam a mesma versão.
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas trava entre threads do mesmo processo
+    fcntl = None
+
+class _RWLock:
+    """Trava leitores/escritor com preferência para o escritor (leitura não é reentrante)."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            yield
+            return
+        with self._cond:
+            while self._writer is not None or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+class _PendingWrite:
+    __slots__ = ("fn", "result", "error", "done")
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+
+class _Collection:
+    __slots__ = (
+        "path", "data", "stamp", "rank", "mutex", "rw", "queue", "commit", "committing", "dirty", "lock_file",
+        "epoch", "version", "floor", "deleted", "aggregate", "record", "intern",
+    )
+
+    def __init__(self, path: str, data, rank: int):
+        self.path = path
+        self.data = data
+        self.stamp = _stamp(path)
+        self.rank = rank
+        self.mutex = threading.RLock()
+        self.rw = _RWLock()
+        self.queue: List[_PendingWrite] = []
+        self.commit = threading.Condition(threading.Lock())
+        self.committing = False
+        self.dirty = False
+        self.lock_file = None  # flock do processo: mantido durante a mutação e enquanto suja
+        self.epoch: Optional[str] = None  # None: coleção sem versão (settings)
+        self.version = 0
+        self.floor = 0  # versões anteriores a esta não são cobertas pelo histórico
+        self.deleted: List[List[Any]] = []  # [id, versão] das exclusões retidas
+        self.aggregate: Optional[_Aggregate] = None
+        self.record: Optional[type] = None  # tipo _Record dos registros (COMPACT_RECORDS)
+        self.intern: Tuple[str, ...] = ()  # campos com valores repetidos (sys.intern)
+
+class _Record(Mapping):
+    """
+    Registro compacto: campos conhecidos em __slots__ (sem dict por registro) e campos livres
+    em `_extra`. Somente leitura, como os registros copy-on-write das coleções: alterar é criar
+    um dict novo ({**rec, **campos}) e armazená-lo de novo. Lido como Mapping (get, [], dict()).
+    """
+
+    __slots__ = ("_extra",)
+    _fields: Tuple[str, ...] = ()
+    _field_set: frozenset = frozenset()
+
+    def __init__(self, data: Dict[str, Any]):
+        extra = None
+        for key, value in data.items():
+            if key in self._field_set:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __iter__(self):
+        for key in self._fields:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self, _getattr=getattr) -> Dict[str, Any]:
+        out = {}
+        for key in self._fields:
+            value = _getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                out[key] = value
+        if self._extra:
+            out.update(self._extra)
+        return out
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+_MISSING = object()
+
+def _as_dict(row) -> Dict[str, Any]:
+    """Cópia mutável de um registro (dict ou _Record)."""
+    return row.to_dict() if isinstance(row, _Record) else dict(row)
+
+def _record_type(name: str, fields: Tuple[str, ...]) -> type:
+    return type(name, (_Record,), {"__slots__": fields, "_fields": fields, "_field_set": frozenset(fields)})
+
+def _json_default(obj):
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class _Aggregate:
+    """
+    Contadores (e somas de `value`, em centavos) por dimensão de uma coleção, mantidos a cada
+    alteração (sai o registro antigo, entra o novo) e reconstruídos ao carregar/recarregar o
+    arquivo. Ler custa O(nº de grupos), independente do volume de registros.
+    """
+
+    __slots__ = ("dims", "with_value", "fields", "count", "cents", "groups")
+
+    def __init__(self, dims: Dict[str, str], with_value: bool = False):
+        self.dims = dims  # nome da dimensão -> campo do registro
+        self.with_value = with_value
+        self.fields = tuple(dims.values()) + (("value",) if with_value else ())
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.cents = 0
+        self.groups: Dict[str, Dict[Any, List[int]]] = {dim: {} for dim in self.dims}
+
+    def rebuild(self, rows: List[Dict[str, Any]]) -> None:
+        self.reset()
+        for row in rows:
+            self.apply(row, 1)
+
+    def apply(self, row: Dict[str, Any], sign: int) -> None:
+        cents = _cents(row.get("value")) * sign if self.with_value else 0
+        self.count += sign
+        self.cents += cents
+        for dim, field in self.dims.items():
+            groups = self.groups[dim]
+            key = row.get(field) or ""
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0]
+            group[0] += sign
+            group[1] += cents
+            if not group[0]:
+                del groups[key]
+
+    def replace(self, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+        # Alteração que não mexe nos campos agregados (ex.: só o contato) não muda os grupos
+        for field in self.fields:
+            if old.get(field) != new.get(field):
+                self.apply(old, -1)
+                self.apply(new, 1)
+                return
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.with_value:
+            out: Dict[str, Any] = {"count": self.count}
+            out.update({dim: {k: g[0] for k, g in groups.items()} for dim, groups in self.groups.items()})
+            return out
+        out = {"count": self.count, "total": self.cents / 100}
+        out.update({
+            dim: {k: {"count": g[0], "total": g[1] / 100} for k, g in groups.items()}
+            for dim, groups in self.groups.items()
+        })
+        return out
+
+def _cents(value: Any) -> int:
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+_collections: Dict[str, _Collection] = {}
+_held = threading.local()  # profundidade de travas por arquivo na thread atual
+
+def _depth() -> Dict[str, int]:
+    return _held.__dict__.setdefault("depth", {})
+
+def _stamp(filepath: str):
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _fsync_dir(dirpath: str) -> None:
+    try:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:  # Windows não abre diretórios
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _encode(data) -> bytes:
+    if JSON_COMPACT:
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, default=_json_default)
+            except TypeError:
+                pass
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=4, default=_json_default).encode("utf-8")
+
+def _decode(raw: bytes, object_hook: Optional[Callable[[Dict[str, Any]], Any]] = None):
+    if object_hook is not None:
+        return json.loads(raw, object_hook=object_hook)
+    if JSON_COMPACT and orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _write_atomic(filepath: str, data, fsync: bool = False) -> None:
+    tmp = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_encode(data))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, filepath)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if fsync:
+        _fsync_dir(os.path.dirname(os.path.abspath(filepath)))
+
+def _load_data(filepath: str, default_value, object_hook=None):
     if not os.path.exists(filepath) or os.stat(filepath).st_size == 0:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(default_value, f, ensure_ascii=False, indent=4)
+        _write_atomic(filepath, default_value)
         return default_value
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(filepath, "rb") as f:
+        return _decode(f.read(), object_hook)
+
+def _save_data(filepath: str, data, fsync: bool = False) -> None:
+    start = time.perf_counter()
+    _write_atomic(filepath, data, fsync)
+    col = _collections.get(filepath)
+    if col is not None:
+        col.stamp = _stamp(filepath)
+    _emit("save_data", filepath=filepath, duration=time.perf_counter() - start)
+
+def _meta_path(filepath: str) -> str:
+    return f"{filepath}.meta"
+
+def _read_meta(filepath: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_meta_path(filepath), "rb") as f:
+            return _decode(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
 
-def _save_data(filepath: str, data) -> None:
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+def _write_meta(col: _Collection, fsync: bool = False) -> None:
+    meta = {"epoch": col.epoch, "version": col.version, "floor": col.floor, "stamp": col.stamp, "deleted": col.deleted}
+    _write_atomic(_meta_path(col.path), meta, fsync)
+
+def _apply_meta(col: _Collection, meta: Dict[str, Any]) -> None:
+    # A versão nunca fica abaixo da maior versão de registro (ex.: .meta mais antigo que os dados)
+    col.epoch = meta.get("epoch") or col.epoch
+    col.version = max(int(meta.get("version", 0)), max((r.get("_version", 0) for r in col.data), default=0))
+    col.floor = int(meta.get("floor", 0))
+    col.deleted = [list(d) for d in meta.get("deleted", [])]
+
+def _register(
+    filepath: str,
+    default_value,
+    aggregate: Optional[_Aggregate] = None,
+    record: Optional[type] = None,
+    intern: Tuple[str, ...] = (),
+):
+    """Registra a coleção para travas/recarga (os dados são lidos em load()). O objeto retornado nunca é trocado."""
+    col = _Collection(filepath, copy.deepcopy(default_value), len(_collections))
+    col.record = record if COMPACT_RECORDS else None
+    col.intern = intern
+    col.aggregate = aggregate
+    _collections[filepath] = col
+    return col.data
+
+def _load_collection(col: _Collection) -> None:
+    with _file_lock_raw(col.path):
+        data = _load_data(col.path, copy.deepcopy(col.data), _object_hook(col))
+        col.stamp = _stamp(col.path)
+        if isinstance(col.data, list):
+            col.data[:] = [_stored(col, row) for row in data]
+        else:
+            col.data.clear()
+            col.data.update(data)
+        if col.aggregate is not None:
+            col.aggregate.rebuild(col.data)
+        if isinstance(col.data, list):
+            meta = _read_meta(col.path)
+            if meta is not None and meta.get("stamp") == list(col.stamp or ()):
+                _apply_meta(col, meta)
+            else:
+                # Sem .meta (ou dados alterados fora do engine): nova versão e histórico vazio,
+                # então qualquer cliente com versão anterior recebe "reset".
+                _apply_meta(col, meta or {"epoch": uuid.uuid4().hex[:12]})
+                col.version += 1
+                col.floor = col.version
+                col.deleted = []
+                _write_meta(col)
 
-# Carrega ao importar (memória)
-clients: List[Dict[str, Any]] = _load_data(CLIENTS_FILE, [])
-charges: List[Dict[str, Any]] = _load_data(CHARGES_FILE, [])
-logs: List[Dict[str, Any]] = _load_data(LOGS_FILE, [])
-settings: Dict[str, Any] = _load_data(SETTINGS_FILE, DEFAULT_SETTINGS)
-recurrents: List[Dict[str, Any]] = _load_data(RECURRING_CHARGES_FILE, [])
+# As coleções são lidas do disco uma única vez: por load() (lifespan do FastAPI, possivelmente
+# em segundo plano) ou sob demanda no primeiro acesso. Quem chega durante a carga espera por ela.
+_loaded = False
+_load_lock = threading.Lock()
+
+def load() -> Dict[str, float]:
+    """Carrega todas as coleções (na ordem das travas). Retorna {arquivo: ms}; vazio se já carregadas."""
+    global _loaded
+    if _loaded:
+        return {}
+    with _load_lock:
+        if _loaded:
+            return {}
+        timings = {}
+        for col in sorted(_collections.values(), key=lambda c: c.rank):
+            start = time.perf_counter()
+            _load_collection(col)
+            timings[os.path.basename(col.path)] = round((time.perf_counter() - start) * 1000, 2)
+        _loaded = True
+    return timings
+
+def is_loaded() -> bool:
+    return _loaded
+
+def _reload(col: _Collection) -> None:
+    """Relê o arquivo e atualiza a coleção no lugar (as referências existentes continuam válidas)."""
+    for _ in range(3):
+        try:
+            with open(col.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+                fresh = _decode(f.read(), _object_hook(col)) if st.st_size else None
+        except FileNotFoundError:
+            return
+        meta = _read_meta(col.path) if col.epoch is not None else None
+        if meta is None or meta.get("stamp") == list(stamp):
+            break
+    else:
+        # O .meta ainda não acompanha os dados (outro worker entre as duas gravações):
+        # usa o que leu e tenta de novo na próxima leitura.
+        stamp = None
+    if fresh is not None:
+        with col.rw.write():
+            if isinstance(col.data, list):
+                col.data[:] = [_stored(col, row) for row in fresh]
+            else:
+                col.data.clear()
+                col.data.update(fresh)
+            if meta is not None:
+                _apply_meta(col, meta)
+            if col.aggregate is not None:
+                col.aggregate.rebuild(col.data)
+    col.stamp = stamp
+
+def _refresh(*filepaths: str) -> None:
+    """Recarrega as coleções cujo arquivo foi alterado por outro processo."""
+    if not _loaded:
+        load()
+    for filepath in filepaths:
+        col = _collections[filepath]
+        if _stamp(filepath) == col.stamp:
+            continue
+        # Se outra thread está alterando a coleção, ela já recarregou sob o flock e a
+        # memória está no mínimo tão nova quanto o disco: não há o que recarregar.
+        if not col.mutex.acquire(blocking=False):
+            continue
+        try:
+            if _stamp(filepath) != col.stamp:
+                _reload(col)
+        finally:
+            col.mutex.release()
+
+def refresh_all() -> None:
+    _refresh(*_collections)
+
+@contextmanager
+def _file_lock_raw(filepath: str):
+    if fcntl is None:
+        yield
+        return
+    with open(f"{filepath}.lock", "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _acquire_file_lock(col: _Collection) -> None:
+    # Chamado com col.mutex: se o processo já tem o flock (coleção suja), reaproveita
+    if col.lock_file is None and fcntl is not None:
+        lock_file = open(f"{col.path}.lock", "a")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        col.lock_file = lock_file
+
+def _release_file_lock(col: _Collection) -> None:
+    if col.lock_file is not None and not col.dirty:
+        fcntl.flock(col.lock_file.fileno(), fcntl.LOCK_UN)
+        col.lock_file.close()
+        col.lock_file = None
+
+@contextmanager
+def _locked(filepath: str):
+    """Trava exclusiva (threads e processos) de uma coleção; reentrante na mesma thread."""
+    depth = _depth()
+    col = _collections[filepath]
+    with col.mutex:
+        if depth.get(filepath):
+            depth[filepath] += 1
+            try:
+                yield
+            finally:
+                depth[filepath] -= 1
+            return
+        _acquire_file_lock(col)
+        depth[filepath] = 1
+        try:
+            yield
+        finally:
+            depth[filepath] = 0
+            _release_file_lock(col)
+
+@contextmanager
+def _mutating(*filepaths: str):
+    """Trava as coleções (na ordem de registro), recarrega o que mudou e libera ao final."""
+    if not _loaded:
+        load()  # antes das travas: a carga pega o flock de cada coleção
+    with ExitStack() as stack:
+        for filepath in sorted(filepaths, key=lambda p: _collections[p].rank):
+            stack.enter_context(_locked(filepath))
+        _refresh(*filepaths)
+        yield
+
+# ---------- Persistência: imediata, transação ou write-behind ----------
+
+_flusher: Optional[threading.Thread] = None
+_flusher_stop = threading.Event()
+_flusher_lock = threading.Lock()
+
+def _write_collection(col: _Collection) -> None:
+    fsync = DURABILITY == "fsync"
+    _save_data(col.path, col.data, fsync)
+    if col.epoch is not None:
+        _write_meta(col, fsync)
+
+def _flush_collection(col: _Collection, blocking: bool = True) -> None:
+    if not col.mutex.acquire(blocking=blocking):
+        return  # em uso por uma mutação: será gravada por ela ou no próximo ciclo
+    try:
+        if not col.dirty:
+            return
+        _write_collection(col)
+        col.dirty = False
+        if not _depth().get(col.path):
+            _release_file_lock(col)
+    finally:
+        col.mutex.release()
+
+def flush(blocking: bool = True) -> None:
+    """Grava agora todas as coleções sujas (na ordem das travas)."""
+    for col in sorted(_collections.values(), key=lambda c: c.rank):
+        if col.dirty:
+            try:
+                _flush_collection(col, blocking)
+            except Exception as exc:
+                _emit("flush_error", filepath=col.path, error=exc)
+                if blocking:
+                    raise
+
+def _flusher_loop() -> None:
+    while not _flusher_stop.wait(FLUSH_INTERVAL_SECONDS):
+        flush(blocking=False)
+
+def start_flusher() -> None:
+    """Inicia o timer de write-behind (também iniciado sob demanda na primeira escrita)."""
+    global _flusher
+    with _flusher_lock:
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher_stop.clear()
+        _flusher = threading.Thread(target=_flusher_loop, name="cobranca-flush", daemon=True)
+        _flusher.start()
+
+def shutdown() -> None:
+    """Para o timer e grava o que estiver pendente (lifespan do FastAPI / atexit)."""
+    global _flusher
+    _flusher_stop.set()
+    with _flusher_lock:
+        thread, _flusher = _flusher, None
+    if thread is not None:
+        thread.join(timeout=FLUSH_INTERVAL_SECONDS + 5)
+    flush()
+
+atexit.register(shutdown)
+
+def has_pending_writes() -> bool:
+    """Há coleção suja (write-behind ou transação) ainda não gravada?"""
+    return any(col.dirty for col in _collections.values())
+
+def _persist(filepath: str) -> None:
+    """Registra a alteração da coleção (chamado com a coleção travada por _mutating)."""
+    col = _collections[filepath]
+    tx = getattr(_held, "tx", None)
+    if tx is not None:
+        col.dirty = True
+        tx.add(filepath)
+    elif DURABILITY == "deferred":
+        col.dirty = True
+        if _flusher is None:
+            start_flusher()
+    else:
+        _write_collection(col)
+        col.dirty = False
+
+@contextmanager
+def transaction():
+    """
+    Agrupa as escritas do bloco (thread atual): cada coleção alterada é gravada uma única vez
+    ao sair, com um fsync por arquivo no modo "fsync". Não isola leituras de outras threads.
+    """
+    if getattr(_held, "tx", None) is not None:
+        yield
+        return
+    _held.tx = set()
+    try:
+        yield
+    finally:
+        touched, _held.tx = _held.tx, None
+        for col in sorted((_collections[p] for p in touched), key=lambda c: c.rank):
+            _flush_collection(col)
+
+def _snapshot(filepath: str):
+    """Cópia rasa e consistente da coleção (os registros são copy-on-write)."""
+    _refresh(filepath)
+    col = _collections[filepath]
+    with col.rw.read():
+        return list(col.data) if isinstance(col.data, list) else dict(col.data)
+
+def _swap(filepath: str):
+    """Trava de escrita em memória da coleção (para trocas rápidas dentro de _mutating)."""
+    return _collections[filepath].rw.write()
+
+def _apply(filepath: str, fn: Callable[[], Any]) -> Any:
+    """
+    Executa `fn` (alteração rápida, em memória) e persiste a coleção. Chamadas concorrentes
+    são aplicadas em lote pelo primeiro da fila e gravadas uma única vez.
+    """
+    col = _collections[filepath]
+    if _depth().get(filepath) or getattr(_held, "tx", None) is not None:
+        # Já dentro de uma mutação desta coleção ou de um transaction(): aplica direto
+        with _mutating(filepath):
+            with col.rw.write():
+                result = fn()
+            _persist(filepath)
+        return result
+
+    op = _PendingWrite(fn)
+    with col.commit:
+        col.queue.append(op)
+        while col.committing and not op.done:
+            col.commit.wait()
+        if not op.done:
+            # Esta thread lidera o próximo lote com tudo que está na fila
+            col.committing = True
+            batch, col.queue = col.queue, []
+    if not op.done:
+        try:
+            with _mutating(filepath):
+                with col.rw.write():
+                    for pending in batch:
+                        try:
+                            pending.result = pending.fn()
+                        except Exception as exc:
+                            pending.error = exc
+                _persist(filepath)
+        except BaseException as exc:
+            for pending in batch:
+                pending.error = pending.error or exc
+        finally:
+            with col.commit:
+                for pending in batch:
+                    pending.done = True
+                col.committing = False
+                col.commit.notify_all()
+    if op.error is not None:
+        raise op.error
+    return op.result
+
+# Chamados dentro de _apply/_mutating (coleção travada)
+
+def _stored(col: _Collection, row: Dict[str, Any]):
+    """Forma em memória do registro: strings repetidas internadas e, se ativado, _Record."""
+    if isinstance(row, _Record):
+        return row
+    for field in col.intern:
+        value = row.get(field)
+        if type(value) is str:
+            row[field] = sys.intern(value)
+    return col.record(row) if col.record is not None else row
+
+def _store(filepath: str, row: Dict[str, Any]):
+    return _stored(_collections[filepath], row)
+
+def _object_hook(col: _Collection):
+    # Com registros compactos, converte cada registro já durante o json.loads: a lista inteira
+    # de dicts nunca existe em memória (pico e RSS menores ao carregar coleções grandes).
+    if col.record is None:
+        return None
+    # Objetos aninhados chegam antes; registros das coleções sempre têm "id"
+    return lambda obj: _stored(col, obj) if "id" in obj else obj
+
+def _touch(filepath: str, row: Dict[str, Any], old: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Marca o registro como alterado (substitui `old`): próxima versão da coleção + updatedAt."""
+    col = _collections[filepath]
+    col.version += 1
+    row["_version"] = col.version
+    row["updatedAt"] = datetime.now().isoformat()
+    if col.aggregate is not None:
+        if old is not None:
+            col.aggregate.replace(old, row)
+        else:
+            col.aggregate.apply(row, 1)
+    return row
+
+def _forget(filepath: str, row: Dict[str, Any]) -> None:
+    """Registra a exclusão para o feed de alterações (histórico limitado a CHANGES_RETENTION)."""
+    col = _collections[filepath]
+    if col.aggregate is not None:
+        col.aggregate.apply(row, -1)
+    item_id = row.get("id")
+    col.version += 1
+    col.deleted.append([item_id, col.version])
+    excess = len(col.deleted) - CHANGES_RETENTION
+    if excess > 0:
+        col.floor = col.deleted[excess - 1][1]
+        del col.deleted[:excess]
+
+def _clear(filepath: str) -> None:
+    col = _collections[filepath]
+    col.data.clear()
+    if col.aggregate is not None:
+        col.aggregate.reset()
+    if col.epoch is not None:
+        col.version += 1
+        col.floor = col.version
+        col.deleted = []
+
+def _replace_by_id(filepath: str, item_id: str, update: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    rows = _collections[filepath].data
+    for i, row in enumerate(rows):
+        if row.get("id") == item_id:
+            new = _touch(filepath, update(row), row)
+            rows[i] = _store(filepath, new)
+            return new
+    return None
+
+def _delete_by_id(filepath: str, item_id: str) -> bool:
+    rows = _collections[filepath].data
+    kept, removed = [], []
+    for r in rows:
+        (removed if r.get("id") == item_id else kept).append(r)
+    if not removed:
+        return False
+    rows[:] = kept
+    for r in removed:
+        _forget(filepath, r)
+    return True
+
+# Campos conhecidos de cada coleção (os do contrato em routes/schemas.py + controle do engine);
+# outros campos continuam aceitos e ficam em _Record._extra.
+_TRACKING_FIELDS = ("_version", "updatedAt")
+ClientRecord = _record_type("ClientRecord", ("id", "name", "phone", "email", "phoneE164", "contactValid") + _TRACKING_FIELDS)
+ChargeRecord = _record_type("ChargeRecord", (
+    "id", "clientName", "clientPhone", "clientEmail", "competence", "dueDate", "value",
+    "sendStatus", "whatsappStatus", "importError", "clientFound",
+) + _TRACKING_FIELDS)
+LogRecord = _record_type("LogRecord", ("id", "timestamp", "clientName", "whatsapp", "status", "message", "origin") + _TRACKING_FIELDS)
+RecurrentRecord = _record_type("RecurrentRecord", (
+    "id", "clientName", "clientPhone", "messageTemplate", "value", "status", "recurrenceType",
+    "recurrenceInterval", "recurrenceDaysOfWeek", "recurrenceDayOfMonth", "recurrenceMonthOfYear",
+    "dueDate", "startDate", "endDate", "lastSentDate", "nextSendDate", "lastAttemptStatus", "lastAttemptMessage",
+) + _TRACKING_FIELDS)
+
+# Coleções em memória (lidas em load()). A ordem aqui é a ordem das travas.
+settings: Dict[str, Any] = _register(SETTINGS_FILE, DEFAULT_SETTINGS)
+clients: List[Dict[str, Any]] = _register(CLIENTS_FILE, [], record=ClientRecord)
+charges: List[Dict[str, Any]] = _register(
+    CHARGES_FILE, [],
+    _Aggregate({"byStatus": "sendStatus", "byWhatsappStatus": "whatsappStatus", "byCompetence": "competence"}, with_value=True),
+    record=ChargeRecord,
+    intern=("clientName", "clientPhone", "clientEmail", "competence", "sendStatus", "whatsappStatus", "importError"),
+)
+recurrents: List[Dict[str, Any]] = _register(
+    RECURRING_CHARGES_FILE, [],
+    record=RecurrentRecord,
+    intern=("clientName", "clientPhone", "messageTemplate", "status", "recurrenceType", "lastAttemptStatus", "lastAttemptMessage"),
+)
+logs: List[Dict[str, Any]] = _register(
+    LOGS_FILE, [],
+    _Aggregate({"byStatus": "status", "byOrigin": "origin"}),
+    record=LogRecord,
+    intern=("clientName", "whatsapp", "status", "message", "origin"),
+)
 
 # ---------- Validações simples ----------
 
@@ -65,6 +899,32 @@ def is_valid_email(email: Optional[str]) -> bool:
     email_str = str(email).strip()
     return re.fullmatch(r"^[^\s@]+@[^\s@]+\.[^\s@]+$", email_str) is not None
 
+_NON_DIGITS = re.compile(r"\D+")
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Telefone como +<dígitos> (estilo E.164), sem o zero inicial de discagem; None se não houver dígitos."""
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub("", str(phone))
+    if digits.startswith("0"):
+        digits = digits[1:]
+    if PHONE_COUNTRY_CODE and len(digits) in (10, 11):
+        digits = PHONE_COUNTRY_CODE + digits
+    return f"+{digits}" if digits else None
+
+def _with_contact(client: Dict[str, Any]) -> Dict[str, Any]:
+    # Calculado uma vez, quando o cliente é gravado: o sync e o envio usam estes campos
+    # em vez de validar/limpar o telefone a cada passada.
+    client["phoneE164"] = normalize_phone(client.get("phone"))
+    client["contactValid"] = is_valid_phone_number(client.get("phone")) and is_valid_email(client.get("email"))
+    return client
+
+def _contact_valid(client: Dict[str, Any]) -> bool:
+    valid = client.get("contactValid")
+    if valid is None:  # registro ainda não normalizado (ver renormalize_clients)
+        valid = is_valid_phone_number(client.get("phone")) and is_valid_email(client.get("email"))
+    return valid
+
 # ---------- Helpers de data/moeda ----------
 
 def format_currency_backend(value: Any, currency_format: str) -> str:
@@ -106,6 +966,9 @@ def _parse_dt(value: Any) -> Optional[datetime]:
     except ValueError:
         return None
 
+# Passos máximos ao procurar a próxima data de uma recorrente (cada passo avança ao menos um dia)
+_MAX_RECURRENCE_STEPS = 1000
+
 def calculate_next_send_date(rc: Dict[str, Any]) -> Optional[datetime]:
     start_date = _parse_dt(rc.get("startDate"))
     end_date = _parse_dt(rc.get("endDate"))
@@ -137,11 +1000,14 @@ def calculate_next_send_date(rc: Dict[str, Any]) -> Optional[datetime]:
         next_send_date = current_date_for_calc
     else:
         temp_date = max(current_date_for_calc, now)
-        while True:
+        # Cada passo avança temp_date; o limite só protege contra dados inconsistentes
+        for _ in range(_MAX_RECURRENCE_STEPS):
             rtype = rc.get("recurrenceType")
-            interval = int(rc.get("recurrenceInterval", 1) or 1)
+            # Intervalo <= 0 faria a data andar para trás (ou parar) e o laço nunca terminaria
+            interval = max(1, int(rc.get("recurrenceInterval", 1) or 1))
             if rtype == "daily":
                 temp_date = temp_date + timedelta(days=interval)
+                next_send_date = temp_date  # sem isso o laço só terminava no overflow do datetime
             elif rtype == "weekly":
                 day_map = {
                     "segunda": 0, "terça": 1, "terca":1, "quarta": 2,
@@ -161,7 +1027,8 @@ def calculate_next_send_date(rc: Dict[str, Any]) -> Optional[datetime]:
                 found = False
                 for i in range(7 * interval + 1):
                     check = search_start + timedelta(days=i)
-                    if check.weekday() in target_weekdays:
+                    # check > now: com hoje entre os dias alvo, "hoje" nunca passava no teste final
+                    if check.weekday() in target_weekdays and check > now:
                         next_send_date = check
                         found = True
                         break
@@ -203,6 +1070,8 @@ def calculate_next_send_date(rc: Dict[str, Any]) -> Optional[datetime]:
 
             if next_send_date and next_send_date > now:
                 break
+        else:
+            return None  # sem próxima data: a recorrente não gera cobrança
 
     if next_send_date and end_date and next_send_date > end_date:
         return None
@@ -211,36 +1080,47 @@ def calculate_next_send_date(rc: Dict[str, Any]) -> Optional[datetime]:
 # ---------- CRUD / Operações ----------
 
 def list_clients() -> List[Dict[str, Any]]:
-    return clients
+    return _snapshot(CLIENTS_FILE)
 
 def add_client(data: Dict[str, Any]) -> Dict[str, Any]:
-    data = dict(data)
+    data = _with_contact(dict(data))
     data.setdefault("id", str(uuid.uuid4()))
-    clients.append(data)
-    _save_data(CLIENTS_FILE, clients)
+    _apply(CLIENTS_FILE, lambda: clients.append(_store(CLIENTS_FILE, _touch(CLIENTS_FILE, data))))
     return data
 
 def update_client(client_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    for c in clients:
-        if c.get("id") == client_id:
-            c.update(fields)
-            _save_data(CLIENTS_FILE, clients)
-            return c
-    return None
+    return _apply(CLIENTS_FILE, lambda: _replace_by_id(CLIENTS_FILE, client_id, lambda c: _with_contact({**c, **fields})))
 
 def delete_client(client_id: str) -> bool:
-    global clients
-    before = len(clients)
-    clients[:] = [c for c in clients if c.get("id") != client_id]
-    _save_data(CLIENTS_FILE, clients)
-    return len(clients) != before
+    return _apply(CLIENTS_FILE, lambda: _delete_by_id(CLIENTS_FILE, client_id))
 
 def clear_clients() -> None:
-    clients.clear()
-    _save_data(CLIENTS_FILE, clients)
+    _apply(CLIENTS_FILE, lambda: _clear(CLIENTS_FILE))
+
+def renormalize_clients() -> int:
+    """
+    Recalcula phoneE164/contactValid de todos os clientes (dados anteriores à normalização ou
+    após mudar COBRANCA_PHONE_COUNTRY_CODE). Só os registros que mudaram ganham nova versão;
+    a coleção é gravada uma única vez. Retorna quantos clientes foram atualizados.
+    """
+    with _mutating(CLIENTS_FILE):
+        fresh = []
+        for current in clients:
+            c = _with_contact(_as_dict(current))
+            changed = c.get("phoneE164") != current.get("phoneE164") or c.get("contactValid") != current.get("contactValid")
+            fresh.append(c if changed else current)
+        updated = sum(1 for new, old in zip(fresh, clients) if new is not old)
+        if updated:
+            with _swap(CLIENTS_FILE):
+                clients[:] = [
+                    _store(CLIENTS_FILE, _touch(CLIENTS_FILE, new, old)) if new is not old else old
+                    for new, old in zip(fresh, clients)
+                ]
+            _persist(CLIENTS_FILE)
+        return updated
 
 def list_charges() -> List[Dict[str, Any]]:
-    return charges
+    return _snapshot(CHARGES_FILE)
 
 def _normalize_charge_mutation(payload: Dict[str, Any]) -> Dict[str, Any]:
     p = dict(payload)
@@ -259,66 +1139,71 @@ def _normalize_charge_mutation(payload: Dict[str, Any]) -> Dict[str, Any]:
 def add_charge(payload: Dict[str, Any]) -> Dict[str, Any]:
     p = _normalize_charge_mutation(payload)
     p.setdefault("id", str(uuid.uuid4()))
-    charges.append(p)
-    _save_data(CHARGES_FILE, charges)
+    _apply(CHARGES_FILE, lambda: charges.append(_store(CHARGES_FILE, _touch(CHARGES_FILE, p))))
     return p
 
 def update_charge(charge_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     fields = _normalize_charge_mutation(fields)
-    for ch in charges:
-        if ch.get("id") == charge_id:
-            ch.update(fields)
-            _save_data(CHARGES_FILE, charges)
-            return ch
-    return None
+    return _apply(CHARGES_FILE, lambda: _replace_by_id(CHARGES_FILE, charge_id, lambda ch: {**ch, **fields}))
 
 def delete_charge(charge_id: str) -> bool:
-    before = len(charges)
-    charges[:] = [ch for ch in charges if ch.get("id") != charge_id]
-    _save_data(CHARGES_FILE, charges)
-    return len(charges) != before
+    return _apply(CHARGES_FILE, lambda: _delete_by_id(CHARGES_FILE, charge_id))
 
 def clear_charges() -> None:
-    charges.clear()
-    _save_data(CHARGES_FILE, charges)
+    _apply(CHARGES_FILE, lambda: _clear(CHARGES_FILE))
 
 def list_logs() -> List[Dict[str, Any]]:
-    return logs
+    return _snapshot(LOGS_FILE)
 
 def add_log(entry: Dict[str, Any]) -> Dict[str, Any]:
     e = dict(entry)
     e.setdefault("id", str(uuid.uuid4()))
     e.setdefault("timestamp", datetime.now().isoformat())
-    logs.append(e)
-    _save_data(LOGS_FILE, logs)
+    _apply(LOGS_FILE, lambda: logs.append(_store(LOGS_FILE, _touch(LOGS_FILE, e))))
     return e
 
 def clear_logs() -> None:
-    logs.clear()
-    _save_data(LOGS_FILE, logs)
+    _apply(LOGS_FILE, lambda: _clear(LOGS_FILE))
 
 def get_settings() -> Dict[str, Any]:
-    return settings
+    return _snapshot(SETTINGS_FILE)
 
 def update_settings(fields: Dict[str, Any]) -> Dict[str, Any]:
-    settings.update(fields)
-    _save_data(SETTINGS_FILE, settings)
-    return settings
+    _apply(SETTINGS_FILE, lambda: settings.update(fields))
+    return _snapshot(SETTINGS_FILE)
 
 # ---------- Recorrentes ----------
 
+def _with_next_send_date(rc: Dict[str, Any]) -> Dict[str, Any]:
+    rc = _as_dict(rc)
+    rc["nextSendDate"] = None
+    nsd = calculate_next_send_date(rc)
+    rc["nextSendDate"] = nsd.isoformat() if nsd else None
+    return rc
+
+def _same_send_day(new: Optional[str], old: Optional[str]) -> bool:
+    # nextSendDate calculado a partir de "agora" anda a cada leitura; só conta como alteração
+    # (grava e gera nova versão) quando muda o dia de envio
+    return new == old or bool(new and old and new[:10] == old[:10])
+
 def list_recurrents() -> List[Dict[str, Any]]:
-    # recalcula nextSendDate on-read (paridade)
-    for rc in recurrents:
-        # casting para datetime
-        for key in ("dueDate", "startDate", "endDate", "lastSentDate"):
-            if isinstance(rc.get(key), str) or rc.get(key) is None:
-                pass  # calculate_next_send_date já trata
-        rc["nextSendDate"] = None
-        nsd = calculate_next_send_date(rc)
-        rc["nextSendDate"] = nsd.isoformat() if nsd else None
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
-    return recurrents
+    # recalcula nextSendDate on-read (paridade); só trava e grava se algum dia de envio mudou
+    rows = _snapshot(RECURRING_CHARGES_FILE)
+    if all(_same_send_day(_with_next_send_date(rc)["nextSendDate"], rc.get("nextSendDate")) for rc in rows):
+        return rows
+    with _mutating(RECURRING_CHARGES_FILE):
+        fresh = []
+        for rc in recurrents:
+            new = _with_next_send_date(rc)
+            fresh.append(rc if _same_send_day(new["nextSendDate"], rc.get("nextSendDate")) else new)
+        if any(new is not old for new, old in zip(fresh, recurrents)):
+            with _swap(RECURRING_CHARGES_FILE):
+                for i, (new, old) in enumerate(zip(fresh, recurrents)):
+                    if new is not old:
+                        fresh[i] = _store(RECURRING_CHARGES_FILE, _touch(RECURRING_CHARGES_FILE, new, old))
+                recurrents[:] = fresh
+            _persist(RECURRING_CHARGES_FILE)
+        return list(fresh)
 
 def add_recurrent(payload: Dict[str, Any]) -> Dict[str, Any]:
     rc = dict(payload)
@@ -328,39 +1213,38 @@ def add_recurrent(payload: Dict[str, Any]) -> Dict[str, Any]:
     rc["lastAttemptMessage"] = None
     nsd = calculate_next_send_date(rc)
     rc["nextSendDate"] = nsd.isoformat() if nsd else None
-    recurrents.append(rc)
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
+    _apply(RECURRING_CHARGES_FILE, lambda: recurrents.append(_store(RECURRING_CHARGES_FILE, _touch(RECURRING_CHARGES_FILE, rc))))
     return rc
 
 def update_recurrent(rc_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    for rc in recurrents:
-        if rc.get("id") == rc_id:
-            rc.update(fields)
-            nsd = calculate_next_send_date(rc)
-            rc["nextSendDate"] = nsd.isoformat() if nsd else None
-            _save_data(RECURRING_CHARGES_FILE, recurrents)
-            return rc
-    return None
+    return _apply(RECURRING_CHARGES_FILE, lambda: _replace_by_id(RECURRING_CHARGES_FILE, rc_id, lambda rc: _with_next_send_date({**rc, **fields})))
 
 def delete_recurrent(rc_id: str) -> bool:
-    before = len(recurrents)
-    recurrents[:] = [r for r in recurrents if r.get("id") != rc_id]
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
-    return len(recurrents) != before
+    return _apply(RECURRING_CHARGES_FILE, lambda: _delete_by_id(RECURRING_CHARGES_FILE, rc_id))
 
 def clear_recurrents() -> None:
-    recurrents.clear()
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
+    _apply(RECURRING_CHARGES_FILE, lambda: _clear(RECURRING_CHARGES_FILE))
 
 def sync_charges_with_clients() -> int:
+    with _mutating(CHARGES_FILE):
+        return _sync_charges_with_clients(_snapshot(CLIENTS_FILE))
+
+def _sync_charges_with_clients(client_rows: List[Dict[str, Any]]) -> int:
     updated = 0
-    for ch in charges:
-        client = next((c for c in clients if c.get("name") == ch.get("clientName")), None)
+    synced = []
+    # Índice por nome (o primeiro cliente com o nome vence, como na busca linear)
+    clients_by_name: Dict[Any, Dict[str, Any]] = {}
+    for c in client_rows:
+        clients_by_name.setdefault(c.get("name"), c)
+    for current in charges:
+        ch = _as_dict(current)
+        before = updated
+        client = clients_by_name.get(ch.get("clientName"))
         if client:
             if (ch.get("clientPhone") != client.get("phone")) or (ch.get("clientEmail") != client.get("email")) or (ch.get("importError") == "Dados de contato do cliente inválidos na base."):
                 ch["clientPhone"] = client.get("phone", "")
                 ch["clientEmail"] = client.get("email", "")
-                if is_valid_phone_number(ch["clientPhone"]) and is_valid_email(ch["clientEmail"]):
+                if _contact_valid(client):
                     ch["sendStatus"] = "Pendente"
                     ch["whatsappStatus"] = "Aguardando Envio"
                     ch["importError"] = ""
@@ -382,26 +1266,45 @@ def sync_charges_with_clients() -> int:
                 ch["whatsappStatus"] = "Cliente Não Encontrado"
                 ch["importError"] = "Cliente não encontrado na base de clientes."
                 updated += 1
-    _save_data(CHARGES_FILE, charges)
+        # Registro sem alteração real continua o mesmo objeto (sem nova versão)
+        synced.append(ch if updated != before and ch != current else current)
+    if updated:
+        with _swap(CHARGES_FILE):
+            charges[:] = [
+                _store(CHARGES_FILE, _touch(CHARGES_FILE, ch, current)) if ch is not current else current
+                for ch, current in zip(synced, charges)
+            ]
+        _persist(CHARGES_FILE)
     return updated
 
 def send_whatsapp_message(phone_number: str, message_content: str) -> Dict[str, Any]:
-    # Paridade com local: lê settings do disco a cada envio
-    cfg = _load_data(SETTINGS_FILE, DEFAULT_SETTINGS)
+    start = time.perf_counter()
+    result = _send_whatsapp_message(phone_number, message_content)
+    _emit("zapi_call", status=result.get("status"), duration=time.perf_counter() - start)
+    return result
+
+def _send_whatsapp_message(phone_number: str, message_content: str) -> Dict[str, Any]:
+    # Paridade com local: usa as settings atuais do disco (recarrega se outro worker alterou)
+    cfg = _snapshot(SETTINGS_FILE)
     instance_id = cfg.get("zapiInstanceId")
     token = cfg.get("zapiToken")
     security_token = cfg.get("zapiSecurityToken")
     if not instance_id or not token or not security_token:
         return {"status": "Erro de Configuração", "message": "Credenciais Z-API ausentes no backend."}
 
-    cleaned = "".join([c for c in str(phone_number) if c.isdigit()])
-    if cleaned.startswith("0"):
-        cleaned = cleaned[1:]
+    # Telefone já normalizado (phoneE164 do cliente) é usado direto; outro formato é normalizado aqui
+    phone = str(phone_number or "")
+    if phone[:1] == "+" and phone[1:].isdigit() and phone[1:2] != "0":
+        cleaned = phone[1:]
+    else:
+        cleaned = (normalize_phone(phone) or "+")[1:]
 
-    url = f"https://api.z-api.io/instances/{instance_id}/token/{token}/send-text"
+    url = f"{ZAPI_BASE_URL}/instances/{instance_id}/token/{token}/send-text"
     headers = {"Client-Token": security_token, "Content-Type": "application/json"}
     payload = {"phone": cleaned, "message": message_content}
 
+    import requests  # sob demanda: só o envio pela Z-API usa (evita o custo na subida)
+
     try:
         resp = requests.post(url, headers=headers, json=payload, timeout=30)
         if resp.ok:
@@ -428,52 +1331,147 @@ def send_whatsapp_message(phone_number: str, message_content: str) -> Dict[str,
         return {"status": "Erro", "message": f"Erro geral Z-API: {e}"}
 
 def process_recurrents() -> int:
+    # A trava de recorrentes fica com um único worker durante todo o lote: dois workers
+    # processando ao mesmo tempo enviariam a mesma mensagem duas vezes.
+    # transaction(): os add_log de cada recorrência e a atualização das recorrências viram
+    # uma gravação de logs.json e uma de recurring_charges.json ao final do lote.
+    with _mutating(RECURRING_CHARGES_FILE), transaction():
+        return _process_recurrents(_snapshot(SETTINGS_FILE), _snapshot(CLIENTS_FILE))
+
+def _process_recurrents(cfg: Dict[str, Any], client_rows: List[Dict[str, Any]]) -> int:
     processed = 0
     now = datetime.now()
-    cfg = _load_data(SETTINGS_FILE, DEFAULT_SETTINGS)
-    for rc in recurrents:
-        nsd = calculate_next_send_date(rc)
-        rc["nextSendDate"] = nsd.isoformat() if nsd else None
-        if rc.get("status") == "Active" and rc.get("nextSendDate") and _parse_dt(rc["nextSendDate"]) <= now and (not _parse_dt(rc.get("endDate")) or _parse_dt(rc["endDate"]) >= now):
-            client = next((c for c in clients if c.get("name") == rc.get("clientName")), None)
-            if not client:
-                msg = f"Cliente '{rc.get('clientName')}' não encontrado para recorrência."
-                rc["lastAttemptStatus"] = "Erro"
-                rc["lastAttemptMessage"] = msg
-                add_log({"clientName": rc.get("clientName"), "whatsapp": rc.get("clientPhone", "N/A"), "status": "Erro", "message": msg, "origin": "Recorrente"})
-                continue
-
-            msg = rc.get("messageTemplate") or cfg.get("defaultMessage", "")
-            msg = msg.replace("(nome)", rc.get("clientName") or "")
-            msg = msg.replace("(valor)", format_currency_backend(rc.get("value"), cfg.get("currencyFormat", "BRL")))
-            msg = msg.replace("(vencimento)", format_date_backend(_parse_dt(rc.get("dueDate")), cfg.get("dateFormat", "DD/MM/YYYY")))
-
-            result = send_whatsapp_message(client.get("phone"), msg)
-
-            rc["lastSentDate"] = now.isoformat()
-            rc["lastAttemptStatus"] = result["status"]
-            rc["lastAttemptMessage"] = result["message"]
-
-            add_log({"clientName": rc.get("clientName"), "whatsapp": client.get("phone", "N/A"), "status": result["status"], "message": result["message"], "origin": "Recorrente"})
-            if rc.get("recurrenceType") == "once" and result["status"] == "Enviado":
-                rc["status"] = "Completed"
-                rc["nextSendDate"] = None
-            else:
-                nsd2 = calculate_next_send_date(rc)
-                rc["nextSendDate"] = nsd2.isoformat() if nsd2 else None
+    # Índice por nome (o primeiro cliente com o nome vence, como na busca linear)
+    clients_by_name: Dict[Any, Dict[str, Any]] = {}
+    for c in client_rows:
+        clients_by_name.setdefault(c.get("name"), c)
+    for i, current in enumerate(list(recurrents)):
+        rc = _as_dict(current)
+        if _process_recurrent(rc, now, cfg, clients_by_name):
             processed += 1
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
+        if rc != current:
+            with _swap(RECURRING_CHARGES_FILE):
+                recurrents[i] = _store(RECURRING_CHARGES_FILE, _touch(RECURRING_CHARGES_FILE, rc, current))
+    _persist(RECURRING_CHARGES_FILE)
     return processed
 
+def _process_recurrent(rc: Dict[str, Any], now: datetime, cfg: Dict[str, Any], clients_by_name: Dict[Any, Dict[str, Any]]) -> bool:
+    """Processa uma recorrência (alterando `rc`). Retorna True se houve tentativa de envio."""
+    nsd = calculate_next_send_date(rc)
+    rc["nextSendDate"] = nsd.isoformat() if nsd else None
+    if rc.get("status") == "Active" and rc.get("nextSendDate") and _parse_dt(rc["nextSendDate"]) <= now and (not _parse_dt(rc.get("endDate")) or _parse_dt(rc["endDate"]) >= now):
+        client = clients_by_name.get(rc.get("clientName"))
+        if not client:
+            msg = f"Cliente '{rc.get('clientName')}' não encontrado para recorrência."
+            rc["lastAttemptStatus"] = "Erro"
+            rc["lastAttemptMessage"] = msg
+            add_log({"clientName": rc.get("clientName"), "whatsapp": rc.get("clientPhone", "N/A"), "status": "Erro", "message": msg, "origin": "Recorrente"})
+            return False
+
+        msg = rc.get("messageTemplate") or cfg.get("defaultMessage", "")
+        msg = msg.replace("(nome)", rc.get("clientName") or "")
+        msg = msg.replace("(valor)", format_currency_backend(rc.get("value"), cfg.get("currencyFormat", "BRL")))
+        msg = msg.replace("(vencimento)", format_date_backend(_parse_dt(rc.get("dueDate")), cfg.get("dateFormat", "DD/MM/YYYY")))
+
+        result = send_whatsapp_message(client.get("phoneE164") or client.get("phone"), msg)
+
+        rc["lastSentDate"] = now.isoformat()
+        rc["lastAttemptStatus"] = result["status"]
+        rc["lastAttemptMessage"] = result["message"]
+
+        add_log({"clientName": rc.get("clientName"), "whatsapp": client.get("phone", "N/A"), "status": result["status"], "message": result["message"], "origin": "Recorrente"})
+        if rc.get("recurrenceType") == "once" and result["status"] == "Enviado":
+            rc["status"] = "Completed"
+            rc["nextSendDate"] = None
+        else:
+            nsd2 = calculate_next_send_date(rc)
+            rc["nextSendDate"] = nsd2.isoformat() if nsd2 else None
+        return True
+    return False
+
 def clear_all_data() -> None:
-    clients.clear()
-    charges.clear()
-    logs.clear()
-    recurrents.clear()
-    settings.clear()
-    settings.update(DEFAULT_SETTINGS)
-    _save_data(CLIENTS_FILE, clients)
-    _save_data(CHARGES_FILE, charges)
-    _save_data(LOGS_FILE, logs)
-    _save_data(RECURRING_CHARGES_FILE, recurrents)
-    _save_data(SETTINGS_FILE, settings)
+    with _mutating(*_collections), ExitStack() as swaps:
+        for filepath in _collections:
+            swaps.enter_context(_swap(filepath))
+        for filepath in _collections:
+            _clear(filepath)
+        settings.update(copy.deepcopy(DEFAULT_SETTINGS))
+        for filepath in _collections:
+            _persist(filepath)
+
+# ---------- Versões e feed de alterações ----------
+
+VERSIONED_COLLECTIONS = {
+    "clients": CLIENTS_FILE,
+    "charges": CHARGES_FILE,
+    "recurring_charges": RECURRING_CHARGES_FILE,
+    "logs": LOGS_FILE,
+}
+
+def collection_version(name: str) -> str:
+    """Versão atual da coleção ("<época>-<versão>"); custa um stat() quando nada mudou."""
+    filepath = VERSIONED_COLLECTIONS[name]
+    _refresh(filepath)
+    col = _collections[filepath]
+    return f"{col.epoch}-{col.version}"
+
+def _parse_since(token: Optional[str]) -> Dict[str, str]:
+    # "charges:<época>-<versão>,logs:<época>-<versão>" -> {"charges": "<época>-<versão>", ...}
+    out = {}
+    for part in (token or "").split(","):
+        name, _, version = part.strip().partition(":")
+        if name and version:
+            out[name] = version
+    return out
+
+def _collection_changes(name: str, since: Optional[str]) -> Dict[str, Any]:
+    filepath = VERSIONED_COLLECTIONS[name]
+    _refresh(filepath)
+    col = _collections[filepath]
+    with col.rw.read():
+        epoch, version, floor = col.epoch, col.version, col.floor
+        base = None
+        if since:
+            since_epoch, _, since_version = since.rpartition("-")
+            if since_epoch == epoch and since_version.isdigit():
+                base = int(since_version)
+        if base is None or base < floor or base > version:
+            return {"version": f"{epoch}-{version}", "reset": True, "updated": [], "deleted": []}
+        if base == version:
+            return {"version": f"{epoch}-{version}", "reset": False, "updated": [], "deleted": []}
+        rows = list(col.data)
+        deleted = [item_id for item_id, v in col.deleted if v > base]
+    # Registros são copy-on-write: a varredura roda fora da trava
+    updated = [r for r in rows if r.get("_version", 0) > base]
+    return {"version": f"{epoch}-{version}", "reset": False, "updated": updated, "deleted": deleted}
+
+def changes_since(since: Optional[str], names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Alterações de cada coleção desde o token `since` (o "version" de uma resposta anterior).
+    Por coleção: "updated" (registros criados/alterados), "deleted" (ids) e "reset" quando o
+    histórico não cobre o token (primeira chamada, outra época, coleção limpa ou exclusões já
+    descartadas); nesse caso o cliente deve recarregar a lista inteira.
+    """
+    tokens = _parse_since(since)
+    changes = {name: _collection_changes(name, tokens.get(name)) for name in (names or VERSIONED_COLLECTIONS)}
+    version = ",".join(f"{name}:{c.pop('version')}" for name, c in changes.items())
+    return {"version": version, "changes": changes}
+
+# ---------- Agregados do painel ----------
+
+def aggregates() -> Dict[str, Any]:
+    """
+    Totais de cobranças (por status, status do WhatsApp e competência, com soma de valores) e
+    de logs (por status e origem, enviados x erros), mantidos a cada alteração: a leitura não
+    percorre os registros.
+    """
+    out = {}
+    for name, filepath in (("charges", CHARGES_FILE), ("logs", LOGS_FILE)):
+        _refresh(filepath)
+        col = _collections[filepath]
+        with col.rw.read():
+            out[name] = col.aggregate.snapshot()
+    by_status = out["logs"]["byStatus"]
+    out["logs"]["sent"] = by_status.get("Enviado", 0)
+    out["logs"]["errors"] = sum(n for status, n in by_status.items() if str(status).startswith("Erro"))
+    return out
@@ -0,0 +1,150 @@
+# tenants.py
+# Partições da cobrança por tenant (opt-in, COBRANCA_MULTI_TENANT=1).
+#
+# Cada tenant (a organização do usuário autenticado ou, sem ela, o próprio usuário) tem seu
+# diretório em COBRANCA_DATA_DIR/tenants/<chave> e sua própria instância do engine: engine.py
+# é executado de novo com DATA_DIR apontando para esse diretório, então coleções, travas
+# (mutex e flock), write-behind, versões e agregados são independentes. As escritas de um
+# tenant não esperam pelas de outro nem regravam os arquivos dele.
+#
+# A instância é criada no primeiro acesso do tenant (e os dados só são lidos quando uma rota
+# os usa). As instâncias ficam numa LRU. Acima de COBRANCA_TENANTS_MAX, ou ociosas por mais de
+# COBRANCA_TENANT_IDLE_SECONDS, são encerradas e descartadas da memória. Nunca se descarta uma
+# instância em uso por uma requisição, nem uma com gravações pendentes: essa sai numa
+# varredura seguinte, depois do flush do write-behind. A memória acompanha os tenants ativos,
+# não o total de tenants.
+
+import os
+import re
+import time
+import atexit
+import hashlib
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional
+
+import engine
+
+logger = logging.getLogger("konty")
+
+ENABLED = os.environ.get("COBRANCA_MULTI_TENANT", "0") == "1"
+TENANTS_DIR = os.path.join(engine.DATA_DIR, "tenants")
+MAX_ACTIVE = int(os.environ.get("COBRANCA_TENANTS_MAX", "100"))
+IDLE_SECONDS = float(os.environ.get("COBRANCA_TENANT_IDLE_SECONDS", "900"))
+
+# Chaves usadas como nome de diretório; outras viram hash
+_SAFE_KEY = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+class _Tenant:
+    __slots__ = ("key", "engine", "users", "last_used", "init_lock")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.engine: Optional[ModuleType] = None
+        self.users = 0  # requisições usando a instância (não pode ser descartada)
+        self.last_used = time.monotonic()
+        self.init_lock = threading.Lock()
+
+# LRU: o tenant usado mais recentemente fica no fim
+_tenants: "OrderedDict[str, _Tenant]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"created": 0, "evicted": 0}
+
+def tenant_key(user: Dict[str, Any]) -> str:
+    """Chave do tenant do usuário autenticado: a organização (org_id) ou o id do usuário."""
+    key = str(user.get("org_id") or user["id"])
+    if _SAFE_KEY.fullmatch(key):
+        return key
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def _create(key: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(f"cobranca_engine_{key}", engine.__file__)
+    mod = importlib.util.module_from_spec(spec)
+    mod.DATA_DIR = os.path.join(TENANTS_DIR, key)
+    spec.loader.exec_module(mod)
+    # Mesmos ganchos de observabilidade registrados pela camada HTTP no engine global
+    for event, fns in engine._hooks.items():
+        for fn in fns:
+            mod.register_hook(event, fn)
+    return mod
+
+def _close(tenant: _Tenant) -> None:
+    mod = tenant.engine
+    if mod is None:
+        return
+    try:
+        mod.shutdown()
+    except Exception as exc:
+        logger.exception("cobranca tenant=%s falha ao encerrar: %r", tenant.key, exc)
+    atexit.unregister(mod.shutdown)
+
+def _evictable(now: float) -> List[_Tenant]:
+    # Chamado com _lock. Percorre do menos recente para o mais recente.
+    out = []
+    excess = len(_tenants) - MAX_ACTIVE
+    for key, tenant in list(_tenants.items()):
+        if excess <= 0 and now - tenant.last_used < IDLE_SECONDS:
+            break
+        if tenant.users or (tenant.engine is not None and tenant.engine.has_pending_writes()):
+            continue
+        del _tenants[key]
+        out.append(tenant)
+        excess -= 1
+    _stats["evicted"] += len(out)
+    return out
+
+def sweep() -> int:
+    """Descarta os tenants ociosos (ou excedentes). Retorna quantos foram descartados."""
+    with _lock:
+        evicted = _evictable(time.monotonic())
+    for tenant in evicted:
+        _close(tenant)
+    return len(evicted)
+
+@contextmanager
+def use(key: str) -> Iterator[ModuleType]:
+    """Engine do tenant, criado se preciso; a instância não é descartada durante o bloco."""
+    with _lock:
+        tenant = _tenants.get(key)
+        if tenant is None:
+            tenant = _tenants[key] = _Tenant(key)
+        else:
+            _tenants.move_to_end(key)
+        tenant.users += 1
+        evicted = _evictable(time.monotonic())
+    try:
+        for old in evicted:
+            _close(old)
+        if tenant.engine is None:
+            with tenant.init_lock:
+                if tenant.engine is None:
+                    tenant.engine = _create(key)
+                    _stats["created"] += 1
+        yield tenant.engine
+    finally:
+        with _lock:
+            tenant.users -= 1
+            tenant.last_used = time.monotonic()
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            "active": len(_tenants),
+            "loaded": sum(1 for t in _tenants.values() if t.engine is not None and t.engine.is_loaded()),
+            "in_use": sum(1 for t in _tenants.values() if t.users),
+            **_stats,
+        }
+
+def shutdown() -> None:
+    """Grava e descarta todas as instâncias (lifespan do FastAPI / atexit)."""
+    with _lock:
+        tenants = list(_tenants.values())
+        _tenants.clear()
+    for tenant in tenants:
+        _close(tenant)
+
+atexit.register(shutdown)
@@ -2,8 +2,11 @@
 # modules/extrair-pdf/core/engine.py
 import io
 import re
+import json
 import zipfile
 from datetime import datetime
+from contextlib import contextmanager
+from functools import lru_cache
 
 import pdfplumber
 from PyPDF2 import PdfReader, PdfWriter
@@ -16,135 +19,265 @@ class PdfProcessingError(Exception):
 # ----------------------
 # Funções de extração
 # ----------------------
+MESES_MAP = {
+    'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04',
+    'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09',
+    'outubro': '10', 'novembro': '11', 'dezembro': '12',
+    'jan': '01', 'fev': '02', 'mar': '03', 'abr': '04', 'mai': '05', 'jun': '06',
+    'jul': '07', 'ago': '08', 'set': '09', 'out': '10', 'nov': '11', 'dez': '12'
+}
+
+# Quantidade de linhas do topo da página consideradas "cabeçalho" (onde ficam os campos)
+HEADER_LINES = 20
+
+class ExtratorCampos:
+    """
+    Extrai competência, condomínio, CNPJ e funcionário de uma página.
+    Os padrões são compilados uma vez; a busca roda apenas sobre o cabeçalho da página
+    e só recorre ao texto completo quando um campo não aparece no cabeçalho ou quando o
+    match encosta no corte do cabeçalho (pode continuar além dele).
+    """
+
+    def __init__(self, header_lines: int = HEADER_LINES):
+        self.header_lines = header_lines
+        self.re_competencia = re.compile(r'(0[1-9]|1[0-2])\.(20\d{2})')
+        self.re_competencia_extenso = re.compile(
+            r'((?:Jan|Fev|Mar|Abr|Mai|Jun|Jul|Ago|Set|Out|Nov|Dez)[a-z]*|'
+            r'janeiro|fevereiro|março|marco|abril|maio|junho|julho|agosto|'
+            r'setembro|outubro|novembro|dezembro)\s+de\s+(\d{4})',
+            re.IGNORECASE
+        )
+        self.re_codigo = re.compile(r'Código\s*\n?\s*(\d+)', re.IGNORECASE)
+        self.re_nome = re.compile(r'Nome\s+do\s+Funcionário\s*\n?\s*([A-Z\s\.-]+)', re.IGNORECASE)
+        self.re_nome_sufixo = re.compile(r'\s*(\(CBO:|\(A\)|[A-Z\s]*\d{4})\s*$')
+        self.re_quebra = re.compile(r'\s*\n\s*')
+        self.re_cnpj = re.compile(r'CNPJ:\s*(\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2})')
+        self.re_condominio = re.compile(r'^(.*?)\s*(?:CNPJ:|CC:)', re.MULTILINE | re.IGNORECASE)
+        self.re_folha_inicio = re.compile(r'^Folha Mensal\s*', re.IGNORECASE)
+        self.re_primeira_linha = re.compile(r'^\s*([^\n\r]+)')
+        self.re_folha_fim = re.compile(r'\s*Folha Mensal$', re.IGNORECASE)
+
+    def _header(self, text: str) -> str:
+        """Recorta as primeiras `header_lines` linhas (sem dividir o texto inteiro)."""
+        pos = -1
+        for _ in range(self.header_lines):
+            pos = text.find('\n', pos + 1)
+            if pos == -1:
+                return text
+        return text[:pos]
+
+    def _search(self, pattern, header: str, text: str):
+        m = pattern.search(header)
+        # Sem match no cabeçalho, ou match que termina no corte (ex.: nome que continua na linha
+        # seguinte, padrões que atravessam quebras de linha): refaz a busca no texto completo
+        if len(header) != len(text) and (m is None or m.end() == len(header)):
+            m = pattern.search(text)
+        return m
+
+    def competencia(self, text: str, header: str = None) -> str:
+        header = self._header(text) if header is None else header
+        match = self._search(self.re_competencia, header, text)
+        if match:
+            return match.group(0)
+        match2 = self._search(self.re_competencia_extenso, header, text)
+        if match2:
+            mes_num = MESES_MAP.get(match2.group(1).lower()[:3], 'XX')
+            return f"{mes_num}.{match2.group(2)}"
+        return "DataDesconhecida"
+
+    def codigo_nome_funcionario(self, text: str, header: str = None):
+        header = self._header(text) if header is None else header
+        codigo = "CodigoDesconhecido"
+        nome = "NomeDesconhecido"
+
+        m_cod = self._search(self.re_codigo, header, text)
+        if m_cod:
+            codigo = m_cod.group(1).strip()
+
+        m_nome = self._search(self.re_nome, header, text)
+        if m_nome:
+            nome = self.re_nome_sufixo.sub('', m_nome.group(1).strip()).strip()
+            nome = self.re_quebra.sub(' ', nome).strip()
+
+        return codigo, nome
+
+    def condominio_cnpj(self, text: str, header: str = None):
+        header = self._header(text) if header is None else header
+        condominio = "CondominioDesconhecido"
+        cnpj = "CNPJDesconhecido"
+
+        m_cnpj = self._search(self.re_cnpj, header, text)
+        if m_cnpj:
+            cnpj = m_cnpj.group(1).strip()
+
+        m_cond = self._search(self.re_condominio, header, text)
+        if m_cond:
+            condominio_bruto = self.re_folha_inicio.sub('', m_cond.group(1).strip()).strip()
+            condominio = condominio_bruto if condominio_bruto else "CondominioDesconhecido"
+        else:
+            first_line_match = self.re_primeira_linha.match(text)
+            if first_line_match:
+                condominio_bruto = self.re_folha_fim.sub('', first_line_match.group(1).strip()).strip()
+                condominio = condominio_bruto if condominio_bruto else "CondominioDesconhecido"
+
+        return condominio, cnpj
+
+    def extrair(self, text: str, funcionario: bool = True) -> dict:
+        """Extrai todos os campos da página recortando o cabeçalho uma única vez."""
+        header = self._header(text)
+        condominio_bruto, cnpj = self.condominio_cnpj(text, header)
+        campos = {
+            "competencia": self.competencia(text, header),
+            "condominio_bruto": condominio_bruto,
+            "condominio": clean_condominio_name(condominio_bruto),
+            "cnpj": cnpj,
+        }
+        if funcionario:
+            campos["codigo"], campos["nome"] = self.codigo_nome_funcionario(text, header)
+        return campos
+
+_extrator = ExtratorCampos()
+
 def extrair_competencia(text: str) -> str:
     """
     Extrai competência no formato MM.AAAA ou por mês escrito ("Março de 2024")
     e padroniza para MM.AAAA. Retorna "DataDesconhecida" quando não identifica.
     """
-    match = re.search(r'(0[1-9]|1[0-2])\.(20\d{2})', text)
-    if match:
-        return match.group(0)
-
-    match2 = re.search(
-        r'((?:Jan|Fev|Mar|Abr|Mai|Jun|Jul|Ago|Set|Out|Nov|Dez)[a-z]*|'
-        r'janeiro|fevereiro|março|marco|abril|maio|junho|julho|agosto|'
-        r'setembro|outubro|novembro|dezembro)\s+de\s+(\d{4})',
-        text, flags=re.IGNORECASE
-    )
-    if match2:
-        meses_map = {
-            'janeiro': '01', 'fevereiro': '02', 'março': '03', 'marco': '03', 'abril': '04',
-            'maio': '05', 'junho': '06', 'julho': '07', 'agosto': '08', 'setembro': '09',
-            'outubro': '10', 'novembro': '11', 'dezembro': '12',
-            'jan': '01', 'fev': '02', 'mar': '03', 'abr': '04', 'mai': '05', 'jun': '06',
-            'jul': '07', 'ago': '08', 'set': '09', 'out': '10', 'nov': '11', 'dez': '12'
-        }
-        mes_txt = match2.group(1).lower()
-        ano = match2.group(2)
-        mes_num = meses_map.get(mes_txt[:3], 'XX')
-        return f"{mes_num}.{ano}"
-
-    return "DataDesconhecida"
+    return _extrator.competencia(text)
 
 def extrair_codigo_nome_funcionario(text: str):
     """Extrai 'Código' e 'Nome do Funcionário' quando disponíveis."""
-    codigo = "CodigoDesconhecido"
-    nome = "NomeDesconhecido"
-
-    m_cod = re.search(r'Código\s*\n?\s*(\d+)', text, re.IGNORECASE)
-    if m_cod:
-        codigo = m_cod.group(1).strip()
-
-    m_nome = re.search(r'Nome\s+do\s+Funcionário\s*\n?\s*([A-Z\s\.-]+)', text, re.IGNORECASE)
-    if m_nome:
-        nome_completo = m_nome.group(1).strip()
-        nome = re.sub(r'\s*(\(CBO:|\(A\)|[A-Z\s]*\d{4})\s*$', '', nome_completo).strip()
-        nome = re.sub(r'\s*\n\s*', ' ', nome).strip()
-
-    return codigo, nome
+    return _extrator.codigo_nome_funcionario(text)
 
 def extrair_condominio_cnpj(text: str):
     """Extrai nome bruto do condomínio (linha antes de CNPJ/CC ou primeira linha) e CNPJ."""
-    condominio = "CondominioDesconhecido"
-    cnpj = "CNPJDesconhecido"
-
-    m_cnpj = re.search(r'CNPJ:\s*(\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2})', text)
-    if m_cnpj:
-        cnpj = m_cnpj.group(1).strip()
-
-    m_cond = re.search(r'^(.*?)\s*(?:CNPJ:|CC:)', text, re.MULTILINE | re.IGNORECASE)
-    if m_cond:
-        condominio_bruto = m_cond.group(1).strip()
-        condominio_bruto = re.sub(r'^Folha Mensal\s*', '', condominio_bruto, flags=re.IGNORECASE).strip()
-        condominio = condominio_bruto if condominio_bruto else "CondominioDesconhecido"
-    else:
-        first_line_match = re.match(r'^\s*([^\n\r]+)', text)
-        if first_line_match:
-            condominio_bruto = first_line_match.group(1).strip()
-            condominio_bruto = re.sub(r'\s*Folha Mensal$', '', condominio_bruto, flags=re.IGNORECASE).strip()
-            condominio = condominio_bruto if condominio_bruto else "CondominioDesconhecido"
+    return _extrator.condominio_cnpj(text)
 
-    return condominio, cnpj
+_RE_CLEAN_CNPJ_CC = re.compile(r'\s*(?:CNPJ:|CC:)\s*.*?(?:Folha Mensal|$)', re.IGNORECASE)
+_RE_CLEAN_FOLHA = re.compile(r'Folha Mensal$', re.IGNORECASE)
+_RE_CLEAN_EDIFICIO = re.compile(r'CONDOMINIO\s+EDIFICIO\s+', re.IGNORECASE)
+_RE_CLEAN_ESPACOS = re.compile(r'\s+')
 
+@lru_cache(maxsize=4096)
 def clean_condominio_name(name: str) -> str:
-    """Normaliza o nome do condomínio removendo ruídos e acentos."""
+    """Normaliza o nome do condomínio removendo ruídos e acentos (memoizado: o nome se repete por página)."""
     if not name:
         return "CONDOMINIO DESCONHECIDO"
-    name = re.sub(r'\s*(?:CNPJ:|CC:)\s*.*?(?:Folha Mensal|$)', '', name, flags=re.IGNORECASE).strip()
-    name = re.sub(r'Folha Mensal$', '', name, flags=re.IGNORECASE).strip()
-    name = re.sub(r'CONDOMINIO\s+EDIFICIO\s+', 'CONDOMINIO ', name, flags=re.IGNORECASE).strip()
-    name = re.sub(r'\s+', ' ', name).strip()
+    name = _RE_CLEAN_CNPJ_CC.sub('', name).strip()
+    name = _RE_CLEAN_FOLHA.sub('', name).strip()
+    name = _RE_CLEAN_EDIFICIO.sub('CONDOMINIO ', name).strip()
+    name = _RE_CLEAN_ESPACOS.sub(' ', name).strip()
     return unidecode(name).upper()
 
 # ----------------------
 # Função principal
 # ----------------------
-def process_pdf_file(pdf_bytes: bytes):
+MODOS_SEPARACAO = ("condominio", "funcionario")
+
+@contextmanager
+def _sem_span(_nome, **attrs):
+    yield attrs
+
+MANIFESTO_FILENAME = "manifesto.json"
+
+def _nome_arquivo_grupo(data: dict, modo: str) -> str:
+    condominio_nome = data['condominio']
+    competencia_grupo = data.get('competencia', "DataDesconhecida")
+
+    if modo == "funcionario":
+        sufixo = f"{data['codigo']} - {data['nome']}"
+        if competencia_grupo != "DataDesconhecida":
+            return f"{condominio_nome}/Recibo de Pagamento {competencia_grupo} - {sufixo}.pdf"
+        return f"{condominio_nome}/Recibo de Pagamento - {sufixo} - {datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+    if competencia_grupo != "DataDesconhecida":
+        return f"Recibo de Pagamento {competencia_grupo} - {condominio_nome}.pdf"
+    return f"Recibo de Pagamento - {condominio_nome} - {datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+def process_pdf_file(pdf_bytes: bytes, progress=None, modo: str = "condominio", manifesto: bool = False, span=None):
     """
     Processa o PDF, agrupa por condomínio e gera um ZIP.
     Retorna (zip_buffer: BytesIO, zip_filename: str).
+
+    `modo="funcionario"` separa um PDF por (condomínio, código do funcionário), em uma pasta por condomínio.
+    `manifesto=True` inclui no ZIP um manifesto.json com os campos extraídos de cada página.
+    `progress`, se informado, é chamado após cada página como
+    progress(paginas_processadas, total_paginas, nome_condominio_ou_None).
+    `span`, se informado, é uma fábrica de context managers span(nome, **attrs) usada para
+    medir as fases "pdf.parse" (leitura/extração) e "pdf.split" (montagem dos PDFs e do ZIP).
     """
+    if modo not in MODOS_SEPARACAO:
+        raise PdfProcessingError(f"Modo de separação inválido: {modo}. Use um de {', '.join(MODOS_SEPARACAO)}.")
+
+    # Campos do funcionário só são extraídos quando usados (separação ou manifesto)
+    extrair_funcionario = modo == "funcionario" or manifesto
+    span = span or _sem_span
+
     try:
         pdf_file_bytes = io.BytesIO(pdf_bytes)
 
-        with pdfplumber.open(pdf_file_bytes) as pdf:
+        with span("pdf.parse", bytes=len(pdf_bytes)) as parse_attrs, pdfplumber.open(pdf_file_bytes) as pdf:
             pdf_reader = PdfReader(pdf_file_bytes)
-            condominios_agrupados = {}  # { nome_condominio: {'writer': PdfWriter(), 'competencia': str} }
+            # { chave: {'writer': PdfWriter(), 'competencia': str, 'condominio': str, 'codigo': str, 'nome': str} }
+            grupos = {}
+            paginas_manifesto = []
             competencia_geral = "DataDesconhecida"
+            total_paginas = len(pdf.pages)
 
             for i, page in enumerate(pdf.pages):
                 page_text = page.extract_text()
                 if not page_text:
+                    if manifesto:
+                        paginas_manifesto.append({"pagina": i + 1, "sem_texto": True, "arquivo": None})
+                    if progress:
+                        progress(i + 1, total_paginas, None)
                     continue
 
-                competencia_str = extrair_competencia(page_text)
-                condominio_bruto, _ = extrair_condominio_cnpj(page_text)
-                nome_condominio_limpo = clean_condominio_name(condominio_bruto)
+                campos = _extrator.extrair(page_text, funcionario=extrair_funcionario)
+                competencia_str = campos["competencia"]
+                nome_condominio_limpo = campos["condominio"]
 
                 if competencia_geral == "DataDesconhecida" and competencia_str != "DataDesconhecida":
                     competencia_geral = competencia_str
 
-                if nome_condominio_limpo not in condominios_agrupados:
-                    condominios_agrupados[nome_condominio_limpo] = {
+                chave = (nome_condominio_limpo, campos["codigo"]) if modo == "funcionario" else nome_condominio_limpo
+                if chave not in grupos:
+                    grupos[chave] = {
                         'writer': PdfWriter(),
-                        'competencia': competencia_str
+                        'competencia': competencia_str,
+                        'condominio': nome_condominio_limpo,
+                        'codigo': campos.get("codigo"),
+                        'nome': campos.get("nome"),
                     }
 
-                condominios_agrupados[nome_condominio_limpo]['writer'].add_page(pdf_reader.pages[i])
+                grupos[chave]['writer'].add_page(pdf_reader.pages[i])
+                if manifesto:
+                    paginas_manifesto.append({
+                        "pagina": i + 1,
+                        "competencia": competencia_str,
+                        "condominio": nome_condominio_limpo,
+                        "cnpj": campos["cnpj"],
+                        "codigo": campos["codigo"],
+                        "nome": campos["nome"],
+                        "_chave": chave,
+                    })
+                if progress:
+                    progress(i + 1, total_paginas, nome_condominio_limpo)
+
+            parse_attrs["pages"] = total_paginas
+            parse_attrs["groups"] = len(grupos)
 
         # Monta ZIP em memória
         zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED, False) as zf:
+        arquivos = {}  # { chave: pdf_filename }
+        with span("pdf.split", groups=len(grupos), modo=modo), \
+                zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED, False) as zf:
             zip_buffer.seek(0)
 
-            for condominio_nome, data in condominios_agrupados.items():
+            for chave, data in grupos.items():
                 writer = data['writer']
-                competencia_grupo = data.get('competencia', "DataDesconhecida")
-
-                if competencia_grupo != "DataDesconhecida":
-                    pdf_filename = f"Recibo de Pagamento {competencia_grupo} - {condominio_nome}.pdf"
-                else:
-                    pdf_filename = f"Recibo de Pagamento - {condominio_nome} - {datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                pdf_filename = _nome_arquivo_grupo(data, modo)
+                arquivos[chave] = pdf_filename
 
                 grouped_pdf_buffer = io.BytesIO()
                 writer.write(grouped_pdf_buffer)
@@ -152,11 +285,24 @@ def process_pdf_file(pdf_bytes: bytes):
 
                 zf.writestr(pdf_filename, grouped_pdf_buffer.getvalue())
 
+            if manifesto:
+                for entrada in paginas_manifesto:
+                    chave = entrada.pop("_chave", None)
+                    if chave is not None:
+                        entrada["arquivo"] = arquivos[chave]
+                zf.writestr(MANIFESTO_FILENAME, json.dumps({
+                    "competencia": competencia_geral,
+                    "modo": modo,
+                    "total_paginas": total_paginas,
+                    "arquivos": list(arquivos.values()),
+                    "paginas": paginas_manifesto,
+                }, ensure_ascii=False, indent=2))
+
         if competencia_geral != "DataDesconhecida":
             zip_filename = f"Recibos de Pagamento {competencia_geral}.zip"
         else:
-            if condominios_agrupados:
-                primeiro_condominio = next(iter(condominios_agrupados))
+            if grupos:
+                primeiro_condominio = next(iter(grupos.values()))['condominio']
                 zip_filename = f"Recibos de Pagamento - {primeiro_condominio}.zip"
             else:
                 zip_filename = f"Recibos de Pagamento - {datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
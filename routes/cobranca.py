@@ -4,39 +4,81 @@
 from __future__ import annotations
 from fastapi import APIRouter, Depends, Header, Request, Response, status
 from typing import List, Optional
-import time, uuid
+import logging, os, time
 
 import engine as core
+import tenants
+from auth import get_current_user
 from schemas import Client, Charge, Log, Settings, RecurringCharge, SyncResult
+from utils import fast_json, metrics, tracing
 
 router = APIRouter(prefix="/api", tags=["cobranca"])
 
+# Métricas e spans de persistência e Z-API via ganchos do engine
+core.register_hook("save_data", lambda filepath, duration: metrics.ENGINE_SAVE_LATENCY.observe(duration, os.path.basename(filepath)))
+core.register_hook("zapi_call", lambda status, duration: metrics.ZAPI_LATENCY.observe(duration, status or "desconhecido"))
+core.register_hook("save_data", lambda filepath, duration: tracing.record_span("engine.save_data", duration, file=os.path.basename(filepath)))
+core.register_hook("zapi_call", lambda status, duration: tracing.record_span("engine.zapi_call", duration, status=status))
+
 # --------- Observabilidade mínima (trace_id + duração) ----------
 
+logger = logging.getLogger("konty")
+
+core.register_hook("flush_error", lambda filepath, error: logger.error("cobranca flush falhou file=%s: %r", os.path.basename(filepath), error))
+
 def with_trace(request: Request):
-    trace_id = request.headers.get("X-Trace-Id") or str(uuid.uuid4())
+    # Mesmo trace id do middleware (contextvar); o header só é usado fora do app principal
+    trace_id = tracing.current_trace_id() or request.headers.get("X-Trace-Id") or tracing.new_trace_id()
     start = time.perf_counter()
     try:
         yield trace_id
     finally:
         duration_ms = int((time.perf_counter() - start) * 1000)
-        # log simples em memória (poderia ir para Supabase futuramente)
-        print({"event": "request_done", "path": request.url.path, "trace_id": trace_id, "duration_ms": duration_ms})
+        # log estruturado, enfileirado (não bloqueia a requisição)
+        logger.info(
+            "request_done path=%s duration_ms=%s", request.url.path, duration_ms,
+            extra={"event": "request_done", "path": request.url.path, "trace_id": trace_id, "duration_ms": duration_ms},
+        )
+
+# --------- Partição por tenant ----------
+# Com COBRANCA_MULTI_TENANT=1 as rotas exigem usuário autenticado e usam a instância do engine
+# do tenant dele (tenants.py); caso contrário, o engine global de sempre. O parâmetro `core` das
+# rotas é essa instância.
+
+if tenants.ENABLED:
+    async def tenant_core(user: dict = Depends(get_current_user)):
+        with tenants.use(tenants.tenant_key(user)) as engine:
+            yield engine
+else:
+    async def tenant_core():
+        return core
+
+# --------- GET condicional (ETag = versão da coleção) ----------
+
+def _not_modified(core, request: Request, response: Response, *names: str) -> Optional[Response]:
+    """Define o ETag (versões das coleções) e devolve 304 se o cliente já tem essa versão."""
+    etag = '"' + ",".join(f"{name}-{core.collection_version(name)}" for name in names) + '"'
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    candidates = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+    return None
 
 # -------------------- Clientes --------------------
 
 @router.get("/clients", response_model=List[Client])
-def get_clients(response: Response, trace_id: str = Depends(with_trace)):
+def get_clients(request: Request, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    return core.list_clients()
+    return _not_modified(core, request, response, "clients") or fast_json.list_response(core.list_clients(), Client, response)
 
 @router.post("/clients", response_model=Client, status_code=status.HTTP_201_CREATED)
-def post_client(payload: Client, response: Response, trace_id: str = Depends(with_trace)):
+def post_client(payload: Client, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.add_client(payload.model_dump())
 
 @router.put("/clients/{client_id}", response_model=Client)
-def put_client(client_id: str, payload: Client, response: Response, trace_id: str = Depends(with_trace)):
+def put_client(client_id: str, payload: Client, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     out = core.update_client(client_id, payload.model_dump(exclude_unset=True))
     if not out:
@@ -45,13 +87,13 @@ def put_client(client_id: str, payload: Client, response: Response, trace_id: st
     return out
 
 @router.delete("/clients/{client_id}")
-def delete_client(client_id: str, response: Response, trace_id: str = Depends(with_trace)):
+def delete_client(client_id: str, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     ok = core.delete_client(client_id)
     return {"deleted": ok}
 
 @router.delete("/clients")
-def clear_clients(response: Response, trace_id: str = Depends(with_trace)):
+def clear_clients(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     core.clear_clients()
     return {"message": "All clients cleared successfully"}
@@ -59,17 +101,17 @@ def clear_clients(response: Response, trace_id: str = Depends(with_trace)):
 # -------------------- Cobranças --------------------
 
 @router.get("/charges", response_model=List[Charge])
-def get_charges(response: Response, trace_id: str = Depends(with_trace)):
+def get_charges(request: Request, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    return core.list_charges()
+    return _not_modified(core, request, response, "charges") or fast_json.list_response(core.list_charges(), Charge, response)
 
 @router.post("/charges", response_model=Charge, status_code=status.HTTP_201_CREATED)
-def post_charge(payload: Charge, response: Response, trace_id: str = Depends(with_trace)):
+def post_charge(payload: Charge, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.add_charge(payload.model_dump())
 
 @router.put("/charges/{charge_id}", response_model=Charge)
-def put_charge(charge_id: str, payload: Charge, response: Response, trace_id: str = Depends(with_trace)):
+def put_charge(charge_id: str, payload: Charge, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     out = core.update_charge(charge_id, payload.model_dump(exclude_unset=True))
     if not out:
@@ -78,13 +120,13 @@ def put_charge(charge_id: str, payload: Charge, response: Response, trace_id: st
     return out
 
 @router.delete("/charges/{charge_id}")
-def delete_charge(charge_id: str, response: Response, trace_id: str = Depends(with_trace)):
+def delete_charge(charge_id: str, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     ok = core.delete_charge(charge_id)
     return {"deleted": ok}
 
 @router.delete("/charges")
-def clear_charges(response: Response, trace_id: str = Depends(with_trace)):
+def clear_charges(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     core.clear_charges()
     return {"message": "All monthly charges cleared successfully"}
@@ -92,47 +134,55 @@ def clear_charges(response: Response, trace_id: str = Depends(with_trace)):
 # -------------------- Logs --------------------
 
 @router.get("/logs", response_model=List[Log])
-def get_logs(response: Response, trace_id: str = Depends(with_trace)):
+def get_logs(request: Request, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    return core.list_logs()
+    return _not_modified(core, request, response, "logs") or fast_json.list_response(core.list_logs(), Log, response)
 
 @router.post("/logs", response_model=Log, status_code=status.HTTP_201_CREATED)
-def post_log(payload: Log, response: Response, trace_id: str = Depends(with_trace)):
+def post_log(payload: Log, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.add_log(payload.model_dump())
 
 @router.delete("/logs")
-def clear_logs(response: Response, trace_id: str = Depends(with_trace)):
+def clear_logs(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     core.clear_logs()
     return {"message": "All logs cleared successfully"}
 
+# -------------------- Painel (agregados) --------------------
+
+@router.get("/aggregates")
+def get_aggregates(request: Request, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
+    response.headers["X-Trace-Id"] = trace_id
+    return _not_modified(core, request, response, "charges", "logs") or core.aggregates()
+
 # -------------------- Settings --------------------
 
 @router.get("/settings", response_model=Settings)
-def get_settings(response: Response, trace_id: str = Depends(with_trace)):
+def get_settings(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.get_settings()
 
 @router.put("/settings", response_model=Settings)
-def put_settings(payload: Settings, response: Response, trace_id: str = Depends(with_trace)):
+def put_settings(payload: Settings, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.update_settings(payload.model_dump(exclude_unset=True))
 
 # -------------------- Recorrentes --------------------
 
 @router.get("/recurring_charges", response_model=List[RecurringCharge])
-def get_recurrents(response: Response, trace_id: str = Depends(with_trace)):
+def get_recurrents(request: Request, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    return core.list_recurrents()
+    rows = core.list_recurrents()  # pode avançar nextSendDate (e a versão) antes do ETag
+    return _not_modified(core, request, response, "recurring_charges") or fast_json.list_response(rows, RecurringCharge, response)
 
 @router.post("/recurring_charges", response_model=RecurringCharge, status_code=status.HTTP_201_CREATED)
-def post_recurrent(payload: RecurringCharge, response: Response, trace_id: str = Depends(with_trace)):
+def post_recurrent(payload: RecurringCharge, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     return core.add_recurrent(payload.model_dump())
 
 @router.put("/recurring_charges/{rc_id}", response_model=RecurringCharge)
-def put_recurrent(rc_id: str, payload: RecurringCharge, response: Response, trace_id: str = Depends(with_trace)):
+def put_recurrent(rc_id: str, payload: RecurringCharge, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     out = core.update_recurrent(rc_id, payload.model_dump(exclude_unset=True))
     if not out:
@@ -141,33 +191,46 @@ def put_recurrent(rc_id: str, payload: RecurringCharge, response: Response, trac
     return out
 
 @router.delete("/recurring_charges/{rc_id}")
-def delete_recurrent(rc_id: str, response: Response, trace_id: str = Depends(with_trace)):
+def delete_recurrent(rc_id: str, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     ok = core.delete_recurrent(rc_id)
     return {"deleted": ok}
 
 @router.delete("/recurring_charges")
-def clear_recurrents(response: Response, trace_id: str = Depends(with_trace)):
+def clear_recurrents(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     core.clear_recurrents()
     return {"message": "All recurring charges cleared successfully"}
 
 @router.post("/process_recurring_charges")
-def process_recurrents(response: Response, trace_id: str = Depends(with_trace)):
+def process_recurrents(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    count = core.process_recurrents()
+    with tracing.span("engine.process_recurrents") as attrs:
+        count = core.process_recurrents()
+        attrs["processed"] = count
     return {"message": f"Processamento concluído. {count} cobranças recorrentes processadas."}
 
 # -------------------- Sincronização e Envio --------------------
 
 @router.post("/sync_charges_with_clients", response_model=SyncResult)
-def sync_with_clients(response: Response, trace_id: str = Depends(with_trace)):
+def sync_with_clients(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
-    updated = core.sync_charges_with_clients()
+    with tracing.span("engine.sync_charges_with_clients") as attrs:
+        updated = core.sync_charges_with_clients()
+        attrs["updated"] = updated
     return {"message": f"Sincronização concluída. {updated} cobranças atualizadas."}
 
+@router.post("/renormalize_clients", response_model=SyncResult)
+def renormalize_clients(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
+    """Recalcula telefone normalizado e validade do contato dos clientes já cadastrados."""
+    response.headers["X-Trace-Id"] = trace_id
+    with tracing.span("engine.renormalize_clients") as attrs:
+        updated = core.renormalize_clients()
+        attrs["updated"] = updated
+    return {"message": f"Normalização concluída. {updated} clientes atualizados."}
+
 @router.post("/send_whatsapp")
-def send_whatsapp(payload: dict, response: Response, trace_id: str = Depends(with_trace)):
+def send_whatsapp(payload: dict, response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     phone = payload.get("phoneNumber")
     message = payload.get("messageContent", "")
@@ -177,7 +240,33 @@ def send_whatsapp(payload: dict, response: Response, trace_id: str = Depends(wit
     return core.send_whatsapp_message(phone, message)
 
 @router.post("/clear_all_data")
-def clear_all(response: Response, trace_id: str = Depends(with_trace)):
+def clear_all(response: Response, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
     response.headers["X-Trace-Id"] = trace_id
     core.clear_all_data()
     return {"message": "All data cleared and settings reset successfully"}
+
+# -------------------- Feed de alterações --------------------
+
+_CHANGE_MODELS = {"clients": Client, "charges": Charge, "recurring_charges": RecurringCharge, "logs": Log}
+
+@router.get("/changes")
+def get_changes(response: Response, since: Optional[str] = None, collections: Optional[str] = None, trace_id: str = Depends(with_trace), core=Depends(tenant_core)):
+    """
+    Registros alterados/excluídos desde `since` (o "version" da resposta anterior; vazio na
+    primeira chamada). Aplicar "deleted" e depois "updated"; com "reset" a coleção deve ser
+    recarregada pelo GET da lista.
+    """
+    response.headers["X-Trace-Id"] = trace_id
+    names = [n.strip() for n in collections.split(",") if n.strip()] if collections else list(_CHANGE_MODELS)
+    unknown = [n for n in names if n not in _CHANGE_MODELS]
+    if unknown:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"error": f"Coleções desconhecidas: {', '.join(unknown)}"}
+    if "recurring_charges" in names:
+        core.list_recurrents()  # mesmo recálculo de nextSendDate do GET da lista
+    out = core.changes_since(since, names)
+    for name, change in out["changes"].items():
+        change["updated"] = fast_json.project(change["updated"], _CHANGE_MODELS[name])
+    if fast_json.ENABLED:
+        return fast_json.FastJSONResponse(out, headers=dict(response.headers))
+    return out
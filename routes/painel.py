@@ -1,26 +1,29 @@
 from fastapi import APIRouter, Depends
 # CORREÇÃO: Usando import absoluto para a dependência de autenticação
 from auth import get_current_user 
+from utils.permissions import get_user_permissions
 
 router = APIRouter()
 
 @router.get("/")
-async def read_painel(current_user: dict = Depends(get_current_user)):
+async def read_painel(
+    current_user: dict = Depends(get_current_user),
+    acessos: list = Depends(get_user_permissions),
+):
     """
     Rota protegida para o painel do usuário.
     Esta rota requer um usuário autenticado para ser acessada.
-    Retorna informações básicas do usuário logado e uma lista de acessos disponíveis (mock).
+    Retorna informações básicas do usuário logado e a lista de sistemas que ele pode acessar.
     """
     # 'current_user' contém os dados do usuário decodificados do token JWT,
     # fornecidos pela função get_current_user.
     
-    # Exemplo de dados de acessos disponíveis (mock inicialmente).
-    # No futuro, esta lista virá do seu banco de dados, baseada nas permissões do usuário.
-    mock_acessos = ["cobranca", "relatorios", "financeiro", "auditoria"] 
+    # 'acessos' vem do subsistema de permissões (utils/permissions.py), resolvido
+    # a partir do store configurado e mantido em cache em memória.
 
     return {
         "message": f"Bem-vindo ao painel, {current_user['email']}!",
         "user_id": current_user['id'],
         "user_email": current_user['email'],
-        "acessos_disponiveis": mock_acessos # Retorna a lista de sistemas que o usuário pode acessar
+        "acessos_disponiveis": acessos # Retorna a lista de sistemas que o usuário pode acessar
     }
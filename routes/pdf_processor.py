@@ -1,50 +1,178 @@
 # routes/pdf_processor.py
-import os
-import importlib.util
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+import time
+import asyncio
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from auth import get_current_user
+from utils.module_registry import get_engine, engine_version
+from utils import result_cache, pdf_jobs, metrics, tracing
 
 router = APIRouter()
 
+ENGINE_NAME = "extrair-pdf"
+
 def _load_engine_module():
-    """Carrega modules/extrair-pdf/core/engine.py mesmo com hífen na pasta."""
-    here = os.path.dirname(os.path.abspath(__file__))
-    engine_path = os.path.abspath(os.path.join(here, "..", "modules", "extrair-pdf", "core", "engine.py"))
-    if not os.path.exists(engine_path):
-        raise ImportError(f"engine.py não encontrado no caminho esperado: {engine_path}")
-    spec = importlib.util.spec_from_file_location("extrair_pdf_engine", engine_path)
-    if spec is None or spec.loader is None:
-        raise ImportError("Não foi possível criar spec para o engine.py")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
+    """Retorna o engine de modules/extrair-pdf (carregado uma única vez pelo registro)."""
+    return get_engine(ENGINE_NAME)
+
+def _zip_headers(zip_filename: str, etag: str, cache_status: str) -> dict:
+    return {
+        "Content-Disposition": f'attachment; filename="{zip_filename}"',
+        "ETag": etag,
+        "X-Cache": cache_status,
+    }
+
+def _cache_key(digest: str, modo: str, manifesto: bool) -> str:
+    """
+    Chave do cache: o hash do upload e a versão do código do engine (uma mudança na extração
+    invalida os ZIPs antigos), qualificados pelas opções fora do padrão.
+    """
+    key = f"{digest}-{engine_version(ENGINE_NAME)}"
+    if modo == "condominio" and not manifesto:
+        return key
+    return f"{key}-{modo}{'-manifesto' if manifesto else ''}"
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    return inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]
 
 @router.post("/processar-pdf", tags=["Módulos"])
-async def processar_pdf_adapter(pdf_file: UploadFile = File(...)):
+async def processar_pdf_adapter(
+    request: Request,
+    pdf_file: UploadFile = File(...),
+    modo: str = Query("condominio", pattern="^(condominio|funcionario)$", description="condominio | funcionario"),
+    manifesto: bool = Query(False, description="Inclui manifesto.json com os campos de cada página"),
+):
     """Adaptador de API: recebe upload, chama o core e retorna o ZIP com nome inteligente."""
     if pdf_file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Formato de ficheiro inválido. Apenas PDFs são aceites.")
 
+    # Hash calculado durante a leitura do upload: o mesmo PDF gera o mesmo resultado
+    pdf_bytes, digest = await result_cache.read_upload_with_hash(pdf_file)
+    key = _cache_key(digest, modo, manifesto)
+    etag = f'"{key}"'
+
+    # I/O de disco do cache fora do event loop. O arquivo é entregue já aberto: um evict()
+    # concorrente pode removê-lo do disco sem interromper a resposta.
+    cached = await asyncio.to_thread(result_cache.open_entry, key)
+    if cached:
+        zip_file, zip_filename, size = cached
+        if _etag_matches(request, etag):
+            zip_file.close()
+            return Response(status_code=304, headers={"ETag": etag, "X-Cache": "HIT"})
+        headers = _zip_headers(zip_filename, etag, "HIT")
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(result_cache.iter_file(zip_file), media_type="application/zip", headers=headers)
+
     try:
         engine = _load_engine_module()
-        pdf_bytes = await pdf_file.read()
-        result = engine.process_pdf_file(pdf_bytes)  # pode retornar (zip_buffer, zip_filename) ou apenas buffer
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno: {str(e)}")
+
+    paginas = {"total": 0}
+
+    def progress(done: int, total: int, _condominio):
+        paginas["total"] = done
+
+    try:
+        start = time.perf_counter()
+        result = engine.process_pdf_file(pdf_bytes, progress=progress, modo=modo, manifesto=manifesto, span=tracing.span)  # pode retornar (zip_buffer, zip_filename) ou apenas buffer
+        metrics.observe_pdf(paginas["total"], time.perf_counter() - start)
         if isinstance(result, tuple) and len(result) == 2:
             zip_buffer, zip_filename = result
         else:
             zip_buffer, zip_filename = result, "recibos_processados.zip"
 
+        try:
+            await asyncio.to_thread(result_cache.put, key, zip_buffer.getvalue(), zip_filename)
+        except OSError:
+            pass  # cache é best-effort; o resultado continua sendo entregue
+
         return StreamingResponse(
             zip_buffer,
             media_type="application/zip",
-            headers={"Content-Disposition": f'attachment; filename="{zip_filename}"'}
+            headers=_zip_headers(zip_filename, etag, "MISS"),
         )
     except Exception as e:
-        try:
-            engine = _load_engine_module()
-            PdfProcessingError = getattr(engine, "PdfProcessingError", None)
-            if PdfProcessingError and isinstance(e, PdfProcessingError):
-                raise HTTPException(status_code=409, detail=f"Erro na regra de negócio: {str(e)}")
-        except Exception:
-            pass
-        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno: {str(e)}")
\ No newline at end of file
+        PdfProcessingError = getattr(engine, "PdfProcessingError", None)
+        if PdfProcessingError and isinstance(e, PdfProcessingError):
+            raise HTTPException(status_code=409, detail=f"Erro na regra de negócio: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno: {str(e)}")
+
+# -------------------- Jobs assíncronos --------------------
+# Cada job pertence ao usuário autenticado que o criou; status e download de jobs de outro
+# usuário respondem 404, como um job inexistente.
+
+@router.post("/processar-pdf/jobs", status_code=202, tags=["Módulos"])
+async def criar_job_pdf(
+    pdf_file: UploadFile = File(...),
+    modo: str = Query("condominio", pattern="^(condominio|funcionario)$", description="condominio | funcionario"),
+    manifesto: bool = Query(False, description="Inclui manifesto.json com os campos de cada página"),
+    current_user: dict = Depends(get_current_user),
+):
+    """Recebe o upload e enfileira o processamento. Retorna o id do job para acompanhamento."""
+    if pdf_file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Formato de ficheiro inválido. Apenas PDFs são aceites.")
+
+    pdf_bytes, digest = await result_cache.read_upload_with_hash(pdf_file)
+    key = _cache_key(digest, modo, manifesto)
+    owner = current_user["id"]
+
+    cached = await asyncio.to_thread(result_cache.open_entry, key)
+    if cached:
+        zip_file, zip_filename, _size = cached
+        with zip_file:
+            job = await asyncio.to_thread(pdf_jobs.submit_completed, zip_file, zip_filename, owner)
+        return pdf_jobs.public_view(job)
+
+    def on_done(data: bytes, zip_filename: str):
+        result_cache.put(key, data, zip_filename)
+
+    try:
+        job = await asyncio.to_thread(
+            pdf_jobs.submit, ENGINE_NAME, pdf_bytes, owner,
+            on_done=on_done, options={"modo": modo, "manifesto": manifesto},
+        )
+    except pdf_jobs.QueueFull as exc:
+        if exc.per_user:
+            # Limite de jobs pendentes do usuário: mesmo tratamento do controle de admissão
+            metrics.RATE_LIMITED.inc(1, "pdf", "queue")
+            raise HTTPException(
+                status_code=429,
+                detail="Você já tem processamentos de PDF na fila. Aguarde a conclusão antes de enviar outro.",
+                headers={"Retry-After": "10"},
+            )
+        raise HTTPException(
+            status_code=503,
+            detail="Fila de processamento de PDF cheia. Tente novamente em instantes.",
+            headers={"Retry-After": "10"},
+        )
+    return pdf_jobs.public_view(job)
+
+@router.get("/processar-pdf/jobs/{job_id}", tags=["Módulos"])
+async def status_job_pdf(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Progresso do job: páginas processadas/total e condomínios encontrados até o momento."""
+    job = await asyncio.to_thread(pdf_jobs.get_job, job_id, current_user["id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado.")
+    return pdf_jobs.public_view(job)
+
+@router.get("/processar-pdf/jobs/{job_id}/download", tags=["Módulos"])
+async def download_job_pdf(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Entrega o ZIP de um job concluído, lido diretamente do disco."""
+    job = await asyncio.to_thread(pdf_jobs.get_job, job_id, current_user["id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado.")
+    if job["status"] == "error":
+        code = 409 if job["error_type"] == "business" else 500
+        raise HTTPException(status_code=code, detail=job["error"])
+    path = pdf_jobs.result_path(job)
+    if not path:
+        raise HTTPException(status_code=409, detail="Job ainda não concluído.")
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{job["filename"]}"'},
+    )
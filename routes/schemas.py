@@ -12,6 +12,9 @@ class Client(BaseModel):
     phone: Optional[str] = ""
     email: Optional[str] = ""
     # Campos adicionais livres
+    updatedAt: Optional[str] = None   # preenchido pelo engine a cada alteração
+    phoneE164: Optional[str] = None   # telefone normalizado (+dígitos), calculado pelo engine
+    contactValid: Optional[bool] = None  # telefone e e-mail válidos, calculado pelo engine
 
 class Charge(BaseModel):
     id: Optional[str] = None
@@ -25,6 +28,7 @@ class Charge(BaseModel):
     whatsappStatus: Optional[str] = None
     importError: Optional[str] = None
     clientFound: Optional[bool] = True
+    updatedAt: Optional[str] = None   # preenchido pelo engine a cada alteração
 
 class Log(BaseModel):
     id: Optional[str] = None
@@ -34,6 +38,7 @@ class Log(BaseModel):
     status: Optional[str] = None
     message: Optional[str] = None
     origin: Optional[str] = "Manual"
+    updatedAt: Optional[str] = None   # preenchido pelo engine a cada alteração
 
 class Settings(BaseModel):
     zapiInstanceId: str = ""
@@ -62,6 +67,7 @@ class RecurringCharge(BaseModel):
     nextSendDate: Optional[str] = None
     lastAttemptStatus: Optional[str] = None
     lastAttemptMessage: Optional[str] = None
+    updatedAt: Optional[str] = None   # preenchido pelo engine a cada alteração
 
 class SyncResult(BaseModel):
     message: str
@@ -1,35 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 # CORREÇÃO: Usando imports absolutos
-from auth import get_current_user 
-from utils.run_script import run_script 
+from utils.run_script import ScriptNotFound, run_script, sse_event, stream_script
+from utils.permissions import require_system
 
 router = APIRouter()
 
+require_cobranca = require_system("cobranca", "Você não tem permissão para executar o sistema de cobrança.")
+
 @router.post("/cobranca")
-async def execute_cobranca(current_user: dict = Depends(get_current_user)):
+async def execute_cobranca(current_user: dict = Depends(require_cobranca)):
     """
     Rota protegida para executar o sistema de cobrança.
-    Esta rota requer um usuário autenticado e verifica permissão (mock inicialmente).
+    Esta rota requer um usuário autenticado com acesso ao sistema 'cobranca'.
+    Aguarda o término do script; se ele já estiver rodando, acompanha a mesma execução.
     """
-    # A lista de acessos disponíveis viria do banco de dados para o usuário atual.
-    # Por enquanto, usamos uma lista mock para simular a verificação de permissão.
-    user_acessos_mock = ["cobranca", "relatorios", "financeiro"] # Acessos mockados para este exemplo
-    
-    # Verifica se o usuário tem permissão para executar o sistema 'cobranca'
-    if "cobranca" not in user_acessos_mock:
-         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, # Retorna 403 Forbidden se não tiver permissão
-            detail="Você não tem permissão para executar o sistema de cobrança."
-        )
+    # A verificação de permissão (403 se não tiver acesso) é feita pela dependência
+    # require_system, a partir do cache de permissões do usuário.
 
     try:
-        # Chama a função 'run_script' para simular a execução do script de cobrança.
-        # No futuro, 'run_script' executará o script Python real.
-        result = await run_script("cobranca")
-        return result
+        return await run_script("cobranca")
+    except ScriptNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Script do sistema de cobrança não encontrado.",
+        )
     except Exception as e:
         # Captura qualquer erro durante a execução do script e retorna um erro 500
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao executar o sistema de cobrança: {e}"
         )
+
+@router.post("/cobranca/stream")
+async def stream_cobranca(current_user: dict = Depends(require_cobranca)):
+    """
+    Executa (ou acompanha) o sistema de cobrança transmitindo a saída via Server-Sent Events:
+    eventos `run`, `stdout`, `stderr` e, ao final, `exit` com o resultado em JSON.
+    """
+    events = stream_script("cobranca")
+    try:
+        first = await events.__anext__()  # valida o script antes de abrir o stream
+    except ScriptNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Script do sistema de cobrança não encontrado.",
+        )
+
+    async def body():
+        try:
+            yield sse_event(*first)
+            async for event, data in events:
+                yield sse_event(event, data)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
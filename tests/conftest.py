@@ -0,0 +1,49 @@
+# tests/conftest.py
+# Mesmo sys.path do app (uvicorn roda a partir da raiz com routes/ e o core de cobrança no path).
+
+import os
+import sys
+import atexit
+import tempfile
+import importlib.util
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+for path in (os.path.join(ROOT, "routes"), os.path.join(ROOT, "modules", "cobranca", "core"), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# auth.py lê estas variáveis na importação
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test")
+# Dados do engine global e dos jobs de PDF fora do repositório
+os.environ.setdefault("COBRANCA_DATA_DIR", tempfile.mkdtemp(prefix="konty-test-"))
+os.environ.setdefault("PDF_JOBS_DIR", tempfile.mkdtemp(prefix="konty-test-jobs-"))
+
+ENGINE_FILE = os.path.join(ROOT, "modules", "cobranca", "core", "engine.py")
+
+def load_engine(data_dir: str, name: str = "cobranca_engine_test"):
+    """Instância nova do engine de cobrança em `data_dir` (como as partições de tenants.py)."""
+    spec = importlib.util.spec_from_file_location(name, ENGINE_FILE)
+    mod = importlib.util.module_from_spec(spec)
+    mod.DATA_DIR = data_dir
+    spec.loader.exec_module(mod)
+    return mod
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Cria instâncias do engine (padrão: em tmp_path) e as encerra ao fim do teste."""
+    created = []
+
+    def make(durability=None, data_dir=None):
+        mod = load_engine(str(data_dir or tmp_path), f"cobranca_engine_test_{len(created)}")
+        if durability is not None:
+            mod.DURABILITY = durability
+        created.append(mod)
+        return mod
+
+    yield make
+    for mod in created:
+        mod.shutdown()
+        atexit.unregister(mod.shutdown)
@@ -0,0 +1,220 @@
+# tests/test_auth_jwks.py
+# JWKS e cache de tokens do auth.py contra um servidor JWKS local (stub).
+
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+import auth
+
+def _keypair(kid: str):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_pem, public_jwk
+
+KEY_A = _keypair("kid-a")
+KEY_B = _keypair("kid-b")
+
+def _token(key, kid: str, sub: str = "user-1", ttl_s: int = 3600) -> str:
+    now = int(time.time())
+    claims = {"sub": sub, "email": f"{sub}@example.com", "aud": "authenticated",
+              "iss": f"{auth.SUPABASE_URL}/auth/v1", "iat": now, "exp": now + ttl_s}
+    return jwt.encode(claims, key[0], algorithm="RS256", headers={"kid": kid})
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.hits += 1
+        time.sleep(stub.delay)
+        body = json.dumps({"keys": stub.keys}).encode()
+        self.send_response(stub.status)
+        self.send_header("Content-Type", "application/json")
+        if stub.cache_control:
+            self.send_header("Cache-Control", stub.cache_control)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class JwksStub:
+    def __init__(self):
+        self.keys = [KEY_A[1]]
+        self.status = 200
+        self.delay = 0.0
+        self.cache_control = "public, max-age=600"
+        self.hits = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}/auth/v1/.well-known/jwks.json"
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = JwksStub()
+    monkeypatch.setattr(auth, "JWKS_URL", server.url)
+    auth._jwks_cache.clear()
+    auth._jwks_cache["keys"] = []
+    auth._jwks_state.update(expires_at=0.0, fetched_at=0.0)
+    auth._parsed_keys.clear()
+    auth.clear_token_cache()
+    auth._refresh_future = None
+    auth._http_client = None  # um cliente por teste: cada asyncio.run tem seu próprio loop
+    yield server
+    server.stop()
+
+def _run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await auth.close_http_client()
+    return asyncio.run(main())
+
+def test_refresh_concorrente_faz_uma_unica_busca(stub):
+    stub.delay = 0.2
+
+    async def many():
+        return await asyncio.gather(*(auth.refresh_jwks() for _ in range(20)))
+
+    results = _run(many())
+    assert stub.hits == 1
+    assert all(r == {"keys": [KEY_A[1]]} for r in results)
+    assert auth._refresh_future is None
+
+def test_ttl_pelo_cache_control():
+    assert auth._ttl_from_headers({"cache-control": "public, max-age=120"}) == 120.0
+    assert auth._ttl_from_headers({"cache-control": "no-store"}) == 0.0
+    assert auth._ttl_from_headers({"cache-control": "no-cache, max-age=60"}) == 0.0
+    assert auth._ttl_from_headers({}) == float(auth.JWKS_TTL_SECONDS)
+
+def test_refresh_usa_o_max_age_da_resposta(stub):
+    stub.cache_control = "max-age=42"
+    _run(auth.refresh_jwks())
+    state = auth._jwks_state
+    assert state["expires_at"] - state["fetched_at"] == pytest.approx(42.0)
+
+def test_kid_desconhecido_respeita_o_intervalo_minimo(stub, monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_INTERVAL_SECONDS", 3600.0)
+    forged = _token(KEY_B, "kid-b")
+
+    async def attempts():
+        await auth.refresh_jwks()
+        for _ in range(5):
+            with pytest.raises(HTTPException) as exc:
+                await auth.get_current_user(forged)
+            assert exc.value.status_code == 401
+
+    _run(attempts())
+    assert stub.hits == 1  # KIDs desconhecidos não disparam novas buscas dentro do intervalo
+
+def test_kid_novo_busca_o_jwks_depois_do_intervalo(stub, monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_INTERVAL_SECONDS", 0.0)
+    rotated = _token(KEY_B, "kid-b", sub="user-2")
+
+    async def flow():
+        await auth.refresh_jwks()
+        stub.keys = [KEY_A[1], KEY_B[1]]  # rotação de chaves no Supabase
+        return await auth.get_current_user(rotated)
+
+    user = _run(flow())
+    assert user["id"] == "user-2"
+    assert stub.hits == 2
+
+def test_jwks_expirado_com_falha_na_busca_usa_as_chaves_em_cache(stub, monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_INTERVAL_SECONDS", 30.0)
+    token = _token(KEY_A, "kid-a")
+
+    async def flow():
+        await auth.refresh_jwks()
+        auth._jwks_state["expires_at"] = 0.0  # TTL vencido
+        stub.status = 503
+        before = time.time()
+        user = await auth.get_current_user(token)
+        return user, before
+
+    user, before = _run(flow())
+    assert user["id"] == "user-1"
+    assert stub.hits == 2
+    # Nova tentativa só depois do intervalo mínimo, sem martelar o Supabase a cada requisição
+    assert auth._jwks_state["expires_at"] >= before + 30.0
+
+def test_sem_chaves_em_cache_a_falha_na_busca_vira_erro(stub):
+    stub.status = 503
+    with pytest.raises(HTTPException) as exc:
+        _run(auth.get_current_user(_token(KEY_A, "kid-a")))
+    assert exc.value.status_code == 500
+
+def test_cache_de_token_expira_no_exp(stub, monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_CACHE_TTL_SECONDS", 3600)
+    token = _token(KEY_A, "kid-a", ttl_s=5)
+    exp = jwt.get_unverified_claims(token)["exp"]
+
+    user = _run(auth.get_current_user(token))
+    assert user["id"] == "user-1"
+    token_hash = auth.hashlib.sha256(token.encode()).hexdigest()
+    _, expires_at, kid = auth._token_cache[token_hash]
+    assert kid == "kid-a"
+    assert expires_at == exp  # limitado pelo exp, não pelo TTL de 1h
+    assert auth.cached_user(token) == user
+
+    monkeypatch.setattr(auth.time, "time", lambda: exp + 1)
+    assert auth.cached_user(token) is None
+    assert token_hash not in auth._token_cache
+
+def test_token_em_cache_dispensa_nova_verificacao(stub):
+    token = _token(KEY_A, "kid-a")
+
+    async def twice():
+        first = await auth.get_current_user(token)
+        stub.status = 503
+        auth._jwks_cache["keys"] = []  # sem chaves: só o cache de token pode responder
+        return first, await auth.get_current_user(token)
+
+    first, second = _run(twice())
+    assert first == second
+    assert stub.hits == 1
+
+def test_rotacao_do_jwks_descarta_tokens_da_chave_removida(stub, monkeypatch):
+    monkeypatch.setattr(auth, "JWKS_MIN_REFRESH_INTERVAL_SECONDS", 30.0)
+    old = _token(KEY_A, "kid-a")
+    new = _token(KEY_B, "kid-b", sub="user-2")
+
+    async def flow():
+        assert (await auth.get_current_user(old))["id"] == "user-1"
+        stub.keys = [KEY_B[1]]  # kid-a revogada no Supabase
+        await auth.refresh_jwks()
+        assert auth.cached_user(old) is None  # nem o rate limit a trata mais como validada
+        assert (await auth.get_current_user(new))["id"] == "user-2"
+        with pytest.raises(HTTPException) as exc:
+            await auth.get_current_user(old)
+        return exc.value
+
+    assert _run(flow()).status_code == 401
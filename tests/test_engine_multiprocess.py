@@ -0,0 +1,61 @@
+# tests/test_engine_multiprocess.py
+# Dois processos (como dois workers do uvicorn) com engines no mesmo DATA_DIR: flock + recarga.
+
+import time
+import multiprocessing
+
+import conftest
+
+def _child_write(data_dir: str, names, durability: str, out) -> None:
+    eng = conftest.load_engine(data_dir)
+    eng.DURABILITY = durability
+    start = time.monotonic()
+    for name in names:
+        eng.add_client({"name": name})
+    eng.shutdown()
+    out.put((time.monotonic() - start, sorted(c["name"] for c in eng.list_clients())))
+
+def _run_child(data_dir: str, names, durability: str = "sync"):
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_child_write, args=(data_dir, list(names), durability, out))
+    proc.start()
+    return proc, out
+
+def test_escrita_de_outro_processo_e_vista(make_engine, tmp_path):
+    eng = make_engine("sync")
+    eng.add_client({"name": "pai"})
+    proc, out = _run_child(str(tmp_path), ["filho"])
+    _, child_view = out.get(timeout=60)
+    proc.join(timeout=30)
+    assert proc.exitcode == 0
+    assert child_view == ["filho", "pai"]  # o filho recarregou a escrita do pai antes de gravar
+    assert sorted(c["name"] for c in eng.list_clients()) == ["filho", "pai"]  # e o pai recarrega a dele
+
+def test_colecao_suja_nao_bloqueia_outro_processo(make_engine, tmp_path):
+    # O pai escreve sem parar em write-behind: a coleção fica suja e segura o flock até cada flush.
+    # O outro processo precisa conseguir o flock entre os flushes, sem esperar o pai parar.
+    eng = make_engine("deferred")
+    eng.FLUSH_INTERVAL_SECONDS = 0.05
+    eng.add_client({"name": "pai-0"})
+    proc, out = _run_child(str(tmp_path), [f"filho-{i}" for i in range(5)])
+    written = 1
+    deadline = time.monotonic() + 30
+    result = None
+    while time.monotonic() < deadline:
+        eng.add_client({"name": f"pai-{written}"})
+        written += 1
+        time.sleep(0.002)
+        if not out.empty():
+            result = out.get()
+            break
+    assert result is not None, "o outro processo não conseguiu gravar enquanto o pai escrevia"
+    elapsed, _ = result
+    proc.join(timeout=30)
+    assert proc.exitcode == 0
+    assert elapsed < 10
+    eng.flush()
+    names = [c["name"] for c in eng.list_clients()]
+    assert len(names) == written + 5
+    assert sorted(n for n in names if n.startswith("filho")) == [f"filho-{i}" for i in range(5)]
+    assert len(set(names)) == len(names)
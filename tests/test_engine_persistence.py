@@ -0,0 +1,93 @@
+# tests/test_engine_persistence.py
+# Durabilidade do engine de cobrança: write-behind, flush(), transaction() e flush no shutdown.
+
+import json
+import asyncio
+import threading
+
+import pytest
+
+def _on_disk(filepath):
+    with open(filepath, "rb") as f:
+        return json.load(f)
+
+def _count_saves(eng):
+    saves = {}
+    lock = threading.Lock()
+
+    def hook(filepath, duration):
+        with lock:
+            saves[filepath] = saves.get(filepath, 0) + 1
+
+    eng.register_hook("save_data", hook)
+    return saves
+
+def test_padrao_grava_antes_de_retornar(make_engine):
+    eng = make_engine()
+    assert eng.DURABILITY == "sync"
+    client = eng.add_client({"name": "Ana", "phone": "11999999999"})
+    assert [c["id"] for c in _on_disk(eng.CLIENTS_FILE)] == [client["id"]]
+    assert not eng.has_pending_writes()
+
+def test_deferred_grava_no_flush(make_engine):
+    eng = make_engine("deferred")
+    eng.FLUSH_INTERVAL_SECONDS = 3600  # só o flush() explícito grava
+    client = eng.add_client({"name": "Ana"})
+    assert eng.has_pending_writes()
+    assert _on_disk(eng.CLIENTS_FILE) == []
+    eng.flush()
+    assert [c["id"] for c in _on_disk(eng.CLIENTS_FILE)] == [client["id"]]
+    assert not eng.has_pending_writes()
+
+@pytest.mark.parametrize("durability", ["sync", "deferred"])
+def test_transaction_grava_cada_colecao_uma_vez(make_engine, durability):
+    eng = make_engine(durability)
+    eng.load()
+    saves = _count_saves(eng)
+    with eng.transaction():
+        for i in range(5):
+            eng.add_client({"name": f"Cliente {i}"})
+            eng.add_log({"clientName": f"Cliente {i}", "status": "ok"})
+        with eng.transaction():  # aninhado: entra no lote externo
+            eng.add_client({"name": "Cliente 5"})
+        assert saves == {}
+    assert saves == {eng.CLIENTS_FILE: 1, eng.LOGS_FILE: 1}
+    assert len(_on_disk(eng.CLIENTS_FILE)) == 6
+    assert len(_on_disk(eng.LOGS_FILE)) == 5
+    assert not eng.has_pending_writes()
+
+def test_excecao_na_transaction_deixa_o_disco_consistente(make_engine, tmp_path):
+    eng = make_engine("sync")
+    with pytest.raises(RuntimeError):
+        with eng.transaction():
+            eng.add_client({"name": "Ana"})
+            eng.add_client({"name": "Bia"})
+            raise RuntimeError("falha no meio do lote")
+    # O que foi aplicado antes da exceção está no disco, igual à memória, e nada ficou pendente
+    assert not eng.has_pending_writes()
+    assert _on_disk(eng.CLIENTS_FILE) == json.loads(json.dumps(eng.list_clients()))
+    assert [c["name"] for c in _on_disk(eng.CLIENTS_FILE)] == ["Ana", "Bia"]
+    meta = _on_disk(eng.CLIENTS_FILE + ".meta")
+    assert f"{meta['epoch']}-{meta['version']}" == eng.collection_version("clients")
+    # O flock foi liberado: outra instância (outro worker) consegue escrever
+    other = make_engine("sync", data_dir=tmp_path)
+    other.add_client({"name": "Caio"})
+    assert [c["name"] for c in eng.list_clients()] == ["Ana", "Bia", "Caio"]
+
+def test_shutdown_do_lifespan_grava_as_colecoes_sujas(monkeypatch):
+    import engine
+    import main
+
+    monkeypatch.setattr(engine, "DURABILITY", "deferred")
+    monkeypatch.setattr(engine, "FLUSH_INTERVAL_SECONDS", 3600)
+
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            client = engine.add_client({"name": "Pendente no shutdown"})
+            assert engine.has_pending_writes()
+            assert client["id"] not in {c["id"] for c in _on_disk(engine.CLIENTS_FILE)}
+        return client
+
+    client = asyncio.run(run())
+    assert not engine.has_pending_writes()
+    assert client["id"] in {c["id"] for c in _on_disk(engine.CLIENTS_FILE)}
@@ -0,0 +1,23 @@
+# tests/test_fast_json.py
+# fast_json.project: mesma forma do response_model, com coerção dos campos numéricos/booleanos.
+
+from schemas import Charge, RecurringCharge
+from utils import fast_json
+
+def test_project_converte_numeros_como_o_response_model():
+    rows = [
+        {"id": "1", "clientName": "A", "value": 10, "extra": "x"},
+        {"id": "2", "clientName": "B", "value": "10.5", "clientFound": "false"},
+    ]
+    out = fast_json.project(rows, Charge)
+    expected = [Charge.model_validate(row).model_dump() for row in rows]
+    assert out == expected
+    assert type(out[0]["value"]) is float
+    assert "extra" not in out[0]
+
+def test_project_mantem_valores_invalidos():
+    out = fast_json.project([{"clientName": "A", "value": "abc", "recurrenceInterval": 2.0,
+                              "messageTemplate": "m", "recurrenceType": "daily"}], RecurringCharge)
+    assert out[0]["value"] == "abc"  # o response_model levantaria erro; aqui sai como está
+    assert out[0]["recurrenceInterval"] == 2 and type(out[0]["recurrenceInterval"]) is int
+    assert out[0]["status"] == "Active"
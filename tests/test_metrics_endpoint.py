@@ -0,0 +1,39 @@
+# tests/test_metrics_endpoint.py
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+def _get(headers=None) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def call():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics", headers=headers or {})
+
+    return asyncio.run(call())
+
+def test_sem_token_configurado_o_endpoint_fica_desligado(monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    monkeypatch.setattr(main, "METRICS_PUBLIC", False)
+    assert _get().status_code == 404
+
+def test_metrics_public_libera_sem_token(monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "")
+    monkeypatch.setattr(main, "METRICS_PUBLIC", True)
+    resp = _get()
+    assert resp.status_code == 200
+    assert "konty_http_requests_total" in resp.text
+
+@pytest.mark.parametrize("header, status", [
+    (None, 401),
+    ("Bearer errado", 401),
+    ("Basic s3cret", 401),
+    ("Bearer s3cret", 200),
+])
+def test_token_obrigatorio(monkeypatch, header, status):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "s3cret")
+    monkeypatch.setattr(main, "METRICS_PUBLIC", True)  # o token tem precedência
+    assert _get({"Authorization": header} if header else None).status_code == status
@@ -0,0 +1,33 @@
+# tests/test_module_registry.py
+# Versão do código dos engines e a chave do cache de resultados do PDF.
+
+from routes import pdf_processor
+from utils import module_registry
+
+def test_versao_muda_com_o_codigo(tmp_path):
+    core = tmp_path / "core"
+    core.mkdir()
+    engine_py = core / "engine.py"
+    engine_py.write_text("VALOR = 1\n", encoding="utf-8")
+    first = module_registry._code_version(str(engine_py))
+    assert module_registry._code_version(str(engine_py)) == first
+    engine_py.write_text("VALOR = 2\n", encoding="utf-8")
+    assert module_registry._code_version(str(engine_py)) != first
+    engine_py.write_text("VALOR = 1\n", encoding="utf-8")
+    (core / "helpers.py").write_text("X = 1\n", encoding="utf-8")
+    assert module_registry._code_version(str(engine_py)) != first
+
+def test_chave_do_cache_inclui_a_versao_do_engine(monkeypatch):
+    digest = "a" * 64
+    monkeypatch.setattr(pdf_processor, "engine_version", lambda name: "v1")
+    old = pdf_processor._cache_key(digest, "condominio", False)
+    old_manifest = pdf_processor._cache_key(digest, "funcionario", True)
+    monkeypatch.setattr(pdf_processor, "engine_version", lambda name: "v2")
+    assert pdf_processor._cache_key(digest, "condominio", False) != old
+    assert pdf_processor._cache_key(digest, "funcionario", True) != old_manifest
+    assert old != old_manifest
+
+def test_versao_do_engine_carregado():
+    version = module_registry.engine_version("extrair-pdf")
+    assert len(version) == 12
+    assert module_registry.engine_stats()["extrair-pdf"]["version"] == version
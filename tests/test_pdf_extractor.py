@@ -0,0 +1,25 @@
+# tests/test_pdf_extractor.py
+from utils.module_registry import get_engine
+
+TEXTO = (
+    "Cond X CNPJ: 12.345.678/0001-90\n"
+    "Código 123\n"
+    "Nome do Funcionário\n"
+    "JOSE DA\n"
+    "SILVA SANTOS\n"
+    "(CBO: 1234)\n"
+    "resto"
+)
+
+def test_nome_que_atravessa_o_corte_do_cabecalho_usa_o_texto_completo():
+    engine = get_engine("extrair-pdf")
+    extrator = engine.ExtratorCampos(header_lines=4)
+    assert extrator.codigo_nome_funcionario(TEXTO) == ("123", "JOSE DA SILVA SANTOS")
+
+def test_cabecalho_e_texto_completo_dao_o_mesmo_resultado():
+    engine = get_engine("extrair-pdf")
+    texto_completo = engine.ExtratorCampos(header_lines=1000)
+    for linhas in range(1, 8):
+        extrator = engine.ExtratorCampos(header_lines=linhas)
+        assert extrator.codigo_nome_funcionario(TEXTO) == texto_completo.codigo_nome_funcionario(TEXTO)
+        assert extrator.condominio_cnpj(TEXTO) == texto_completo.condominio_cnpj(TEXTO)
@@ -0,0 +1,88 @@
+# tests/test_permissions.py
+# Permissões: JsonPermissionStore, cache com TTL, invalidate() e o 403 de require_system.
+
+import json
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from auth import get_current_user
+from utils import permissions
+
+class CountingStore(permissions.JsonPermissionStore):
+    def __init__(self, path):
+        super().__init__(str(path))
+        self.calls = []
+
+    def load_many(self, user_ids):
+        user_ids = list(user_ids)
+        self.calls.append(user_ids)
+        return super().load_many(user_ids)
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "permissions.json"
+    path.write_text(json.dumps({"default": ["cobranca"], "users": {"u1": ["cobranca", "financeiro"]}}), encoding="utf-8")
+    counting = CountingStore(path)
+    permissions.set_store(counting)
+    yield counting
+    permissions.set_store(permissions.JsonPermissionStore())
+
+def _write(store, data):
+    with open(store.path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def test_json_store_usa_o_padrao_para_quem_nao_tem_entrada(store):
+    assert store.load_many(["u1", "u2"]) == {"u1": ["cobranca", "financeiro"], "u2": ["cobranca"]}
+
+def test_arquivo_ausente_usa_os_acessos_padrao(tmp_path):
+    store = permissions.JsonPermissionStore(str(tmp_path / "nao-existe.json"))
+    assert store.load_many(["u1"]) == {"u1": permissions.DEFAULT_ACESSOS}
+
+def test_acerto_no_cache_nao_consulta_o_store(store):
+    assert asyncio.run(permissions.resolve_permissions("u1")) == ["cobranca", "financeiro"]
+    _write(store, {"users": {"u1": []}})
+    assert asyncio.run(permissions.resolve_permissions("u1")) == ["cobranca", "financeiro"]
+    assert store.calls == [["u1"]]
+
+def test_entrada_expirada_consulta_de_novo(store, monkeypatch):
+    asyncio.run(permissions.resolve_permissions("u1"))
+    _write(store, {"users": {"u1": ["auditoria"]}})
+    now = permissions.time.time()
+    monkeypatch.setattr(permissions.time, "time", lambda: now + permissions.PERMISSIONS_CACHE_TTL_SECONDS + 1)
+    assert asyncio.run(permissions.resolve_permissions("u1")) == ["auditoria"]
+    assert len(store.calls) == 2
+
+def test_invalidate(store):
+    permissions.preload(["u1", "u2"])
+    assert store.calls == [["u1", "u2"]]
+    _write(store, {"default": ["relatorios"], "users": {"u1": ["auditoria"]}})
+    permissions.invalidate("u1")
+    assert asyncio.run(permissions.resolve_permissions("u1")) == ["auditoria"]
+    assert asyncio.run(permissions.resolve_permissions("u2")) == ["cobranca"]  # ainda em cache
+    permissions.invalidate()
+    assert asyncio.run(permissions.resolve_permissions("u2")) == ["relatorios"]
+
+def _app(user_id: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/financeiro")
+    async def financeiro(user: dict = Depends(permissions.require_system("financeiro"))):
+        return {"id": user["id"]}
+
+    app.dependency_overrides[get_current_user] = lambda: {"id": user_id, "email": None, "org_id": None}
+    return app
+
+def _get(app: FastAPI, path: str) -> httpx.Response:
+    async def call():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await client.get(path)
+    return asyncio.run(call())
+
+def test_require_system(store):
+    assert _get(_app("u1"), "/financeiro").json() == {"id": "u1"}
+    resp = _get(_app("u2"), "/financeiro")
+    assert resp.status_code == 403
+    assert "financeiro" in resp.json()["detail"]
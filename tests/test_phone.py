@@ -0,0 +1,18 @@
+# tests/test_phone.py
+# normalize_phone: números nacionais ganham o código do país (COBRANCA_PHONE_COUNTRY_CODE, padrão 55).
+
+import engine
+
+def test_codigo_do_pais_padrao_e_55():
+    assert engine.PHONE_COUNTRY_CODE == "55"
+
+def test_normalize_phone():
+    assert engine.normalize_phone("(11) 99999-9999") == "+5511999999999"
+    assert engine.normalize_phone("011 3333-4444") == "+551133334444"
+    assert engine.normalize_phone("+55 11 99999-9999") == "+5511999999999"
+    assert engine.normalize_phone("") is None
+    assert engine.normalize_phone("sem número") is None
+
+def test_codigo_do_pais_configurado(monkeypatch):
+    monkeypatch.setattr(engine, "PHONE_COUNTRY_CODE", "351")
+    assert engine.normalize_phone("2123456789") == "+3512123456789"
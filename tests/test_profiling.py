@@ -0,0 +1,96 @@
+# tests/test_profiling.py
+import time
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+
+from utils import profiling
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def alvo_do_perfil():
+    _busy(0.4)
+
+def outra_requisicao():
+    _busy(0.4)
+
+def _app(results: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/alvo")
+    def alvo():
+        alvo_do_perfil()
+        return {}
+
+    @app.get("/outra")
+    def outra():
+        outra_requisicao()
+        return {}
+
+    @app.get("/async")
+    async def rota_async():
+        await asyncio.sleep(0.05)
+        _busy(0.2)  # no event loop, dentro da task da requisição
+        return {}
+
+    @app.middleware("http")
+    async def profile(request: Request, call_next):
+        session = profiling.start(request.scope)
+        response = await call_next(request)
+        if session is not None:
+            results[request.url.path] = session
+            profiling.finish(session, "test", 10_000)
+        return response
+
+    return app
+
+def _stacks(session) -> str:
+    return "\n".join(session.samples)
+
+def test_perfil_so_amostra_a_requisicao_profilada(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_PATHS", ["/alvo"])
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1.0)
+    results = {}
+    app = _app(results)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            await asyncio.gather(client.get("/alvo"), client.get("/outra"), client.get("/outra"))
+
+    asyncio.run(run())
+    stacks = _stacks(results["/alvo"])
+    assert "alvo_do_perfil" in stacks
+    assert "outra_requisicao" not in stacks
+
+def test_rota_async_amostra_o_event_loop_da_propria_task(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_PATHS", ["/async"])
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1.0)
+    results = {}
+    app = _app(results)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            await asyncio.gather(client.get("/async"), client.get("/outra"))
+
+    asyncio.run(run())
+    stacks = _stacks(results["/async"])
+    assert "rota_async" in stacks
+    assert "outra_requisicao" not in stacks
+
+def test_start_usa_o_scope_asgi(monkeypatch, tmp_path):
+    scope = {"type": "http", "path": "/qualquer", "headers": [(b"x-profile", b"1")]}
+    assert profiling.start(scope) is None  # desligado: nem olha a requisição
+    monkeypatch.setattr(profiling, "PROFILE_ALLOW_HEADER", True)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    session = profiling.start(scope)
+    assert session is not None and session.forced and session.path == "/qualquer"
+    profiling.finish(session, "test", 0)
+    assert profiling.start({**scope, "headers": []}) is None
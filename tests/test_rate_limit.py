@@ -0,0 +1,69 @@
+# tests/test_rate_limit.py
+# Chave do cliente no controle de admissão e limite de jobs de PDF por usuário.
+
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+from utils import pdf_jobs, rate_limit
+
+def _scope(token=None, client=("10.0.0.1", 1234)):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return {"type": "http", "method": "POST", "path": "/api/sync_charges_with_clients",
+            "headers": headers, "client": client}
+
+@pytest.fixture
+def fake_auth(monkeypatch):
+    async def get_current_user(token):
+        if token.startswith("valid-"):
+            return {"id": token[len("valid-"):], "email": None, "org_id": None}
+        raise HTTPException(status_code=401, detail="inválido")
+
+    monkeypatch.setattr(auth, "get_current_user", get_current_user)
+
+def test_chave_pelo_usuario_do_token_validado(fake_auth):
+    # Atrás do proxy todos chegam do mesmo IP; cada usuário autenticado tem seu bucket
+    assert asyncio.run(rate_limit.client_key(_scope("valid-u1"))) == "user:u1"
+    assert asyncio.run(rate_limit.client_key(_scope("valid-u2"))) == "user:u2"
+
+def test_token_invalido_ou_ausente_usa_o_ip(fake_auth):
+    assert asyncio.run(rate_limit.client_key(_scope("forjado"))) == "ip:10.0.0.1"
+    assert asyncio.run(rate_limit.client_key(_scope())) == "ip:10.0.0.1"
+    assert asyncio.run(rate_limit.client_key(_scope(client=None))) == "ip:-"
+
+def test_criacao_de_job_de_pdf_e_protegida():
+    assert rate_limit.ROUTES[("POST", "/modulos/processar-pdf/jobs")] == "pdf"
+
+class _Executor:
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, job, *args):
+        future = Future()
+        self.futures.append((future, job))
+        return future
+
+def test_limite_de_jobs_pendentes_por_usuario(tmp_path, monkeypatch):
+    executor = _Executor()
+    monkeypatch.setattr(pdf_jobs, "JOBS_DIR", str(tmp_path))
+    monkeypatch.setattr(pdf_jobs, "JOB_MAX_PENDING", 10)
+    monkeypatch.setattr(pdf_jobs, "JOB_MAX_PENDING_PER_USER", 2)
+    monkeypatch.setattr(pdf_jobs, "_get_executor", lambda: executor)
+    monkeypatch.setattr(pdf_jobs, "_pending", 0)
+    monkeypatch.setattr(pdf_jobs, "_pending_by_owner", {})
+
+    pdf_jobs.submit("extrair-pdf", b"%PDF", "u1")
+    pdf_jobs.submit("extrair-pdf", b"%PDF", "u1")
+    with pytest.raises(pdf_jobs.QueueFull) as exc:
+        pdf_jobs.submit("extrair-pdf", b"%PDF", "u1")
+    assert exc.value.per_user
+    pdf_jobs.submit("extrair-pdf", b"%PDF", "u2")  # outros usuários não são afetados
+
+    future, job = executor.futures[0]
+    future.set_result(dict(job, status="error", error="falhou", finished_at=job["created_at"]))
+    pdf_jobs.submit("extrair-pdf", b"%PDF", "u1")  # a vaga volta quando o job termina
+    assert pdf_jobs._pending == 3
+    assert pdf_jobs._pending_by_owner == {"u1": 2, "u2": 1}
@@ -0,0 +1,46 @@
+# tests/test_recurrence.py
+# calculate_next_send_date: o laço de busca da próxima data precisa terminar (diária e semanal).
+
+import threading
+from datetime import datetime, timedelta
+
+import engine
+
+_WEEKDAYS = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo"]
+
+def _next(rc: dict):
+    # Roda numa thread: um laço infinito falha o teste em vez de travar a suíte
+    result = {}
+    worker = threading.Thread(target=lambda: result.setdefault("value", engine.calculate_next_send_date(rc)), daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive(), "calculate_next_send_date não terminou"
+    return result["value"]
+
+def test_diaria_avanca_um_intervalo():
+    last = datetime.now() - timedelta(hours=1)
+    rc = {"recurrenceType": "daily", "recurrenceInterval": 2,
+          "startDate": (last - timedelta(days=10)).isoformat(), "lastSentDate": last.isoformat()}
+    before = datetime.now()
+    result = _next(rc)
+    assert result is not None and result > before
+    assert result - before <= timedelta(days=2, seconds=5)
+
+def test_semanal_com_hoje_entre_os_dias_alvo():
+    today = datetime.now()
+    rc = {"recurrenceType": "weekly", "recurrenceInterval": 1,
+          "recurrenceDaysOfWeek": [_WEEKDAYS[today.weekday()]],
+          "startDate": (today - timedelta(days=30)).isoformat(),
+          "lastSentDate": (today - timedelta(minutes=1)).isoformat()}
+    result = _next(rc)
+    assert result is not None and result > today
+    assert result.weekday() == today.weekday()
+    assert result - today <= timedelta(days=7, seconds=5)
+
+def test_intervalo_invalido_nao_trava():
+    last = datetime.now() - timedelta(days=3)
+    for interval in (0, -1):
+        rc = {"recurrenceType": "daily", "recurrenceInterval": interval,
+              "startDate": last.isoformat(), "lastSentDate": last.isoformat()}
+        result = _next(rc)
+        assert result is not None and result > datetime.now() - timedelta(seconds=5)
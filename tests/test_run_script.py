@@ -0,0 +1,42 @@
+# tests/test_run_script.py
+# Interpretador reserva (SCRIPT_WARM_INTERPRETER): subidas simultâneas não deixam reservas órfãos.
+
+import asyncio
+
+from utils import run_script
+
+def test_subidas_simultaneas_mantem_um_unico_reserva(tmp_path, monkeypatch):
+    for i in range(4):
+        (tmp_path / f"s{i}.py").write_text(f"print('s{i} ok')\n", encoding="utf-8")
+    monkeypatch.setattr(run_script, "SCRIPTS_DIR", str(tmp_path))
+    monkeypatch.setattr(run_script, "SCRIPTS_MOCK", False)
+    monkeypatch.setattr(run_script, "SCRIPT_WARM_INTERPRETER", True)
+    monkeypatch.setattr(run_script, "SCRIPT_MAX_CONCURRENT", 4)
+    monkeypatch.setattr(run_script, "_semaphore", None)
+    monkeypatch.setattr(run_script, "_spare_lock", None)
+    monkeypatch.setattr(run_script, "_spare", None)
+
+    spawned = []
+    original = run_script._spawn_warm
+
+    async def counting_spawn():
+        proc = await original()
+        spawned.append(proc)
+        return proc
+
+    monkeypatch.setattr(run_script, "_spawn_warm", counting_spawn)
+
+    async def flow():
+        try:
+            results = await asyncio.gather(*(run_script.run_script(f"s{i}") for i in range(4)))
+            alive = [p for p in spawned if p.returncode is None]
+            return results, alive, run_script._spare
+        finally:
+            await run_script.shutdown()
+
+    results, alive, spare = asyncio.run(flow())
+    assert [r["status"] for r in results] == ["ok"] * 4
+    assert [r["message"] for r in results] == [f"s{i} ok" for i in range(4)]
+    # 4 execuções + 1 reserva; o único interpretador ainda vivo é o reserva
+    assert len(spawned) == 5
+    assert alive == [spare]
@@ -0,0 +1,101 @@
+# tests/test_tenants.py
+# Partições por tenant: chave, isolamento dos dados e descarte (LRU) das instâncias do engine.
+
+import os
+import threading
+
+import pytest
+
+import tenants
+
+@pytest.fixture
+def tenant_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "TENANTS_DIR", str(tmp_path))
+    monkeypatch.setattr(tenants, "MAX_ACTIVE", 2)
+    monkeypatch.setattr(tenants, "IDLE_SECONDS", 3600)
+    tenants.shutdown()
+    yield tmp_path
+    tenants.shutdown()
+
+def test_tenant_key():
+    assert tenants.tenant_key({"id": "user-1", "org_id": "org_1"}) == "org_1"
+    assert tenants.tenant_key({"id": "user-1", "org_id": None}) == "user-1"
+    unsafe = tenants.tenant_key({"id": "u", "org_id": "../../etc"})
+    assert len(unsafe) == 32 and all(c in "0123456789abcdef" for c in unsafe)
+    assert unsafe == tenants.tenant_key({"id": "outro", "org_id": "../../etc"})  # determinística
+    assert unsafe != tenants.tenant_key({"id": "u", "org_id": "../../etc2"})
+    assert tenants.tenant_key({"id": "x" * 65}) != "x" * 65  # longa demais para nome de diretório
+
+def test_tenants_isolados(tenant_dir):
+    with tenants.use("a") as eng_a:
+        eng_a.add_client({"name": "Cliente A"})
+    with tenants.use("b") as eng_b:
+        assert eng_b is not eng_a
+        assert eng_b.list_clients() == []
+        eng_b.add_client({"name": "Cliente B"})
+    with tenants.use("a") as eng_a:
+        assert [c["name"] for c in eng_a.list_clients()] == ["Cliente A"]
+    assert os.path.exists(tenant_dir / "a" / "clients.json")
+    assert os.path.exists(tenant_dir / "b" / "clients.json")
+
+def test_lru_descarta_o_menos_recente(tenant_dir):
+    for key in ("a", "b"):
+        with tenants.use(key) as eng:
+            eng.add_client({"name": f"Cliente {key}"})
+    with tenants.use("a"):
+        pass  # "a" passa a ser o mais recente
+    with tenants.use("c"):
+        pass
+    assert list(tenants._tenants) == ["a", "c"]
+    assert tenants.stats()["evicted"] >= 1
+    # Dados do descartado continuam no disco e voltam numa instância nova
+    with tenants.use("b") as eng_b:
+        assert [c["name"] for c in eng_b.list_clients()] == ["Cliente b"]
+
+def test_tenant_em_uso_nao_e_descartado(tenant_dir, monkeypatch):
+    monkeypatch.setattr(tenants, "MAX_ACTIVE", 1)
+    evicted_before = tenants.stats()["evicted"]
+    entered, release = threading.Event(), threading.Event()
+    result = {}
+
+    def request_a():
+        with tenants.use("a") as eng_a:
+            entered.set()
+            release.wait(10)
+            # Ainda utilizável depois da pressão de descarte
+            eng_a.add_client({"name": "escrito durante a requisição"})
+            result["clients"] = [c["name"] for c in eng_a.list_clients()]
+
+    worker = threading.Thread(target=request_a)
+    worker.start()
+    assert entered.wait(10)
+    for key in ("b", "c", "d"):
+        with tenants.use(key):
+            pass
+    assert "a" in tenants._tenants  # em uso: fica mesmo acima de MAX_ACTIVE
+    release.set()
+    worker.join(10)
+    assert result["clients"] == ["escrito durante a requisição"]
+
+    # Liberado, sai na próxima varredura; o que escreveu está no disco
+    tenants.sweep()
+    assert "a" not in tenants._tenants
+    assert tenants.stats()["evicted"] > evicted_before
+    with tenants.use("a") as eng_a:
+        assert [c["name"] for c in eng_a.list_clients()] == ["escrito durante a requisição"]
+
+def test_tenant_com_gravacao_pendente_nao_e_descartado(tenant_dir, monkeypatch):
+    monkeypatch.setattr(tenants, "MAX_ACTIVE", 1)
+    with tenants.use("a") as eng_a:
+        eng_a.DURABILITY = "deferred"
+        eng_a.FLUSH_INTERVAL_SECONDS = 3600
+        eng_a.add_client({"name": "pendente"})
+    for key in ("b", "c"):
+        with tenants.use(key):
+            pass
+    assert "a" in tenants._tenants
+    eng_a.flush()
+    tenants.sweep()
+    assert "a" not in tenants._tenants
+    with tenants.use("a") as fresh:
+        assert [c["name"] for c in fresh.list_clients()] == ["pendente"]
@@ -0,0 +1,29 @@
+# tests/test_tracing_logging.py
+import logging
+import logging.handlers
+
+from utils import tracing
+
+def test_logs_depois_do_shutdown_continuam_sendo_gravados(capsys):
+    tracing.shutdown_logging()
+    tracing.setup_logging(logging.INFO)
+    logger = logging.getLogger("konty")
+
+    logger.info("antes do shutdown")
+    tracing.shutdown_logging()
+    root = logging.getLogger()
+    assert not any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
+
+    logger.info("depois do shutdown")  # ex.: segundo lifespan no mesmo processo
+    err = capsys.readouterr().err
+    assert "antes do shutdown" in err
+    assert "depois do shutdown" in err
+
+def test_setup_depois_do_shutdown_volta_para_a_fila(capsys):
+    tracing.shutdown_logging()
+    tracing.setup_logging(logging.INFO)
+    root = logging.getLogger()
+    assert [type(h) for h in root.handlers] == [logging.handlers.QueueHandler]
+    tracing.shutdown_logging()
+    logging.getLogger("konty").info("registro final")
+    assert "registro final" in capsys.readouterr().err
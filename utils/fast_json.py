@@ -0,0 +1,94 @@
+# utils/fast_json.py
+# Caminho rápido (opt-in, FAST_JSON_RESPONSES=1) para respostas grandes com dados do próprio engine.
+#
+# O caminho padrão do FastAPI valida cada item com o response_model (List[Log], List[Charge]...)
+# e depois serializa com o json da stdlib. Como esses registros já foram validados na entrada,
+# aqui apenas projetamos cada dict nos campos do modelo (mesma forma da resposta: campos do
+# contrato, com os defaults quando ausentes, sem campos extras) e serializamos com orjson,
+# quando instalado (senão json compacto).
+#
+# Coerção: campos numéricos e booleanos (float, int, bool, inclusive Optional) cujo valor
+# gravado não tem o tipo exato passam pelo validador do pydantic, como no response_model
+# (ex.: value=10 sai 10.0 e "10.5" gravado como texto sai 10.5). Valores que o pydantic
+# rejeitaria saem como estão, em vez de um 500. Os demais campos (str, listas) não são validados.
+
+import os
+import json
+from typing import Any, Dict, Iterable, List, Tuple, get_args
+
+from fastapi import Response
+from pydantic import TypeAdapter, ValidationError
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+ENABLED = os.getenv("FAST_JSON_RESPONSES", "0") == "1"
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:  # tipos que o orjson não aceita (ex.: inteiros > 64 bits)
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+_COERCED_TYPES = (float, int, bool)
+_fields_cache: Dict[type, Tuple[tuple, tuple]] = {}
+
+def _scalar_type(annotation):
+    """float/int/bool de um campo (inclusive Optional[...]); None para os demais tipos."""
+    if annotation in _COERCED_TYPES:
+        return annotation
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    return args[0] if len(args) == 1 and args[0] in _COERCED_TYPES else None
+
+def _model_fields(model) -> Tuple[tuple, tuple]:
+    """((nome, default), ...) e ((nome, tipo, validador), ...) dos campos com coerção."""
+    cached = _fields_cache.get(model)
+    if cached is None:
+        fields, coerced = [], []
+        for name, info in model.model_fields.items():
+            fields.append((name, None if info.is_required() else info.get_default(call_default_factory=True)))
+            kind = _scalar_type(info.annotation)
+            if kind is not None:
+                coerced.append((name, kind, TypeAdapter(info.annotation)))
+        cached = _fields_cache[model] = (tuple(fields), tuple(coerced))
+    return cached
+
+def _coerce(adapter: TypeAdapter, value: Any) -> Any:
+    try:
+        return adapter.validate_python(value)
+    except ValidationError:
+        return value
+
+def project(rows: Iterable[Dict[str, Any]], model) -> List[Dict[str, Any]]:
+    """
+    Projeta os registros nos campos do modelo, como o response_model faria. Só os campos
+    numéricos/booleanos são convertidos (ver o cabeçalho); o restante sai sem validação.
+    """
+    fields, coerced = _model_fields(model)
+    out = [{name: row.get(name, default) for name, default in fields} for row in rows]
+    if coerced:
+        for item in out:
+            for name, kind, adapter in coerced:
+                value = item[name]
+                if value is not None and type(value) is not kind:
+                    item[name] = _coerce(adapter, value)
+    return out
+
+def list_response(rows: Iterable[Dict[str, Any]], model, response: Response):
+    """
+    Com FAST_JSON_RESPONSES=1 devolve uma FastJSONResponse já serializada (mantendo os headers
+    definidos em `response`); caso contrário devolve as linhas para o caminho padrão do FastAPI.
+    """
+    if not ENABLED:
+        return rows
+    return FastJSONResponse(project(rows, model), headers=dict(response.headers))
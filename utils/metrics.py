@@ -0,0 +1,259 @@
+# utils/metrics.py
+# Métricas em processo no formato de exposição do Prometheus (texto), sem dependências externas.
+# Contadores, gauges e histogramas guardam valores por tupla de labels, protegidos por um lock.
+#
+# Vários workers (uvicorn --workers N): defina METRICS_MULTIPROC_DIR. Cada worker grava
+# periodicamente um snapshot <pid>.json nesse diretório e o /metrics de qualquer worker
+# soma os snapshots dos demais (gauges de processos encerrados são descartados).
+
+import os
+import json
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger("konty")
+
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = {}
+_collectors = []  # callbacks executados antes de cada coleta (gauges calculados na hora)
+_registry_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _fmt_value(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"|".join(k): self._dump(v) for k, v in self._values.items()}
+
+    def _dump(self, v):
+        return v
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels) -> None:
+        self.inc(-amount, *labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _dump(self, v):
+        return [list(v[0]), v[1], v[2]]
+
+def add_collector(fn) -> None:
+    """Registra uma função chamada antes de cada coleta (ex.: atualizar gauges de saturação)."""
+    _collectors.append(fn)
+
+# ---------- Snapshots entre processos ----------
+
+def _local_snapshot() -> dict:
+    return {name: m.snapshot() for name, m in list(_registry.items())}
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def write_snapshot() -> None:
+    if not MULTIPROC_DIR:
+        return
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    path = os.path.join(MULTIPROC_DIR, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_local_snapshot(), f)
+    os.replace(tmp, path)
+
+def _other_snapshots():
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return []
+    out = []
+    me = os.getpid()
+    for name in os.listdir(MULTIPROC_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            pid = int(name[:-5])
+        except ValueError:
+            continue
+        if pid == me:
+            continue
+        try:
+            with open(os.path.join(MULTIPROC_DIR, name), "r", encoding="utf-8") as f:
+                out.append((pid, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return out
+
+_flusher = None
+_flusher_stop = threading.Event()
+
+def start_flusher() -> None:
+    """Inicia a gravação periódica do snapshot deste worker (apenas com METRICS_MULTIPROC_DIR)."""
+    global _flusher
+    if not MULTIPROC_DIR or _flusher is not None:
+        return
+
+    def loop():
+        while not _flusher_stop.wait(FLUSH_INTERVAL_SECONDS):
+            try:
+                write_snapshot()
+            except OSError as exc:
+                logger.warning("metrics snapshot falhou: %r", exc)
+
+    _flusher_stop.clear()
+    _flusher = threading.Thread(target=loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+
+def stop_flusher() -> None:
+    global _flusher
+    if _flusher is None:
+        return
+    _flusher_stop.set()
+    _flusher = None
+    try:
+        write_snapshot()
+    except OSError:
+        pass
+
+# ---------- Exposição ----------
+
+def _merge(metric, merged: dict, data: dict, alive: bool) -> None:
+    for key, v in data.items():
+        if metric.kind == "gauge" and not alive:
+            continue
+        if metric.kind == "histogram":
+            cur = merged.get(key)
+            if cur is None:
+                merged[key] = [list(v[0]), v[1], v[2]]
+            else:
+                cur[0] = [a + b for a, b in zip(cur[0], v[0])]
+                cur[1] += v[1]
+                cur[2] += v[2]
+        else:
+            merged[key] = merged.get(key, 0.0) + v
+
+def render() -> str:
+    """Gera o texto no formato de exposição do Prometheus (0.0.4)."""
+    for fn in list(_collectors):
+        try:
+            fn()
+        except Exception:
+            logger.exception("metrics collector falhou")
+
+    others = _other_snapshots()
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        merged = {}
+        _merge(metric, merged, metric.snapshot(), True)
+        for pid, snap in others:
+            _merge(metric, merged, snap.get(name, {}), _pid_alive(pid))
+
+        lines.append(f"# HELP {name} {metric.doc}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, v in sorted(merged.items()):
+            labels = tuple(key.split("|")) if metric.labelnames else ()
+            if metric.kind == "histogram":
+                counts, total, count = v
+                cumulative = 0
+                for bound, c in zip(list(metric.buckets) + [float("inf")], counts):
+                    cumulative += c
+                    le = f'le="{_fmt_value(bound)}"'
+                    lines.append(f"{name}_bucket{_fmt_labels(metric.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_fmt_labels(metric.labelnames, labels)} {_fmt_value(float(total))}")
+                lines.append(f"{name}_count{_fmt_labels(metric.labelnames, labels)} {count}")
+            else:
+                lines.append(f"{name}{_fmt_labels(metric.labelnames, labels)} {_fmt_value(float(v))}")
+    return "\n".join(lines) + "\n"
+
+# ---------- Métricas da aplicação ----------
+
+HTTP_REQUESTS = Counter("konty_http_requests_total", "Requisições HTTP por rota (template), método e status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("konty_http_request_duration_seconds", "Latência das requisições HTTP por rota (template).", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("konty_http_requests_in_flight", "Requisições HTTP em andamento.")
+THREADPOOL_BUSY = Gauge("konty_threadpool_busy_threads", "Threads em uso no threadpool do AnyIO (rotas sync).")
+THREADPOOL_SIZE = Gauge("konty_threadpool_size", "Capacidade do threadpool do AnyIO.")
+ENGINE_SAVE_LATENCY = Histogram(
+    "konty_engine_save_duration_seconds", "Tempo de persistência do engine de cobrança (_save_data) por arquivo.",
+    ("file",), buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+ZAPI_LATENCY = Histogram("konty_zapi_request_duration_seconds", "Latência das chamadas à Z-API por resultado.", ("outcome",))
+RATE_LIMITED = Counter("konty_rate_limited_total", "Requisições rejeitadas (429) pelo controle de admissão, por classe e motivo.", ("class", "reason"))
+PDF_PAGES = Counter("konty_pdf_pages_processed_total", "Páginas de PDF processadas (rate() = páginas/s).")
+PDF_DURATION = Histogram("konty_pdf_processing_duration_seconds", "Duração do processamento de um PDF.", (), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+def observe_pdf(pages: int, seconds: float) -> None:
+    PDF_PAGES.inc(pages)
+    PDF_DURATION.observe(seconds)
+
+def _collect_threadpool() -> None:
+    try:
+        import anyio.to_thread
+        limiter = anyio.to_thread.current_default_thread_limiter()
+    except Exception:
+        return
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+
+add_collector(_collect_threadpool)
@@ -0,0 +1,119 @@
+# utils/module_registry.py
+# Registro dos engines em modules/<nome>/core/engine.py.
+# Carrega cada engine uma única vez (as pastas têm hífen, então não dá para usar import normal),
+# guarda em cache e permite aquecer na subida da aplicação.
+
+import os
+import time
+import hashlib
+import logging
+import threading
+import importlib.util
+
+logger = logging.getLogger("konty")
+
+MODULES_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "modules"))
+
+# Recarrega o engine quando o arquivo muda no disco (apenas para desenvolvimento)
+HOT_RELOAD = os.getenv("MODULES_HOT_RELOAD", "0") == "1"
+
+# { nome: {"module": mod, "path": str, "mtime": float, "version": str, "load_ms": float, "loaded_at": float} }
+_registry = {}
+_lock = threading.Lock()
+
+def _engine_path(name: str) -> str:
+    return os.path.join(MODULES_DIR, name, "core", "engine.py")
+
+def _module_name(name: str) -> str:
+    # extrair-pdf -> extrair_pdf_engine (mesmo nome usado anteriormente pelo pdf_processor)
+    return f"{name.replace('-', '_')}_engine"
+
+def _exec_engine(name: str, engine_path: str):
+    spec = importlib.util.spec_from_file_location(_module_name(name), engine_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Não foi possível criar spec para o engine.py de '{name}'")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def _code_version(engine_path: str) -> str:
+    """Hash do código do engine (os .py de core/): muda a cada alteração da lógica."""
+    core_dir = os.path.dirname(engine_path)
+    digest = hashlib.sha256()
+    for filename in sorted(f for f in os.listdir(core_dir) if f.endswith(".py")):
+        digest.update(filename.encode("utf-8"))
+        with open(os.path.join(core_dir, filename), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def _load(name: str) -> dict:
+    engine_path = _engine_path(name)
+    if not os.path.exists(engine_path):
+        raise ImportError(f"engine.py não encontrado no caminho esperado: {engine_path}")
+    start = time.perf_counter()
+    mod = _exec_engine(name, engine_path)
+    load_ms = round((time.perf_counter() - start) * 1000, 2)
+    logger.info("engine=%s load_ms=%s path=%s", name, load_ms, engine_path)
+    return {
+        "module": mod,
+        "path": engine_path,
+        "mtime": os.path.getmtime(engine_path),
+        "version": _code_version(engine_path),
+        "load_ms": load_ms,
+        "loaded_at": time.time(),
+    }
+
+def _is_stale(entry: dict) -> bool:
+    try:
+        return os.path.getmtime(entry["path"]) != entry["mtime"]
+    except OSError:
+        return False
+
+def get_engine(name: str):
+    """Retorna o engine de modules/<name>/core/engine.py, carregando-o apenas na primeira chamada."""
+    entry = _registry.get(name)
+    if entry is not None and not (HOT_RELOAD and _is_stale(entry)):
+        return entry["module"]
+
+    with _lock:
+        entry = _registry.get(name)
+        if entry is None or (HOT_RELOAD and _is_stale(entry)):
+            entry = _load(name)
+            _registry[name] = entry
+        return entry["module"]
+
+def engine_version(name: str) -> str:
+    """Versão do código do engine carregado (para chaves de cache de resultados)."""
+    get_engine(name)
+    return _registry[name]["version"]
+
+def available_engines() -> list:
+    """Lista os módulos que possuem core/engine.py."""
+    if not os.path.isdir(MODULES_DIR):
+        return []
+    return sorted(n for n in os.listdir(MODULES_DIR) if os.path.exists(_engine_path(n)))
+
+def warm_engines(names=None) -> dict:
+    """
+    Carrega antecipadamente os engines informados (ou os de ENGINE_WARMUP).
+    Retorna {nome: load_ms}; falhas são logadas e não derrubam a aplicação.
+    """
+    if names is None:
+        env = os.getenv("ENGINE_WARMUP", "extrair-pdf")
+        names = available_engines() if env == "*" else [n.strip() for n in env.split(",") if n.strip()]
+
+    timings = {}
+    for name in names:
+        try:
+            get_engine(name)
+            timings[name] = _registry[name]["load_ms"]
+        except Exception as exc:
+            logger.exception("engine=%s warmup_error=%s", name, repr(exc))
+    return timings
+
+def engine_stats() -> dict:
+    """Informações de carga de cada engine já carregado (custo de cold start)."""
+    return {
+        name: {"load_ms": e["load_ms"], "loaded_at": e["loaded_at"], "path": e["path"], "version": e["version"]}
+        for name, e in _registry.items()
+    }
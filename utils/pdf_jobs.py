@@ -0,0 +1,325 @@
+# utils/pdf_jobs.py
+# Jobs assíncronos de processamento de PDF.
+#
+# O processamento (CPU) roda num pool de processos (PDF_JOB_WORKERS), fora do processo da API:
+# não disputa o GIL com as requisições. O upload vai para disco (<id>.pdf) e não fica em memória
+# enquanto o job espera na fila.
+#
+# O estado de cada job fica em PDF_JOBS_DIR/<id>.json (gravação atômica), atualizado pelo
+# processo que executa o job: o status e o download funcionam de qualquer worker do uvicorn
+# (--workers N), não só do que recebeu o upload. O ZIP final fica em <id>.zip até expirar
+# (PDF_JOB_TTL_SECONDS após o término). Cada job pertence ao usuário que o criou.
+#
+# A fila é limitada: acima de PDF_JOB_MAX_PENDING jobs na fila ou em execução neste processo
+# (ou de PDF_JOB_MAX_PENDING_PER_USER do mesmo usuário, 0 = sem limite), submit() levanta
+# QueueFull. Os contadores são por processo: com --workers N o total pode chegar a N vezes o limite.
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import metrics
+
+logger = logging.getLogger("konty")
+
+JOBS_DIR = os.getenv("PDF_JOBS_DIR", os.path.join("data", "pdf_jobs"))
+JOB_WORKERS = int(os.getenv("PDF_JOB_WORKERS", "2"))
+JOB_TTL_SECONDS = int(os.getenv("PDF_JOB_TTL_SECONDS", str(60 * 60)))
+JOB_MAX_PENDING = int(os.getenv("PDF_JOB_MAX_PENDING", str(JOB_WORKERS * 4)))
+JOB_MAX_PENDING_PER_USER = int(os.getenv("PDF_JOB_MAX_PENDING_PER_USER", "2"))
+# Intervalo mínimo entre gravações do progresso no estado do job
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("PDF_JOB_PROGRESS_INTERVAL_SECONDS", "0.25"))
+CLEANUP_INTERVAL_SECONDS = 60
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+class QueueFull(Exception):
+    """Fila de jobs cheia (PDF_JOB_MAX_PENDING) ou limite do usuário atingido (per_user=True)."""
+
+    def __init__(self, message: str, per_user: bool = False):
+        super().__init__(message)
+        self.per_user = per_user
+
+# Estados: queued -> running -> done | error
+_lock = threading.Lock()
+_executor = None
+_pending = 0
+_pending_by_owner = {}
+_last_cleanup = 0.0
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # spawn: o processo da API tem threads (logging, write-behind); fork herdaria travas
+                _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def _path(job_id: str, ext: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.{ext}")
+
+def _result_path(job_id: str) -> str:
+    return _path(job_id, "zip")
+
+def _write_state(job: dict) -> None:
+    path = _path(job["id"], "json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _read_state(job_id: str):
+    try:
+        with open(_path(job_id, "json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _remove_files(job_id: str) -> None:
+    for ext in ("json", "zip", "pdf"):
+        try:
+            os.remove(_path(job_id, ext))
+        except FileNotFoundError:
+            pass
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except (ProcessLookupError, TypeError, ValueError):
+        return False
+    except PermissionError:
+        return True
+
+# ---------- Execução (processo do pool) ----------
+
+def _run(job: dict, engine_name: str, options: dict) -> dict:
+    """Processa o upload do job; grava o ZIP e o estado final. Retorna o estado."""
+    from utils.module_registry import get_engine
+
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    _write_state(job)
+    seen = set()
+    last_write = [0.0]
+
+    def progress(done: int, total: int, condominio):
+        job["pages_processed"] = done
+        job["pages_total"] = total
+        if condominio and condominio not in seen:
+            seen.add(condominio)
+            job["condominios"].append(condominio)
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_INTERVAL_SECONDS:
+            last_write[0] = now
+            _write_state(job)
+
+    engine = None
+    try:
+        engine = get_engine(engine_name)
+        with open(_path(job["id"], "pdf"), "rb") as f:
+            pdf_bytes = f.read()
+        result = engine.process_pdf_file(pdf_bytes, progress=progress, **options)
+        if isinstance(result, tuple) and len(result) == 2:
+            zip_buffer, zip_filename = result
+        else:
+            zip_buffer, zip_filename = result, "recibos_processados.zip"
+
+        tmp = _result_path(job["id"]) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(zip_buffer.getbuffer())
+        os.replace(tmp, _result_path(job["id"]))
+        job["filename"] = zip_filename
+        job["status"] = "done"
+    except Exception as exc:
+        PdfProcessingError = getattr(engine, "PdfProcessingError", None)
+        job["error_type"] = "business" if PdfProcessingError and isinstance(exc, PdfProcessingError) else "internal"
+        job["error"] = str(exc)
+        job["status"] = "error"
+    finally:
+        job["finished_at"] = time.time()
+        _write_state(job)
+        try:
+            os.remove(_path(job["id"], "pdf"))
+        except FileNotFoundError:
+            pass
+    return job
+
+# ---------- API (processo do uvicorn) ----------
+
+def _release(owner: str) -> None:
+    global _pending
+    with _lock:
+        _pending -= 1
+        if _pending_by_owner.get(owner, 0) > 1:
+            _pending_by_owner[owner] -= 1
+        else:
+            _pending_by_owner.pop(owner, None)
+
+def _finished(future, job_id: str, owner: str, started: float, on_done) -> None:
+    _release(owner)
+    try:
+        job = future.result()
+    except Exception as exc:  # processo do pool morreu ou job cancelado no shutdown
+        job = _read_state(job_id)
+        if job is None:
+            return
+        job.update(status="error", error_type="internal", error=f"Processamento interrompido: {exc!r}",
+                   finished_at=time.time())
+        _write_state(job)
+    logger.info(
+        "job=%s status=%s pages=%s/%s duration_ms=%s",
+        job_id, job["status"], job["pages_processed"], job["pages_total"],
+        round((time.time() - started) * 1000, 2),
+    )
+    if job["status"] != "done":
+        return
+    if job["started_at"]:
+        metrics.observe_pdf(job["pages_processed"], job["finished_at"] - job["started_at"])
+    if on_done:
+        try:
+            with open(_result_path(job_id), "rb") as f:
+                on_done(f.read(), job["filename"])
+        except Exception:
+            logger.exception("job=%s on_done falhou", job_id)
+
+def _new_job(owner: str) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "owner": owner,
+        "pid": os.getpid(),  # processo da API responsável pelo job (detecta jobs órfãos)
+        "status": "queued",
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "pages_processed": 0,
+        "pages_total": None,
+        "condominios": [],
+        "filename": None,
+        "error": None,
+        "error_type": None,
+    }
+
+def submit(engine_name: str, pdf_bytes: bytes, owner: str, on_done=None, options=None) -> dict:
+    """
+    Enfileira o processamento de `pdf_bytes` com o engine `engine_name` e retorna o job criado.
+    `options` é repassado ao process_pdf_file (ex.: modo, manifesto). `on_done(zip_bytes, nome)`
+    roda neste processo ao fim de um job concluído. Levanta QueueFull se a fila estiver cheia.
+    """
+    global _pending
+    cleanup_expired()
+    with _lock:
+        if _pending >= JOB_MAX_PENDING:
+            raise QueueFull(f"{_pending} jobs de PDF na fila ou em execução")
+        owned = _pending_by_owner.get(owner, 0)
+        if JOB_MAX_PENDING_PER_USER and owned >= JOB_MAX_PENDING_PER_USER:
+            raise QueueFull(f"{owned} jobs de PDF do usuário na fila ou em execução", per_user=True)
+        _pending += 1
+        _pending_by_owner[owner] = owned + 1
+    try:
+        job = _new_job(owner)
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        with open(_path(job["id"], "pdf"), "wb") as f:
+            f.write(pdf_bytes)
+        _write_state(job)
+        future = _get_executor().submit(_run, dict(job), engine_name, options or {})
+    except BaseException:
+        _release(owner)
+        raise
+    started = time.time()
+    future.add_done_callback(lambda fut: _finished(fut, job["id"], owner, started, on_done))
+    return job
+
+def submit_completed(zip_file, zip_filename: str, owner: str) -> dict:
+    """Cria um job já concluído a partir de um resultado existente (ex.: arquivo aberto do cache)."""
+    cleanup_expired()
+    job = _new_job(owner)
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with open(_result_path(job["id"]), "wb") as out:
+        shutil.copyfileobj(zip_file, out)
+    now = time.time()
+    job.update({"status": "done", "started_at": now, "finished_at": now, "filename": zip_filename})
+    _write_state(job)
+    return job
+
+def get_job(job_id: str, owner: str):
+    """Estado do job, se existir e pertencer a `owner`; senão None."""
+    cleanup_expired()
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    job = _read_state(job_id)
+    if job is None or job.get("owner") != owner:
+        return None
+    return job
+
+def result_path(job: dict):
+    """Caminho do ZIP de um job concluído, ou None."""
+    if job["status"] != "done":
+        return None
+    path = _result_path(job["id"])
+    return path if os.path.exists(path) else None
+
+def public_view(job: dict) -> dict:
+    """Representação do job para a API (sem campos internos)."""
+    total = job["pages_total"]
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "pages_processed": job["pages_processed"],
+        "pages_total": total,
+        "progress": round(job["pages_processed"] / total, 4) if total else None,
+        "condominios": list(job["condominios"]),
+        "filename": job["filename"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["finished_at"] + JOB_TTL_SECONDS if job["finished_at"] else None,
+    }
+
+def cleanup_expired(force: bool = False) -> int:
+    """
+    Remove jobs finalizados há mais de JOB_TTL_SECONDS (estado e arquivos) e encerra como erro
+    os jobs pendentes cujo processo da API não existe mais. Roda no máximo uma vez por minuto.
+    """
+    global _last_cleanup
+    now = time.time()
+    with _lock:
+        if not force and now - _last_cleanup < CLEANUP_INTERVAL_SECONDS:
+            return 0
+        _last_cleanup = now
+    if not os.path.isdir(JOBS_DIR):
+        return 0
+    removed = 0
+    for name in os.listdir(JOBS_DIR):
+        job_id, ext = os.path.splitext(name)
+        if ext != ".json" or not _JOB_ID.fullmatch(job_id):
+            continue
+        job = _read_state(job_id)
+        if job is None:
+            continue
+        if job["finished_at"] and now - job["finished_at"] > JOB_TTL_SECONDS:
+            _remove_files(job_id)
+            removed += 1
+        elif not job["finished_at"] and not _pid_alive(job.get("pid")):
+            job.update(status="error", error_type="internal", error="Processamento interrompido (reinício do servidor).",
+                       finished_at=now)
+            _write_state(job)
+            try:
+                os.remove(_path(job_id, "pdf"))
+            except FileNotFoundError:
+                pass
+    return removed
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,105 @@
+# utils/permissions.py
+# Resolução de permissões (sistemas que cada usuário pode acessar).
+# A origem dos dados é plugável (set_store); o resultado fica em cache em memória com TTL,
+# de modo que as rotas protegidas não fazem I/O no caminho quente.
+
+import os
+import json
+import time
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from auth import get_current_user
+
+logger = logging.getLogger("konty")
+
+PERMISSIONS_FILE = os.getenv("PERMISSIONS_FILE", os.path.join("data", "permissions.json"))
+PERMISSIONS_CACHE_TTL_SECONDS = int(os.getenv("PERMISSIONS_CACHE_TTL_SECONDS", "300"))
+
+# Acessos concedidos quando o usuário não tem entrada própria (equivale ao mock anterior)
+DEFAULT_ACESSOS = ["cobranca", "relatorios", "financeiro", "auditoria"]
+
+class JsonPermissionStore:
+    """
+    Store local em JSON: {"default": [...], "users": {"<user_id>": [...]}}.
+    Qualquer objeto com `load_many(user_ids) -> {user_id: [sistemas]}` pode substituí-lo.
+    """
+
+    def __init__(self, path: str = PERMISSIONS_FILE, default: Optional[List[str]] = None):
+        self.path = path
+        self.default = list(DEFAULT_ACESSOS if default is None else default)
+
+    def load_many(self, user_ids: Iterable[str]) -> Dict[str, List[str]]:
+        data = {}
+        if os.path.exists(self.path) and os.stat(self.path).st_size > 0:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        default = data.get("default", self.default)
+        users = data.get("users", {})
+        return {uid: list(users.get(uid, default)) for uid in user_ids}
+
+_store = JsonPermissionStore()
+# { user_id: (frozenset(sistemas), lista_ordenada, expira_em) }
+_cache = {}
+
+def set_store(store) -> None:
+    """Troca a origem das permissões e descarta o cache."""
+    global _store
+    _store = store
+    invalidate()
+
+def invalidate(user_id: Optional[str] = None) -> None:
+    """Invalida o cache de um usuário (ou de todos)."""
+    if user_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(user_id, None)
+
+def _cached(user_id: str):
+    entry = _cache.get(user_id)
+    if entry is None or entry[2] <= time.time():
+        return None
+    return entry
+
+def _store_result(result: Dict[str, List[str]]) -> dict:
+    expires_at = time.time() + PERMISSIONS_CACHE_TTL_SECONDS
+    entries = {uid: (frozenset(sistemas), list(sistemas), expires_at) for uid, sistemas in result.items()}
+    _cache.update(entries)
+    return entries
+
+def preload(user_ids: Iterable[str]) -> int:
+    """Carrega em lote (uma única consulta ao store) os usuários ainda fora do cache."""
+    missing = [uid for uid in dict.fromkeys(user_ids) if _cached(uid) is None]
+    if missing:
+        _store_result(_store.load_many(missing))
+    return len(missing)
+
+async def _resolve(user_id: str):
+    entry = _cached(user_id)
+    if entry is None:
+        # Falta no cache: consulta o store fora do event loop
+        result = await run_in_threadpool(_store.load_many, [user_id])
+        entry = _store_result(result)[user_id]
+    return entry
+
+async def resolve_permissions(user_id: str) -> List[str]:
+    return (await _resolve(user_id))[1]
+
+async def get_user_permissions(current_user: dict = Depends(get_current_user)) -> List[str]:
+    """Dependência: lista de sistemas que o usuário autenticado pode acessar."""
+    return await resolve_permissions(current_user["id"])
+
+def require_system(sistema: str, detail: Optional[str] = None):
+    """Dependência que retorna 403 se o usuário não tiver acesso ao `sistema`."""
+    async def _check(current_user: dict = Depends(get_current_user)) -> dict:
+        permitidos, _, _ = await _resolve(current_user["id"])
+        if sistema not in permitidos:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail or f"Você não tem permissão para acessar o sistema '{sistema}'.",
+            )
+        return current_user
+    return _check
@@ -0,0 +1,193 @@
+# utils/profiling.py
+# Profiler por amostragem para requisições lentas (opt-in).
+#
+# Enquanto uma requisição elegível está em andamento, uma thread amostra as pilhas
+# (sys._current_frames) só do que pertence a essa requisição: o event loop quando a pilha em
+# execução é a dela (rotas async; reconhecida pelo `scope` ASGI nos frames) e as threads do
+# threadpool que executam código dela (rotas e dependências sync; a sessão fica num contextvar,
+# herdado pelo threadpool). Outras requisições simultâneas e threads de fundo não entram no perfil. Ao final, se a
+# requisição passou de PROFILE_THRESHOLD_MS (ou foi pedida via header), as amostras são gravadas
+# em formato "collapsed stacks" (flamegraph.pl, speedscope, inferno) com o mesmo request id do log.
+#
+# Custo limitado por: no máximo PROFILE_MAX_CONCURRENT sessões simultâneas, PROFILE_MAX_SAMPLES
+# por sessão e intervalo adaptativo para que a amostragem use até PROFILE_MAX_OVERHEAD_PCT do tempo.
+
+import os
+import re
+import sys
+import time
+import logging
+import threading
+import contextvars
+from collections import Counter
+
+logger = logging.getLogger("konty")
+
+PROFILE_ENABLED = os.getenv("PROFILE_SLOW_REQUESTS", "0") == "1"
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "1000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_PATHS = [p.strip() for p in os.getenv(
+    "PROFILE_PATHS", "/api/process_recurring_charges,/modulos/processar-pdf"
+).split(",") if p.strip()]
+PROFILE_ALLOW_HEADER = os.getenv("PROFILE_ALLOW_HEADER", "0") == "1"  # X-Profile: 1 força o profiling
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_OVERHEAD_PCT = float(os.getenv("PROFILE_MAX_OVERHEAD_PCT", "2"))
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "20000"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "1"))
+
+# Folhas de pilha que indicam thread ociosa (não entram no perfil)
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("handlers.py", "dequeue"),  # QueueListener do logging
+    ("thread.py", "_worker"),    # ThreadPoolExecutor aguardando trabalho
+}
+
+_active = set()
+_active_lock = threading.Lock()
+
+# Sessão da requisição atual (definida em start(), na task da requisição)
+_session_var = contextvars.ContextVar("profile_session", default=None)
+
+# Frames mais externos de uma thread de worker onde procurar o contexto em execução
+# (anyio: _bootstrap -> _bootstrap_inner -> WorkerThread.run, que chama context.run(func))
+_OUTER_FRAMES = 4
+
+class _Session:
+    def __init__(self, path: str, forced: bool, scope: dict):
+        self.path = path
+        self.forced = forced
+        self.samples = Counter()
+        self.sample_count = 0
+        self.sampler_seconds = 0.0
+        self.started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+        self.scope = scope
+        # Criada no event loop, pela task da requisição
+        self.loop_thread = threading.get_ident()
+
+    def _owns_loop(self, frame) -> bool:
+        # No event loop, a pilha da task em execução passa pelos frames ASGI da requisição,
+        # que recebem o `scope` dela como argumento
+        while frame is not None:
+            if "scope" in frame.f_code.co_varnames and frame.f_locals.get("scope") is self.scope:
+                return True
+            frame = frame.f_back
+        return False
+
+    def _owns_thread(self, frame) -> bool:
+        # Uma thread do threadpool roda a função da rota via context.run(): o Context fica
+        # numa variável local do frame do worker, na base da pilha.
+        outer = []
+        while frame is not None:
+            outer.append(frame)
+            frame = frame.f_back
+        for f in outer[-_OUTER_FRAMES:]:
+            if "context" in f.f_code.co_varnames:
+                ctx = f.f_locals.get("context")
+                if isinstance(ctx, contextvars.Context) and ctx.get(_session_var) is self:
+                    return True
+        return False
+
+    def _frame_label(self, frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            leaf = frame.f_code
+            if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                continue
+            if not (self._owns_loop(frame) if ident == self.loop_thread else self._owns_thread(frame)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.samples[";".join(reversed(stack))] += 1
+        self.sample_count += 1
+
+    def _loop(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000.0
+        max_share = max(PROFILE_MAX_OVERHEAD_PCT, 0.1) / 100.0
+        while not self._stop.is_set() and self.sample_count < PROFILE_MAX_SAMPLES:
+            t0 = time.perf_counter()
+            self._sample()
+            cost = time.perf_counter() - t0
+            self.sampler_seconds += cost
+            # Intervalo adaptativo: custo da amostra / intervalo <= PROFILE_MAX_OVERHEAD_PCT
+            self._stop.wait(max(interval, cost / max_share))
+
+    def start(self) -> "_Session":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+
+def _eligible(scope) -> tuple:
+    forced = PROFILE_ALLOW_HEADER and (b"x-profile", b"1") in scope["headers"]
+    return (forced or scope["path"] in PROFILE_PATHS), forced
+
+def start(scope):
+    """
+    Inicia uma sessão de amostragem para a requisição (`scope` ASGI), se elegível e dentro do
+    limite. Senão None. Com o profiling desligado retorna logo, sem olhar a requisição.
+    """
+    if not PROFILE_ENABLED and not PROFILE_ALLOW_HEADER:
+        return None
+    eligible, forced = _eligible(scope)
+    if not eligible or (not PROFILE_ENABLED and not forced):
+        return None
+    with _active_lock:
+        if len(_active) >= PROFILE_MAX_CONCURRENT:
+            return None
+        session = _Session(scope["path"], forced, scope)
+        _active.add(session)
+    _session_var.set(session)
+    return session.start()
+
+def _write(path: str, samples: Counter) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+def finish(session, request_id: str, duration_ms: float):
+    """
+    Encerra a sessão. Se a requisição foi lenta (ou forçada), grava o perfil em collapsed stacks
+    e retorna o caminho do arquivo; caso contrário descarta as amostras e retorna None.
+    """
+    session.stop()
+    with _active_lock:
+        _active.discard(session)
+
+    if not session.samples or (duration_ms < PROFILE_THRESHOLD_MS and not session.forced):
+        return None
+
+    # O request id pode vir do cliente (X-Request-ID): sanitiza antes de usar no nome do arquivo
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(request_id))[:64]
+    filename = f"{time.strftime('%Y%m%dT%H%M%S')}_{safe_id}.collapsed"
+    path = os.path.join(PROFILE_DIR, filename)
+    try:
+        _write(path, session.samples)
+    except OSError as exc:
+        logger.warning("profile rid=%s falhou ao gravar: %r", request_id, exc)
+        return None
+
+    overhead_pct = round(session.sampler_seconds / max(duration_ms / 1000.0, 1e-9) * 100, 2)
+    logger.info(
+        "profile rid=%s path=%s duration_ms=%s samples=%s overhead_pct=%s file=%s",
+        request_id, session.path, duration_ms, session.sample_count, overhead_pct, path,
+        extra={"profile": {"file": path, "samples": session.sample_count, "overhead_pct": overhead_pct}},
+    )
+    return path
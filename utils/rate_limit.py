@@ -0,0 +1,297 @@
+# utils/rate_limit.py
+# Controle de admissão em processo para as rotas caras (PDF, recorrentes, sincronização, scripts).
+#
+# Cada rota protegida pertence a uma classe (ROUTES). Por classe:
+#   - token bucket por cliente (usuário do token Bearer validado ou, sem ele, IP):
+#     RATE_LIMIT_<CLASSE>_PER_MINUTE fichas por minuto, acumulando até RATE_LIMIT_<CLASSE>_BURST;
+#   - limite global de execuções simultâneas (RATE_LIMIT_<CLASSE>_CONCURRENCY, 0 = sem limite),
+#     usado nas classes que ocupam CPU (pdf e sync). A vaga só é liberada quando a resposta termina.
+# Fora do limite a resposta é um 429 imediato com Retry-After, antes de ler o corpo (upload) e
+# sem passar pela rota. RATE_LIMIT_ENABLED=0 desativa tudo. Na criação de jobs de PDF a vaga só
+# cobre o upload; o limite de jobs na fila fica em utils/pdf_jobs.py (PDF_JOB_MAX_PENDING*).
+#
+# Atrás de proxy/load balancer o IP da conexão é o do proxy: sem o IP real, todos os clientes sem
+# token dividiriam um único bucket. O uvicorn lê o X-Forwarded-For apenas de proxies confiáveis:
+#   uvicorn main:app --proxy-headers --forwarded-allow-ips="<IP do proxy>"
+# (ou FORWARDED_ALLOW_IPS; o padrão confia só em 127.0.0.1). O IP usado aqui é scope["client"],
+# já reescrito pelo uvicorn a partir desse header.
+#
+# Vários workers (uvicorn --workers N): com RATE_LIMIT_SHARED_DIR, buckets e vagas ficam num
+# arquivo JSON protegido por flock e valem para todos os processos (vagas de processos
+# encerrados são descartadas). Qualquer objeto com `acquire(key, cls, rule)` (0 = admitido,
+# > 0 = segundos até a próxima ficha, < 0 = classe sem vagas) e `release(cls)` pode substituir
+# o store (set_store).
+
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o estado fica só no processo
+    fcntl = None
+
+from fastapi import HTTPException
+
+import auth
+from utils import metrics
+
+logger = logging.getLogger("konty")
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+SHARED_DIR = os.getenv("RATE_LIMIT_SHARED_DIR", "")
+# Retry-After sugerido quando a classe está no limite de execuções simultâneas
+BUSY_RETRY_SECONDS = max(1.0, float(os.getenv("RATE_LIMIT_BUSY_RETRY_SECONDS", "5")))
+# Acima disso o store em memória descarta os buckets já recarregados (clientes inativos)
+MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+
+class Rule(NamedTuple):
+    per_minute: float  # 0 = sem token bucket
+    burst: int
+    concurrency: int  # 0 = sem limite global
+
+# (fichas por minuto, burst, execuções simultâneas) padrão de cada classe
+_DEFAULTS = {
+    "pdf": (10, 3, max(1, (os.cpu_count() or 2) // 2)),
+    "sync": (6, 2, 2),
+    "recurring": (4, 2, 0),
+    "scripts": (4, 2, 0),
+}
+
+def _rule(cls: str, per_minute: float, burst: int, concurrency: int) -> Rule:
+    prefix = f"RATE_LIMIT_{cls.upper()}_"
+    return Rule(
+        float(os.getenv(prefix + "PER_MINUTE", str(per_minute))),
+        max(1, int(os.getenv(prefix + "BURST", str(burst)))),
+        int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+    )
+
+RULES: Dict[str, Rule] = {cls: _rule(cls, *values) for cls, values in _DEFAULTS.items()}
+
+# (método, caminho) -> classe
+ROUTES = {
+    ("POST", "/modulos/processar-pdf"): "pdf",
+    ("POST", "/modulos/processar-pdf/jobs"): "pdf",
+    ("POST", "/api/sync_charges_with_clients"): "sync",
+    ("POST", "/api/renormalize_clients"): "sync",
+    ("POST", "/api/process_recurring_charges"): "recurring",
+    ("POST", "/sistemas/cobranca"): "scripts",
+    ("POST", "/sistemas/cobranca/stream"): "scripts",
+}
+
+def _take(buckets: dict, bkey: str, rule: Rule, now: float) -> float:
+    """Consome uma ficha do bucket; devolve 0 ou os segundos até a próxima ficha."""
+    if rule.per_minute <= 0:
+        return 0.0
+    rate = rule.per_minute / 60.0
+    entry = buckets.get(bkey)
+    tokens = rule.burst if entry is None else min(rule.burst, entry[0] + (now - entry[1]) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    tokens -= 1
+    # [fichas, atualizado_em, cheio_em]: depois de cheio_em o bucket equivale a um novo
+    buckets[bkey] = [tokens, now, now + (rule.burst - tokens) / rate]
+    return 0.0
+
+def _prune(buckets: dict, now: float) -> None:
+    for bkey in [k for k, entry in buckets.items() if entry[2] <= now]:
+        del buckets[bkey]
+
+class MemoryStore:
+    """Buckets e vagas no próprio processo (um worker)."""
+
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, cls: str, rule: Rule) -> float:
+        now = time.monotonic()
+        with self._lock:
+            in_use = self._slots.get(cls, 0)
+            if rule.concurrency and in_use >= rule.concurrency:
+                return -BUSY_RETRY_SECONDS
+            if len(self._buckets) > MAX_KEYS:
+                _prune(self._buckets, now)
+            wait = _take(self._buckets, f"{cls}|{key}", rule, now)
+            if wait:
+                return wait
+            if rule.concurrency:
+                self._slots[cls] = in_use + 1
+            return 0.0
+
+    def release(self, cls: str) -> None:
+        with self._lock:
+            self._slots[cls] = max(0, self._slots.get(cls, 0) - 1)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+class FileStore:
+    """
+    Estado compartilhado entre workers: {"buckets": {...}, "slots": {classe: {pid: n}}} num JSON,
+    lido e regravado sob flock a cada admissão. O arquivo só guarda buckets ainda não recarregados.
+    """
+
+    blocking = True  # I/O de arquivo: chamado fora do event loop
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "rate_limit.json")
+        self.lock_path = self.path + ".lock"
+
+    @contextmanager
+    def _state(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    state = {}
+                yield state
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp, self.path)
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def acquire(self, key: str, cls: str, rule: Rule) -> float:
+        now = time.time()
+        pid = str(os.getpid())
+        with self._state() as state:
+            buckets = state.setdefault("buckets", {})
+            slots = state.setdefault("slots", {}).setdefault(cls, {})
+            for owner in [p for p in slots if p != pid and not _pid_alive(int(p))]:
+                del slots[owner]
+            if rule.concurrency and sum(slots.values()) >= rule.concurrency:
+                return -BUSY_RETRY_SECONDS
+            _prune(buckets, now)
+            wait = _take(buckets, f"{cls}|{key}", rule, now)
+            if wait:
+                return wait
+            if rule.concurrency:
+                slots[pid] = slots.get(pid, 0) + 1
+            return 0.0
+
+    def release(self, cls: str) -> None:
+        pid = str(os.getpid())
+        with self._state() as state:
+            slots = state.setdefault("slots", {}).setdefault(cls, {})
+            if slots.get(pid, 0) > 1:
+                slots[pid] -= 1
+            else:
+                slots.pop(pid, None)
+
+def _default_store():
+    if SHARED_DIR and fcntl is not None:
+        return FileStore(SHARED_DIR)
+    if SHARED_DIR:
+        logger.warning("RATE_LIMIT_SHARED_DIR ignorado: flock indisponível nesta plataforma")
+    return MemoryStore()
+
+_store = _default_store()
+
+def set_store(store) -> None:
+    """Troca o store de buckets/vagas (ex.: um compartilhado entre workers)."""
+    global _store
+    _store = store
+
+async def client_key(scope) -> str:
+    """
+    Usuário do token Bearer, validado pelo auth (cache de tokens ou verificação da assinatura,
+    também nas rotas que não exigem login); sem token válido, o IP do cliente.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            token = token.strip()
+            if scheme.lower() == "bearer" and token:
+                try:
+                    user = await auth.get_current_user(token)
+                except HTTPException:  # token inválido ou JWKS indisponível: a rota decide
+                    user = None
+                if user and user.get("id"):
+                    return f"user:{user['id']}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:-"
+
+async def _acquire(key: str, cls: str, rule: Rule) -> float:
+    store = _store
+    if getattr(store, "blocking", False):
+        return await asyncio.to_thread(store.acquire, key, cls, rule)
+    return store.acquire(key, cls, rule)
+
+async def _release(cls: str) -> None:
+    store = _store
+    try:
+        if getattr(store, "blocking", False):
+            await asyncio.to_thread(store.release, cls)
+        else:
+            store.release(cls)
+    except Exception as exc:  # a vaga não pode ficar presa por erro do store
+        logger.exception("rate_limit: falha ao liberar vaga de %s: %r", cls, exc)
+
+async def _reject(send, cls: str, wait: float, busy: bool) -> None:
+    retry_after = str(max(1, math.ceil(wait)))
+    if busy:
+        detail = "Muitas execuções simultâneas desta operação. Tente novamente em instantes."
+    else:
+        detail = "Muitas requisições para esta operação. Aguarde antes de tentar novamente."
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", retry_after.encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """ASGI puro: admite ou rejeita (429) as rotas de ROUTES antes de executá-las."""
+
+    def __init__(self, app, routes: Optional[dict] = None, rules: Optional[Dict[str, Rule]] = None):
+        self.app = app
+        self.routes = ROUTES if routes is None else routes
+        self.rules = RULES if rules is None else rules
+
+    async def __call__(self, scope, receive, send):
+        cls = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        rule = self.rules.get(cls) if cls else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait = await _acquire(await client_key(scope), cls, rule)
+        if wait:
+            busy = wait < 0
+            metrics.RATE_LIMITED.inc(1, cls, "busy" if busy else "rate")
+            await _reject(send, cls, abs(wait), busy)
+            return
+        if not rule.concurrency:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await _release(cls)
@@ -0,0 +1,140 @@
+# utils/result_cache.py
+# Cache em disco endereçado por conteúdo (SHA-256 do upload) para resultados já processados.
+# Cada entrada ocupa dois arquivos: <sha>.zip (resultado) e <sha>.json (metadados).
+# Despejo por LRU (mtime é atualizado a cada acerto), por tamanho total e por TTL.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("konty")
+
+CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("data", "pdf_cache"))
+CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "1") == "1"
+CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("PDF_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+
+def _paths(key: str):
+    base = os.path.join(CACHE_DIR, key)
+    return f"{base}.zip", f"{base}.json"
+
+def _remove(key: str) -> None:
+    for path in _paths(key):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def read_upload_with_hash(upload, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Lê o UploadFile em blocos calculando o SHA-256 durante a leitura. Retorna (bytes, hexdigest)."""
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b"".join(chunks), digest.hexdigest()
+
+def open_entry(key: str):
+    """
+    Abre o ZIP em cache para leitura: (arquivo, zip_filename, tamanho) ou None.
+    O arquivo já aberto continua legível mesmo que evict() (de outra requisição) o remova do disco;
+    entrada expirada ou removida entre a leitura dos metadados e a abertura conta como miss.
+    """
+    if not CACHE_ENABLED:
+        return None
+    zip_path, meta_path = _paths(key)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if time.time() - meta.get("created", 0) > CACHE_TTL_SECONDS:
+            _remove(key)
+            return None
+        fileobj = open(zip_path, "rb")
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    try:
+        os.utime(zip_path, None)  # marca como usado recentemente (LRU)
+    except OSError:
+        pass
+    return fileobj, meta.get("filename") or "recibos_processados.zip", os.fstat(fileobj.fileno()).st_size
+
+def iter_file(fileobj, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """Lê o arquivo aberto por open_entry em blocos (corpo de StreamingResponse) e o fecha no fim."""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+def put(key: str, data: bytes, filename: str):
+    """Grava o resultado de forma atômica (tmp + rename) e aplica o despejo. Retorna o caminho do ZIP."""
+    if not CACHE_ENABLED:
+        return None
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    zip_path, meta_path = _paths(key)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(zip_path + suffix, "wb") as f:
+        f.write(data)
+    os.replace(zip_path + suffix, zip_path)
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump({"filename": filename, "created": time.time(), "size": len(data)}, f, ensure_ascii=False)
+    os.replace(meta_path + suffix, meta_path)
+    evict()
+    return zip_path
+
+def evict() -> int:
+    """Remove entradas expiradas e, depois, as menos usadas até caber em CACHE_MAX_BYTES."""
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    removed = 0
+    with _lock:
+        now = time.time()
+        entries = []
+        for name in os.listdir(CACHE_DIR):
+            if not name.endswith(".zip"):
+                continue
+            key = name[:-4]
+            try:
+                st = os.stat(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, key))
+
+        total = 0
+        alive = []
+        for mtime, size, key in entries:
+            _, meta_path = _paths(key)
+            try:
+                created = os.stat(meta_path).st_mtime
+            except FileNotFoundError:
+                created = 0
+            if now - created > CACHE_TTL_SECONDS:
+                _remove(key)
+                removed += 1
+            else:
+                alive.append((mtime, size, key))
+                total += size
+
+        for mtime, size, key in sorted(alive):
+            if total <= CACHE_MAX_BYTES:
+                break
+            _remove(key)
+            total -= size
+            removed += 1
+
+    if removed:
+        logger.info("pdf_cache evicted=%s", removed)
+    return removed
@@ -1,38 +1,296 @@
+# utils/run_script.py
+# Execução dos scripts Python dos sistemas (SCRIPTS_DIR/<nome>.py) em subprocessos.
+#
+# - Pool limitado: no máximo SCRIPT_MAX_CONCURRENT execuções simultâneas; as demais aguardam.
+# - Timeout por script (SCRIPT_TIMEOUT_SECONDS ou SCRIPT_TIMEOUTS="cobranca=600,outro=60"):
+#   ao estourar, o grupo de processos recebe SIGTERM e, após SCRIPT_KILL_GRACE_SECONDS, SIGKILL.
+# - stdout/stderr lidos linha a linha e repassados a quem acompanha a execução (stream_script,
+#   usado pela rota SSE) sem esperar o término; as últimas SCRIPT_OUTPUT_MAX_LINES ficam em memória.
+# - Deduplicação: chamadas para um script que já está rodando (ou na fila) acompanham a mesma
+#   execução em vez de iniciar outra.
+# - SCRIPT_WARM_INTERPRETER=1 mantém um interpretador reserva já iniciado (com os módulos de
+#   SCRIPT_WARM_PRELOAD importados); a execução só informa o caminho do script e pula a subida
+#   do Python.
+# - SCRIPTS_MOCK=1 (padrão, enquanto os scripts não são publicados) mantém o comportamento
+#   antigo: espera 2 s e retorna sucesso. SCRIPTS_MOCK=0 executa os scripts de SCRIPTS_DIR.
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import signal
 import asyncio
-import subprocess
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
 
-async def run_script(script_name: str):
-    """
-    Função para executar um script Python via subprocess.run().
-    Atualmente, é um mock que simula a execução de um script.
-
-    No futuro, esta função será substituída para chamar os scripts Python reais
-    localizados no ambiente do escritório.
-
-    Exemplo de como a implementação real poderia ser:
-    ```python
-    # Caminho base para os seus scripts Python reais
-    scripts_base_path = "/caminho/para/seus/scripts/" 
-    script_path = os.path.join(scripts_base_path, f"{script_name}.py")
-
-    # Executa o script Python como um subprocesso
-    process = await asyncio.create_subprocess_exec(
-        "python", script_path,
-        stdout=subprocess.PIPE, # Captura a saída padrão
-        stderr=subprocess.PIPE  # Captura a saída de erro padrão
+logger = logging.getLogger("konty")
+
+SCRIPTS_DIR = os.getenv("SCRIPTS_DIR", "scripts")
+SCRIPTS_MOCK = os.getenv("SCRIPTS_MOCK", "1") == "1"
+SCRIPT_PYTHON = os.getenv("SCRIPT_PYTHON", sys.executable)
+SCRIPT_MAX_CONCURRENT = int(os.getenv("SCRIPT_MAX_CONCURRENT", "2"))
+SCRIPT_TIMEOUT_SECONDS = float(os.getenv("SCRIPT_TIMEOUT_SECONDS", "300"))
+SCRIPT_KILL_GRACE_SECONDS = float(os.getenv("SCRIPT_KILL_GRACE_SECONDS", "5"))
+SCRIPT_OUTPUT_MAX_LINES = int(os.getenv("SCRIPT_OUTPUT_MAX_LINES", "1000"))
+SCRIPT_WARM_INTERPRETER = os.getenv("SCRIPT_WARM_INTERPRETER", "0") == "1"
+SCRIPT_WARM_PRELOAD = [m.strip() for m in os.getenv("SCRIPT_WARM_PRELOAD", "").split(",") if m.strip()]
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+_LINE_LIMIT = 1 << 20
+
+def _parse_timeouts(raw: str) -> Dict[str, float]:
+    out = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            out[name.strip()] = float(value)
+    return out
+
+SCRIPT_TIMEOUTS = _parse_timeouts(os.getenv("SCRIPT_TIMEOUTS", ""))
+
+class ScriptNotFound(Exception):
+    pass
+
+# Interpretador reserva: importa os módulos pré-carregados e espera o caminho do script no stdin
+_WARM_BOOTSTRAP = (
+    "import sys, runpy\n"
+    "for m in sys.argv[1:]:\n"
+    "    __import__(m)\n"
+    "path = sys.stdin.readline().strip()\n"
+    "sys.argv = [path]\n"
+    "sys.path.insert(0, __import__('os').path.dirname(path))\n"
+    "runpy.run_path(path, run_name='__main__')\n"
+)
+
+class ScriptRun:
+    """Uma execução de script: saída acumulada (limitada) e assinantes recebendo as linhas."""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = "queued"  # queued -> running -> ok | error | timeout
+        self.returncode: Optional[int] = None
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.output = deque(maxlen=SCRIPT_OUTPUT_MAX_LINES)  # (stream, linha)
+        self.subscribers = set()
+        self.done = asyncio.Event()
+        self.proc: Optional[asyncio.subprocess.Process] = None
+
+    def publish(self, stream: str, line: str) -> None:
+        self.output.append((stream, line))
+        for queue in list(self.subscribers):
+            queue.put_nowait((stream, line))
+
+    def result(self) -> dict:
+        stdout = "\n".join(line for stream, line in self.output if stream == "stdout")
+        stderr = "\n".join(line for stream, line in self.output if stream == "stderr")
+        duration_ms = int(((self.finished_at or time.time()) - (self.started_at or self.queued_at)) * 1000)
+        out = {
+            "status": self.status,
+            "sistema": self.name,
+            "run_id": self.id,
+            "returncode": self.returncode,
+            "duration_ms": duration_ms,
+        }
+        if self.status == "ok":
+            out["message"] = stdout
+        elif self.status == "timeout":
+            out["message"] = f"Tempo limite de {_timeout_for(self.name):g}s excedido."
+        else:
+            out["message"] = stderr or stdout
+        return out
+
+_running: Dict[str, ScriptRun] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+_spare: Optional[asyncio.subprocess.Process] = None
+_spare_lock: Optional[asyncio.Lock] = None
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SCRIPT_MAX_CONCURRENT)
+    return _semaphore
+
+def _get_spare_lock() -> asyncio.Lock:
+    global _spare_lock
+    if _spare_lock is None:
+        _spare_lock = asyncio.Lock()
+    return _spare_lock
+
+def _timeout_for(name: str) -> float:
+    return SCRIPT_TIMEOUTS.get(name, SCRIPT_TIMEOUT_SECONDS)
+
+def script_path(name: str) -> str:
+    if not _NAME_RE.match(name):
+        raise ScriptNotFound(name)
+    path = os.path.abspath(os.path.join(SCRIPTS_DIR, f"{name}.py"))
+    if not os.path.isfile(path):
+        raise ScriptNotFound(name)
+    return path
+
+def _child_env() -> dict:
+    return dict(os.environ, PYTHONUNBUFFERED="1")
+
+async def _spawn_warm() -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        SCRIPT_PYTHON, "-u", "-c", _WARM_BOOTSTRAP, *SCRIPT_WARM_PRELOAD,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        env=_child_env(), cwd=os.path.abspath(SCRIPTS_DIR) if os.path.isdir(SCRIPTS_DIR) else None,
+        start_new_session=True, limit=_LINE_LIMIT,
     )
-    
-    # Aguarda a conclusão do subprocesso e obtém as saídas
-    stdout, stderr = await process.communicate()
-    
-    # Verifica o código de retorno do subprocesso
-    if process.returncode != 0:
-        # Se o script retornou um erro, retorna o status de erro e a mensagem de erro
-        return {"status": "error", "message": stderr.decode('utf-8').strip()}
-    else:
-        # Se o script foi executado com sucesso, retorna o status ok e a saída padrão
-        return {"status": "ok", "message": stdout.decode('utf-8').strip()}
-    ```
+
+async def _start_process(path: str) -> asyncio.subprocess.Process:
+    global _spare
+    if not SCRIPT_WARM_INTERPRETER:
+        return await asyncio.create_subprocess_exec(
+            SCRIPT_PYTHON, "-u", path,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env=_child_env(), cwd=os.path.dirname(path), start_new_session=True, limit=_LINE_LIMIT,
+        )
+    # Serializado: duas subidas simultâneas pegariam o mesmo reserva e a segunda sobrescreveria
+    # o _spare da primeira, deixando um interpretador órfão
+    async with _get_spare_lock():
+        proc, _spare = _spare, None
+        if proc is None or proc.returncode is not None:
+            proc = await _spawn_warm()
+        proc.stdin.write(path.encode("utf-8") + b"\n")
+        await proc.stdin.drain()
+        proc.stdin.close()
+        # Já deixa o próximo interpretador subindo em segundo plano
+        _spare = await _spawn_warm()
+    return proc
+
+def _signal_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        try:
+            proc.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+async def _pump(run: ScriptRun, stream_name: str, reader: asyncio.StreamReader) -> None:
+    while True:
+        try:
+            raw = await reader.readline()
+        except ValueError:  # linha maior que o limite: repassa em pedaços
+            raw = await reader.read(_LINE_LIMIT)
+        if not raw:
+            return
+        run.publish(stream_name, raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+
+async def _execute(run: ScriptRun, path: str) -> None:
+    try:
+        async with _get_semaphore():
+            run.status = "running"
+            run.started_at = time.time()
+            if SCRIPTS_MOCK:
+                await asyncio.sleep(2)  # comportamento antigo (mock)
+                run.publish("stdout", f"{run.name} executado com sucesso (mock)!")
+                run.status, run.returncode = "ok", 0
+                return
+
+            proc = run.proc = await _start_process(path)
+            pumps = asyncio.gather(_pump(run, "stdout", proc.stdout), _pump(run, "stderr", proc.stderr))
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=_timeout_for(run.name))
+                run.status = "ok" if proc.returncode == 0 else "error"
+            except asyncio.TimeoutError:
+                run.status = "timeout"
+                _signal_group(proc, signal.SIGTERM)
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=SCRIPT_KILL_GRACE_SECONDS)
+                except asyncio.TimeoutError:
+                    _signal_group(proc, signal.SIGKILL)
+                    await proc.wait()
+            except asyncio.CancelledError:
+                _signal_group(proc, signal.SIGKILL)
+                raise
+            finally:
+                run.returncode = proc.returncode
+                try:
+                    await asyncio.wait_for(pumps, timeout=SCRIPT_KILL_GRACE_SECONDS)
+                except asyncio.TimeoutError:  # filho órfão segurando o pipe
+                    pumps.cancel()
+    except Exception as exc:
+        run.status = "error"
+        run.publish("stderr", f"Falha ao executar o script: {exc!r}")
+    finally:
+        run.finished_at = time.time()
+        if _running.get(run.name) is run:
+            del _running[run.name]
+        for queue in list(run.subscribers):
+            queue.put_nowait(None)
+        run.done.set()
+        logger.info(
+            "script %s run_id=%s status=%s returncode=%s duration_ms=%s",
+            run.name, run.id, run.status, run.returncode, run.result()["duration_ms"],
+            extra={"script": {"name": run.name, "run_id": run.id, "status": run.status}},
+        )
+
+def start(name: str) -> Tuple[ScriptRun, bool]:
+    """Inicia o script (ou reaproveita a execução em andamento). Retorna (execução, deduplicada)."""
+    current = _running.get(name)
+    if current is not None:
+        return current, True
+    path = "" if SCRIPTS_MOCK else script_path(name)
+    run = ScriptRun(name)
+    _running[name] = run
+    asyncio.ensure_future(_execute(run, path))
+    return run, False
+
+async def run_script(script_name: str) -> dict:
+    """
+    Executa SCRIPTS_DIR/<script_name>.py e aguarda o término.
+    Retorna {"status": "ok" | "error" | "timeout", "sistema", "message", "returncode", ...};
+    ScriptNotFound se o script não existir.
+    """
+    run, deduplicated = start(script_name)
+    # shield: quem desistir de esperar (cliente desconectou) não cancela a execução compartilhada
+    await asyncio.shield(run.done.wait())
+    return {**run.result(), "deduplicated": deduplicated}
+
+async def stream_script(script_name: str) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Inicia (ou acompanha) a execução e produz (evento, dado) à medida que a saída chega:
+    ("run", json), ("stdout", linha), ("stderr", linha) e, ao final, ("exit", json com o resultado).
     """
-    await asyncio.sleep(2) # Simula um atraso de 2 segundos na execução do script
-    return {"status": "ok", "sistema": f"{script_name} executado com sucesso (mock)!"}
+    run, deduplicated = start(script_name)
+    queue: asyncio.Queue = asyncio.Queue()
+    backlog = list(run.output)
+    run.subscribers.add(queue)
+    try:
+        yield "run", json.dumps({"run_id": run.id, "sistema": run.name, "deduplicated": deduplicated})
+        for stream_name, line in backlog:
+            yield stream_name, line
+        if not run.done.is_set():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        yield "exit", json.dumps({**run.result(), "deduplicated": deduplicated}, ensure_ascii=False)
+    finally:
+        run.subscribers.discard(queue)
+
+def sse_event(event: str, data: str) -> str:
+    """Formata um evento Server-Sent Events (uma linha `data:` por linha do conteúdo)."""
+    lines = "".join(f"data: {part}\n" for part in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+async def shutdown() -> None:
+    """Encerra o interpretador reserva e as execuções em andamento (lifespan)."""
+    global _spare
+    procs = [run.proc for run in list(_running.values()) if run.proc is not None]
+    if _spare is not None:
+        procs.append(_spare)
+        _spare = None
+    for proc in procs:
+        if proc.returncode is None:
+            _signal_group(proc, signal.SIGKILL)
+            await proc.wait()
@@ -0,0 +1,242 @@
+# utils/tracing.py
+# Trace id único por requisição (contextvars) + spans + logging estruturado em JSON.
+# Toda escrita de log sai do caminho da requisição: os handlers só enfileiram (QueueHandler)
+# e uma thread (QueueListener) formata e grava no stdout e, opcionalmente, no arquivo OTLP.
+
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import secrets
+import itertools
+import hashlib
+import logging
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")          # json | text
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")  # arquivo JSON Lines no formato OTLP/JSON
+SERVICE_NAME = os.getenv("SERVICE_NAME", "konty-api")
+
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+span_id_var = contextvars.ContextVar("span_id", default=None)
+
+spans_logger = logging.getLogger("konty.spans")
+
+_listener = None
+
+# ---------- Trace id ----------
+
+# Prefixo aleatório por processo + contador: único entre workers/reinícios sem o custo do uuid4
+# (os.urandom) a cada requisição. 32 caracteres hex, como o traceId do OTLP.
+_ID_PREFIX = secrets.token_hex(8)
+_id_counter = itertools.count(1)
+
+def _reseed_ids() -> None:
+    # Workers criados por fork (ex.: gunicorn --preload) herdariam o mesmo prefixo
+    global _ID_PREFIX, _id_counter
+    _ID_PREFIX = secrets.token_hex(8)
+    _id_counter = itertools.count(1)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_ids)
+
+# Ids vindos do cliente só são aceitos neste formato (vão para logs, headers e nomes de arquivo)
+_CLIENT_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+def new_trace_id() -> str:
+    return f"{_ID_PREFIX}{next(_id_counter) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+def accept_trace_id(value):
+    """Trace id recebido do cliente, se tiver formato válido; senão None (gera-se um novo)."""
+    if value and _CLIENT_ID_RE.fullmatch(value):
+        return value
+    return None
+
+def current_trace_id():
+    return trace_id_var.get()
+
+def start_trace(trace_id=None):
+    """Define o trace id do contexto atual. Retorna (trace_id, token) para reset_trace."""
+    trace_id = trace_id or new_trace_id()
+    return trace_id, trace_id_var.set(trace_id)
+
+def reset_trace(token) -> None:
+    trace_id_var.reset(token)
+
+# ---------- Spans ----------
+
+def _emit_span(name: str, start_ns: int, end_ns: int, span_id: str, parent_id, attrs: dict) -> None:
+    if not spans_logger.isEnabledFor(logging.INFO):
+        return
+    spans_logger.info(
+        "span %s", name,
+        extra={
+            "span": {
+                "name": name,
+                "span_id": span_id,
+                "parent_id": parent_id,
+                "start_ns": start_ns,
+                "end_ns": end_ns,
+                "duration_ms": round((end_ns - start_ns) / 1e6, 3),
+                "attributes": attrs,
+            }
+        },
+    )
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mede um trecho como span filho do span atual (mesmo trace id)."""
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = span_id_var.get()
+    token = span_id_var.set(span_id)
+    start_ns = time.time_ns()
+    try:
+        yield attrs
+    except Exception as exc:
+        attrs["error"] = repr(exc)
+        raise
+    finally:
+        span_id_var.reset(token)
+        _emit_span(name, start_ns, time.time_ns(), span_id, parent_id, attrs)
+
+def record_span(name: str, duration: float, **attrs) -> None:
+    """Registra um span já concluído (ex.: medido por um gancho do engine)."""
+    end_ns = time.time_ns()
+    _emit_span(name, end_ns - int(duration * 1e9), end_ns, uuid.uuid4().hex[:16], span_id_var.get(), attrs)
+
+# ---------- Logging ----------
+
+class _ContextFilter(logging.Filter):
+    """Anexa o trace id (capturado na thread que gerou o log) antes de ir para a fila."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = trace_id_var.get()
+        return True
+
+_RESERVED = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "trace_id", "span"}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        if getattr(record, "span", None):
+            out["span"] = record.span
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+class _OtlpFileHandler(logging.Handler):
+    """Grava cada span como uma linha OTLP/JSON (resourceSpans) no arquivo configurado."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _otlp_trace_id(trace_id) -> str:
+        tid = trace_id or ""
+        if len(tid) == 32 and all(c in "0123456789abcdef" for c in tid):
+            return tid
+        return hashlib.sha256(tid.encode("utf-8")).hexdigest()[:32]
+
+    def emit(self, record: logging.LogRecord) -> None:
+        sp = getattr(record, "span", None)
+        if not sp:
+            return
+        otlp_span = {
+            "traceId": self._otlp_trace_id(getattr(record, "trace_id", None)),
+            "spanId": sp["span_id"],
+            "name": sp["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(sp["start_ns"]),
+            "endTimeUnixNano": str(sp["end_ns"]),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in sp["attributes"].items()],
+        }
+        if sp["parent_id"]:
+            otlp_span["parentSpanId"] = sp["parent_id"]
+        line = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "konty"}, "spans": [otlp_span]}],
+            }]
+        }
+        try:
+            self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+            self._file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            super().close()
+
+class _SpansOnly(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, "span", None) is not None
+
+def setup_logging(level=logging.INFO) -> None:
+    """Configura o root logger: QueueHandler no caminho da requisição e gravação em thread separada."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s trace_id=%(trace_id)s %(message)s", datefmt="%Y-%m-%dT%H:%M:%SZ"
+        ))
+    handlers = [stream]
+    if TRACE_EXPORT_FILE:
+        otlp = _OtlpFileHandler(TRACE_EXPORT_FILE)
+        otlp.addFilter(_SpansOnly())
+        handlers.append(otlp)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """
+    Esvazia a fila e encerra a thread de gravação (chamado no shutdown). Os handlers voltam a
+    ficar direto no root logger: o que for logado depois (ou num novo lifespan no mesmo
+    processo, como em testes) é gravado de forma síncrona em vez de ficar preso na fila.
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, logging.handlers.QueueHandler) and h.queue is listener.queue:
+            root.removeHandler(h)
+    listener.stop()
+    for h in listener.handlers:
+        h.addFilter(_ContextFilter())  # trace_id/span_id que o QueueHandler acrescentava
+        root.addHandler(h)